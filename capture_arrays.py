@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized decoding of capture files with NumPy
+
+Capture files are read in chunks of frames, and each chunk is decoded into
+one array per debug field of cpu_output.DEBUG_FIELDS, so long captures are
+processed without a Python loop over the frames.
+"""
+
+import numpy as np
+
+from cpu_output import DEBUG_FIELDS, FRAME_BYTES, READY_FLAGS
+from trace_codec import is_encoded, read_encoded_chunks
+
+DEFAULT_CHUNK_FRAMES = 1 << 20
+
+# Pipeline stages in order, with their ready bits
+STAGES = tuple(READY_FLAGS.items())
+
+def _field_dtype(bits):
+    return np.uint8 if bits <= 8 else np.uint32
+
+def decode_field(frames, offset, size, shift, bits):
+    """Decodes one debug field from an array of frames with one frame per row"""
+    # Debug bytes start after the cycle counter byte
+    columns = frames[:, 1 + offset:1 + offset + size]
+    if size == 1:
+        value = columns[:, 0]
+    else:
+        value = np.zeros(len(frames), dtype=np.uint32)
+        for index in range(size):
+            value = (value << np.uint32(8)) | columns[:, index]
+    value = (value >> shift) & ((1 << bits) - 1)
+    return value.astype(_field_dtype(bits), copy=False)
+
+def decode_frames(frames, first_frame=0):
+    """
+    Decodes an array of frames with one frame per row into a dict of columns
+
+    Besides the debug fields, 'frame' is the index of each frame in the
+    capture (starting at first_frame) and 'cycle' is the 8-bit cycle counter.
+    """
+    columns = {
+        'frame': np.arange(first_frame, first_frame + len(frames), dtype=np.int64),
+        'cycle': frames[:, 0].copy(),
+    }
+    for name, offset, size, shift, bits in DEBUG_FIELDS:
+        columns[name] = decode_field(frames, offset, size, shift, bits)
+    return columns
+
+def read_frame_chunks(capture_file, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """
+    Yields (index of the first frame, array of frames) for each chunk of a
+    capture file. A trailing partial frame is ignored, like read_capture.
+    Captures encoded by trace_codec.py are decoded a block at a time.
+    """
+    if is_encoded(capture_file):
+        yield from read_encoded_chunks(capture_file)
+        return
+    first_frame = 0
+    while True:
+        block = capture_file.read(FRAME_BYTES * chunk_frames)
+        num_frames = len(block) // FRAME_BYTES
+        if num_frames:
+            frames = np.frombuffer(block, dtype=np.uint8, count=num_frames * FRAME_BYTES)
+            yield first_frame, frames.reshape(num_frames, FRAME_BYTES)
+            first_frame += num_frames
+        if len(block) < FRAME_BYTES * chunk_frames:
+            return
+
+def read_column_chunks(capture_file, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """Yields a dict of decoded columns for each chunk of a capture file"""
+    for first_frame, frames in read_frame_chunks(capture_file, chunk_frames):
+        yield decode_frames(frames, first_frame)
+
+def waiting_mask(frames):
+    """Returns which frames have all-zero debug bytes, i.e. are waiting for reset"""
+    return ~frames[:, 1:].any(axis=1)
+
+def concat_columns(first, second):
+    """Concatenates two dicts of columns"""
+    return {x: np.concatenate((first[x], second[x])) for x in first}
+
+def slice_columns(columns, selection):
+    """Returns a dict of columns with only the rows in selection"""
+    return {x: y[selection] for x, y in columns.items()}
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Converts a capture file to a VCD or FST waveform, e.g. for GTKWave
+
+Each debug field becomes a signal, along with the cycle counter, the ready
+flag of each stage and the assembly of the fetched instruction as a string
+signal. One frame is one time step. The waveform is written a chunk of frames
+at a time with only the changed values, so memory use does not grow with the
+length of the capture. FST files are written by piping the VCD through
+vcd2fst from GTKWave.
+"""
+
+from pathlib import Path
+import argparse
+import subprocess
+import sys
+
+import numpy as np
+
+from capture_arrays import STAGES, read_column_chunks
+from cpu_output import DEBUG_FIELDS, DEFAULT_OBJDUMP, decode_instruction, load_code_objdump
+
+DEFAULT_CHUNK_FRAMES = 1 << 16
+SCOPE = 'cpu'
+
+def vcd_signals():
+    """Returns (name, width, column, ready bit) of each signal; the width of strings is 0"""
+    signals = [('cycle', 8, 'cycle', None)]
+    signals.extend((name, bits, name, None) for name, _, _, _, bits in DEBUG_FIELDS)
+    signals.extend((f'ready_{name}', 1, 'ready_flags', bit) for name, bit in STAGES)
+    signals.append(('fetcher_asm', 0, 'fetcher_inst', None))
+    return signals
+
+def _identifier(index):
+    """Returns a short VCD identifier from the printable characters"""
+    identifier = ''
+    index += 1
+    while index:
+        index, digit = divmod(index - 1, 94)
+        identifier += chr(33 + digit)
+    return identifier
+
+def vcd_header(signals, timescale='1 ns'):
+    lines = [
+        '$version ee469-labs capture_to_vcd.py $end',
+        f'$timescale {timescale} $end',
+        f'$scope module {SCOPE} $end',
+    ]
+    for index, (name, width, _, _) in enumerate(signals):
+        if width == 0:
+            lines.append(f'$var string 1 {_identifier(index)} {name} $end')
+        else:
+            lines.append(
+                f'$var wire {width} {_identifier(index)} {name}'
+                f'{f" [{width - 1}:0]" if width > 1 else ""} $end')
+    lines.extend(('$upscope $end', '$enddefinitions $end'))
+    return '\n'.join(lines) + '\n'
+
+def _asm_value(inst):
+    # VCD values end at whitespace
+    return '_'.join(decode_instruction(inst).split())
+
+class VcdWriter:
+    """Writes the value changes of chunks of columns as VCD"""
+
+    def __init__(self, output, signals):
+        self.output = output
+        self.signals = signals
+        self._previous = [None] * len(signals)
+
+    def write_chunk(self, columns):
+        times = list()
+        changes = list()
+        for index, (_, width, column, bit) in enumerate(self.signals):
+            values = columns[column]
+            if bit is not None:
+                values = (values & bit) != 0
+            previous = np.empty_like(values)
+            previous[1:] = values[:-1]
+            changed = values != previous
+            # The first frame is a change unless it has the last value of the previous chunk
+            changed[0] = self._previous[index] is None or values[0] != self._previous[index]
+            self._previous[index] = values[-1]
+            identifier = _identifier(index)
+            changed_values = values[changed].tolist()
+            if width == 0:
+                text = [f's{_asm_value(x)} {identifier}' for x in changed_values]
+            elif width == 1:
+                text = [f'{int(x)}{identifier}' for x in changed_values]
+            else:
+                text = [f'b{x:b} {identifier}' for x in changed_values]
+            times.append(columns['frame'][changed])
+            changes.extend(text)
+        times = np.concatenate(times)
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        # Time stamp before the first change of each time
+        first_of_time = np.ones(len(times), dtype=bool)
+        first_of_time[1:] = times[1:] != times[:-1]
+        lines = list()
+        for change_index, time, new_time in zip(
+                order.tolist(), times.tolist(), first_of_time.tolist()):
+            if new_time:
+                lines.append(f'#{time}')
+            lines.append(changes[change_index])
+        if lines:
+            self.output.write('\n'.join(lines) + '\n')
+
+    def finish(self, num_frames):
+        # End time, so the last frame is shown for one step
+        self.output.write(f'#{num_frames}\n')
+
+def write_vcd(capture_file, output, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """Writes a capture file as VCD to a text stream; returns the number of frames"""
+    signals = vcd_signals()
+    output.write(vcd_header(signals))
+    writer = VcdWriter(output, signals)
+    num_frames = 0
+    for columns in read_column_chunks(capture_file, chunk_frames):
+        writer.write_chunk(columns)
+        num_frames = int(columns['frame'][-1]) + 1
+    writer.finish(num_frames)
+    return num_frames
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('capture', type=argparse.FileType('rb'), help='Capture file to convert')
+    parser.add_argument('output', type=Path, help='Waveform to write, .vcd or .fst')
+    parser.add_argument(
+        '--objdump', default=DEFAULT_OBJDUMP,
+        help='Disassembly listing of the program (default: %(default)s)')
+    parser.add_argument(
+        '--chunk-frames', type=int, default=DEFAULT_CHUNK_FRAMES,
+        help='Frames to convert at a time (default: %(default)s)')
+    args = parser.parse_args()
+
+    load_code_objdump(args.objdump)
+    if args.output.suffix != '.fst':
+        with args.output.open('w') as output:
+            num_frames = write_vcd(args.capture, output, args.chunk_frames)
+        print(f'Wrote {num_frames} frames to {args.output}')
+        return
+    try:
+        process = subprocess.Popen(
+            ['vcd2fst', '-', str(args.output)], stdin=subprocess.PIPE, universal_newlines=True)
+    except OSError as exc:
+        print(f'ERROR: Could not run vcd2fst from GTKWave: {exc}')
+        sys.exit(1)
+    with process.stdin:
+        num_frames = write_vcd(args.capture, process.stdin, args.chunk_frames)
+    if process.wait() != 0:
+        print(f'ERROR: vcd2fst failed with code {process.returncode}')
+        sys.exit(1)
+    print(f'Wrote {num_frames} frames to {args.output}')
+
+if __name__ == '__main__':
+    main()
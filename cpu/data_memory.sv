@@ -22,7 +22,16 @@ module data_memory(
     // each location from 0:63 contains 4 addresses that correspond to the input address value
     logic [`BIT_WIDTH-1:0] data_memory_ram [0:`DATA_SIZE-1];
     initial begin
-        $readmemh("cpu/init/data.hex", data_memory_ram);
+        `ifdef SYNTHESIS
+            $readmemh("cpu/init/data.hex", data_memory_ram);
+        `else
+            // Simulations can load other data images with +data_hex=<path>
+            string data_hex;
+            if (!$value$plusargs("data_hex=%s", data_hex)) begin
+                data_hex = "cpu/init/data.hex";
+            end
+            $readmemh(data_hex, data_memory_ram);
+        `endif
     end
 
     // ---------------
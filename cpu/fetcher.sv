@@ -18,8 +18,16 @@ module fetcher(
     // Executable code
     reg [`BIT_WIDTH-1:0] code_memory [0:`INST_COUNT-1];
     initial begin
-        //$readmemh("testcode/code.hex", code_memory);
-        $readmemh("cpu/init/code.hex", code_memory);
+        `ifdef SYNTHESIS
+            $readmemh("cpu/init/code.hex", code_memory);
+        `else
+            // Simulations can load other programs with +code_hex=<path>
+            string code_hex;
+            if (!$value$plusargs("code_hex=%s", code_hex)) begin
+                code_hex = "cpu/init/code.hex";
+            end
+            $readmemh(code_hex, code_memory);
+        `endif
     end
 
     // Control logic
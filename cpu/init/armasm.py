@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Assembles the ARM instructions the CPU implements, in the syntax of code.s
+
+Supports data processing instructions (with shifts and the unified syntax
+shift aliases), LDR/STR(B) with immediate or shifted register offsets, B/BL
+to labels, condition and S suffixes, nop and .word. Directives such as .arch
+and .text are accepted and ignored. Writes code.hex, and optionally the raw
+binary and the listing, without the ARM toolchain.
+"""
+
+import argparse
+import re
+import struct
+import sys
+
+from armdis import format_listing
+
+REGISTERS = {f'r{x}': x for x in range(16)}
+REGISTERS.update({'sl': 10, 'fp': 11, 'ip': 12, 'sp': 13, 'lr': 14, 'pc': 15})
+CONDITIONS = {
+    'eq': 0x0, 'ne': 0x1, 'cs': 0x2, 'hs': 0x2, 'cc': 0x3, 'lo': 0x3, 'mi': 0x4, 'pl': 0x5,
+    'vs': 0x6, 'vc': 0x7, 'hi': 0x8, 'ls': 0x9, 'ge': 0xa, 'lt': 0xb, 'gt': 0xc, 'le': 0xd,
+    'al': 0xe, '': 0xe,
+}
+DATA_OPCODES = {
+    'and': 0x0, 'eor': 0x1, 'sub': 0x2, 'rsb': 0x3, 'add': 0x4, 'adc': 0x5, 'sbc': 0x6,
+    'rsc': 0x7, 'tst': 0x8, 'teq': 0x9, 'cmp': 0xa, 'cmn': 0xb, 'orr': 0xc, 'mov': 0xd,
+    'bic': 0xe, 'mvn': 0xf,
+}
+TEST_OPCODES = ('tst', 'teq', 'cmp', 'cmn')
+MOVE_OPCODES = ('mov', 'mvn')
+SHIFTS = {'lsl': 0, 'asl': 0, 'lsr': 1, 'asr': 2, 'ror': 3}
+# Instructions with an equivalent encoding for the negated or inverted immediate
+_IMMEDIATE_ALTERNATIVES = {
+    'mov': ('mvn', lambda x: ~x), 'mvn': ('mov', lambda x: ~x),
+    'and': ('bic', lambda x: ~x), 'bic': ('and', lambda x: ~x),
+    'add': ('sub', lambda x: -x), 'sub': ('add', lambda x: -x),
+    'cmp': ('cmn', lambda x: -x), 'cmn': ('cmp', lambda x: -x),
+}
+
+NOP = 0xe1a00000
+
+_LABEL_RE = re.compile(r'^([A-Za-z_.$][\w.$]*):')
+_MEMORY_RE = re.compile(r'^\[([^\]]*)\](!?)\s*(?:,\s*(.*))?$')
+
+class AssemblyError(Exception):
+    """An error in the assembly source, with its line number"""
+
+    def __init__(self, line_number, message):
+        super().__init__(f'line {line_number}: {message}')
+        self.line_number = line_number
+
+def _split_operands(text):
+    """Splits operands on commas outside of brackets"""
+    operands = list()
+    depth = 0
+    current = ''
+    for char in text:
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+        if char == ',' and depth == 0:
+            operands.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        operands.append(current.strip())
+    return operands
+
+def _parse_register(text):
+    register = REGISTERS.get(text.strip().lower())
+    if register is None:
+        raise ValueError(f'Expected a register, got "{text}"')
+    return register
+
+def _parse_number(text):
+    text = text.strip()
+    if text.startswith('#'):
+        text = text[1:].strip()
+    return int(text, 0)
+
+def encode_immediate(value):
+    """Returns the 12-bit rotated immediate encoding of value, or None"""
+    value &= 0xffffffff
+    for rotate in range(0, 32, 2):
+        rotated = ((value << rotate) | (value >> (32 - rotate))) & 0xffffffff if rotate else value
+        if rotated <= 0xff:
+            return (rotate // 2) << 8 | rotated
+    return None
+
+def _encode_shift(shift_text, register_allowed=True):
+    """Encodes "lsl #2", "lsr r3" or "rrx" into bits 11 to 4"""
+    shift_text = shift_text.strip().lower()
+    if shift_text == 'rrx':
+        return SHIFTS['ror'] << 5
+    parts = shift_text.split(None, 1)
+    if len(parts) != 2 or parts[0] not in SHIFTS:
+        raise ValueError(f'Invalid shift "{shift_text}"')
+    shift_type = SHIFTS[parts[0]]
+    if not parts[1].startswith('#'):
+        if not register_allowed:
+            raise ValueError('Register shifts are not allowed here')
+        return _parse_register(parts[1]) << 8 | shift_type << 5 | 1 << 4
+    amount = _parse_number(parts[1])
+    if amount == 0:
+        # e.g. "lsr #0" is the same as no shift
+        return 0
+    if shift_type in (1, 2) and amount == 32:
+        # An amount of 0 encodes 32 for LSR and ASR
+        amount = 0
+    elif not 0 < amount <= 31:
+        raise ValueError(f'Invalid shift amount {amount}')
+    return amount << 7 | shift_type << 5
+
+def _encode_operand2(operands):
+    """Encodes a register with an optional shift into bits 11 to 0"""
+    encoded = _parse_register(operands[0])
+    if len(operands) == 2:
+        encoded |= _encode_shift(operands[1])
+    elif len(operands) > 2:
+        raise ValueError('Too many operands')
+    return encoded
+
+def _parse_mnemonic(mnemonic, names):
+    """Splits a mnemonic into one of names, the S flag and the condition code"""
+    for name in sorted(names, key=len, reverse=True):
+        if not mnemonic.startswith(name):
+            continue
+        rest = mnemonic[len(name):]
+        # Unified syntax puts S before the condition, divided syntax after
+        for set_flags, cond in ((False, rest), (True, rest[1:] if rest[:1] == 's' else None),
+                                (True, rest[:-1] if rest[-1:] == 's' else None)):
+            if cond is not None and cond in CONDITIONS:
+                return name, set_flags, CONDITIONS[cond]
+    return None
+
+def _encode_data_processing(opcode, set_flags, cond, operands):
+    if len(operands) < 2:
+        raise ValueError('Missing operand')
+    if opcode in TEST_OPCODES:
+        # Tests always set the flags and have no destination
+        rd, rn, operand2 = 0, _parse_register(operands[0]), operands[1:]
+        set_flags = True
+    elif opcode in MOVE_OPCODES:
+        rd, rn, operand2 = _parse_register(operands[0]), 0, operands[1:]
+    else:
+        rd, rn, operand2 = _parse_register(operands[0]), _parse_register(operands[1]), operands[2:]
+    if not operand2:
+        raise ValueError('Missing operand')
+    if operand2[0].startswith('#'):
+        if len(operand2) != 1:
+            raise ValueError('Too many operands')
+        value = _parse_number(operand2[0])
+        encoded = encode_immediate(value)
+        if encoded is None and opcode in _IMMEDIATE_ALTERNATIVES:
+            # Like gas, use the equivalent instruction if it can encode it
+            alternative, convert = _IMMEDIATE_ALTERNATIVES[opcode]
+            encoded = encode_immediate(convert(value))
+            if encoded is not None:
+                opcode = alternative
+        if encoded is None:
+            raise ValueError(f'Immediate {value} cannot be encoded')
+        operand2_bits = 1 << 25 | encoded
+    else:
+        operand2_bits = _encode_operand2(operand2)
+    return (cond << 28 | operand2_bits | DATA_OPCODES[opcode] << 21 | int(set_flags) << 20
+            | rn << 16 | rd << 12)
+
+def _encode_shift_alias(shift, set_flags, cond, operands):
+    """Encodes unified syntax shifts, e.g. "lsl r0, r1, #2", as MOV"""
+    if shift == 'rrx':
+        if len(operands) != 2:
+            raise ValueError('Expected 2 operands')
+        operands = [operands[0], operands[1], 'rrx']
+    else:
+        if len(operands) != 3:
+            raise ValueError('Expected 3 operands')
+        operands = [operands[0], operands[1], f'{shift} {operands[2]}']
+    return _encode_data_processing('mov', set_flags, cond, operands)
+
+def _encode_offset(text):
+    """Encodes an immediate or (shifted) register offset into I, U and bits 11 to 0"""
+    parts = _split_operands(text) if isinstance(text, str) else text
+    first = parts[0].strip()
+    if first.startswith('#'):
+        if len(parts) != 1:
+            raise ValueError('Too many operands')
+        offset = _parse_number(first)
+        if not -0xfff <= offset <= 0xfff:
+            raise ValueError(f'Offset {offset} out of range')
+        return (offset >= 0 and not first[1:].strip().startswith('-')) << 23 | abs(offset)
+    negative = first.startswith('-')
+    first = first.lstrip('+-')
+    encoded = 1 << 25 | (not negative) << 23 | _parse_register(first)
+    if len(parts) == 2:
+        encoded |= _encode_shift(parts[1], register_allowed=False)
+    elif len(parts) > 2:
+        raise ValueError('Too many operands')
+    return encoded
+
+def _encode_data_transfer(load, byte, translated, cond, operands, address, labels):
+    if len(operands) < 2:
+        raise ValueError('Expected a register and an address')
+    rd = _parse_register(operands[0])
+    bits = cond << 28 | 1 << 26 | int(load) << 20 | int(byte) << 22 | rd << 12
+    address_text = ', '.join(operands[1:])
+    match = _MEMORY_RE.match(address_text)
+    if match is None:
+        # PC-relative load of a label
+        label = address_text.strip()
+        if label not in labels:
+            raise ValueError(f'Unknown label "{label}"')
+        offset = labels[label] - (address + 8)
+        return bits | 1 << 24 | 15 << 16 | _encode_offset(f'#{offset}')
+    base_parts = _split_operands(match.group(1))
+    rn = _parse_register(base_parts[0])
+    writeback = bool(match.group(2))
+    post_offset = match.group(3)
+    bits |= rn << 16
+    if post_offset is not None:
+        if len(base_parts) != 1 or writeback:
+            raise ValueError('Invalid post-indexed address')
+        # Post-indexed; W set means the translated (user mode) variant
+        return bits | int(translated) << 21 | _encode_offset(post_offset)
+    if translated:
+        raise ValueError('Translated transfers must be post-indexed')
+    bits |= 1 << 24 | int(writeback) << 21
+    if len(base_parts) == 1:
+        return bits | 1 << 23
+    return bits | _encode_offset(base_parts[1:])
+
+def _encode_branch(link, cond, operands, address, labels):
+    if len(operands) != 1:
+        raise ValueError('Expected a branch target')
+    target = operands[0]
+    if target in labels:
+        target_address = labels[target]
+    else:
+        try:
+            target_address = _parse_number(target)
+        except ValueError:
+            raise ValueError(f'Unknown label "{target}"')
+    offset = target_address - (address + 8)
+    if offset % 4 or not -(1 << 25) <= offset < (1 << 25):
+        raise ValueError(f'Branch target 0x{target_address:x} out of range')
+    return cond << 28 | 0b101 << 25 | int(link) << 24 | (offset >> 2) & 0xffffff
+
+def _encode_instruction(mnemonic, operands, address, labels):
+    mnemonic = mnemonic.lower()
+    if mnemonic == 'nop':
+        if operands:
+            raise ValueError('nop takes no operands')
+        return NOP
+    if mnemonic == '.word':
+        if len(operands) != 1:
+            raise ValueError('Expected one value')
+        return _parse_number(operands[0]) & 0xffffffff
+    parsed = _parse_mnemonic(mnemonic, DATA_OPCODES)
+    if parsed:
+        opcode, set_flags, cond = parsed
+        return _encode_data_processing(opcode, set_flags, cond, operands)
+    parsed = _parse_mnemonic(mnemonic, ('lsl', 'lsr', 'asr', 'ror', 'rrx'))
+    if parsed:
+        return _encode_shift_alias(*parsed, operands)
+    for name, load, byte, translated in (
+            ('ldrbt', True, True, True), ('strbt', False, True, True),
+            ('ldrb', True, True, False), ('strb', False, True, False),
+            ('ldrt', True, False, True), ('strt', False, False, True),
+            ('ldr', True, False, False), ('str', False, False, False)):
+        # Unified syntax: ldrbne; divided syntax: ldrneb
+        for cond_name, cond in CONDITIONS.items():
+            base = name[:3]
+            if mnemonic in (name + cond_name, base + cond_name + name[3:]):
+                return _encode_data_transfer(
+                    load, byte, translated, cond, operands, address, labels)
+    # b followed by a condition takes precedence, e.g. "bls" is not "bl" + "s"
+    for link in (False, True):
+        prefix = 'bl' if link else 'b'
+        cond_name = mnemonic[len(prefix):]
+        if mnemonic.startswith(prefix) and cond_name in CONDITIONS:
+            return _encode_branch(link, CONDITIONS[cond_name], operands, address, labels)
+    raise ValueError(f'Unknown instruction "{mnemonic}"')
+
+def _parse_lines(source):
+    """Yields (line number, labels, mnemonic, operands) of each source line"""
+    for line_number, line in enumerate(source.splitlines(), start=1):
+        line = line.split('@', 1)[0].split('//', 1)[0].strip()
+        labels = list()
+        match = _LABEL_RE.match(line)
+        while match:
+            labels.append(match.group(1))
+            line = line[match.end():].strip()
+            match = _LABEL_RE.match(line)
+        if not line:
+            yield line_number, labels, None, list()
+            continue
+        parts = line.split(None, 1)
+        operands = _split_operands(parts[1]) if len(parts) > 1 else list()
+        yield line_number, labels, parts[0], operands
+
+def _is_ignored_directive(mnemonic):
+    return mnemonic.startswith('.') and mnemonic.lower() != '.word'
+
+def assemble(source):
+    """
+    Assembles source code into a list of 32-bit instruction words
+
+    The code starts at address 0. Raises AssemblyError on errors
+    """
+    lines = list(_parse_lines(source))
+    # First pass: label addresses
+    labels = dict()
+    address = 0
+    for line_number, line_labels, mnemonic, _ in lines:
+        for label in line_labels:
+            if label in labels:
+                raise AssemblyError(line_number, f'Duplicate label "{label}"')
+            labels[label] = address
+        if mnemonic and not _is_ignored_directive(mnemonic):
+            address += 4
+    # Second pass: encode
+    words = list()
+    for line_number, _, mnemonic, operands in lines:
+        if not mnemonic or _is_ignored_directive(mnemonic):
+            continue
+        try:
+            words.append(_encode_instruction(mnemonic, operands, len(words) * 4, labels))
+        except ValueError as exc:
+            raise AssemblyError(line_number, str(exc))
+    return words
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('source', type=argparse.FileType('r'), help='Assembly source, e.g. code.s')
+    parser.add_argument('hex', type=argparse.FileType('w'), help='Code hex file to write')
+    parser.add_argument('--raw', type=argparse.FileType('wb'), help='Raw binary to write')
+    parser.add_argument(
+        '--listing', type=argparse.FileType('w'),
+        help='Disassembly listing to write, like code.objdump')
+    args = parser.parse_args()
+
+    try:
+        words = assemble(args.source.read())
+    except AssemblyError as exc:
+        print(f'ERROR: {args.source.name}: {exc}')
+        sys.exit(1)
+    args.hex.write(''.join(f'{x:08x}\n' for x in words))
+    if args.raw:
+        args.raw.write(struct.pack(f'>{len(words)}I', *words))
+    if args.listing:
+        raw_name = args.raw.name if args.raw else 'code.raw'
+        args.listing.write(format_listing(words, raw_name=raw_name))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Disassembles ARM instructions in the format of arm-linux-gnueabi-objdump
+
+Covers the instructions the CPU implements: data processing, single data
+transfers (LDR/STR) and branches. Other instructions are shown as undefined.
+"""
+
+import argparse
+import sys
+
+REGISTER_NAMES = (
+    'r0', 'r1', 'r2', 'r3', 'r4', 'r5', 'r6', 'r7', 'r8', 'r9', 'sl', 'fp', 'ip', 'sp', 'lr',
+    'pc',
+)
+CONDITIONS = (
+    'eq', 'ne', 'cs', 'cc', 'mi', 'pl', 'vs', 'vc', 'hi', 'ls', 'ge', 'lt', 'gt', 'le', '',
+)
+DATA_OPCODES = (
+    'and', 'eor', 'sub', 'rsb', 'add', 'adc', 'sbc', 'rsc', 'tst', 'teq', 'cmp', 'cmn', 'orr',
+    'mov', 'bic', 'mvn',
+)
+# Opcodes without a destination register, and without a first operand register
+TEST_OPCODES = ('tst', 'teq', 'cmp', 'cmn')
+MOVE_OPCODES = ('mov', 'mvn')
+SHIFT_NAMES = ('lsl', 'lsr', 'asr', 'ror')
+
+NOP = 0xe1a00000
+
+def _bits(value, high, low):
+    return (value >> low) & ((1 << (high - low + 1)) - 1)
+
+def _bit(value, bit):
+    return (value >> bit) & 1
+
+def _immediate_comment(value):
+    # objdump shows larger immediates in hex as well
+    if value > 32 or value < -16:
+        return f'\t; 0x{value & 0xffffffff:x}'
+    return ''
+
+def _shift_amount(shift_type, amount):
+    # An amount of 0 encodes 32 for LSR and ASR
+    if amount == 0 and shift_type in (1, 2):
+        return 32
+    return amount
+
+def _shifted_register(inst):
+    """Formats a register operand with its shift, e.g. "r1, lsl #2" """
+    rm = REGISTER_NAMES[_bits(inst, 3, 0)]
+    shift_type = _bits(inst, 6, 5)
+    if _bit(inst, 4):
+        return f'{rm}, {SHIFT_NAMES[shift_type]} {REGISTER_NAMES[_bits(inst, 11, 8)]}'
+    amount = _bits(inst, 11, 7)
+    if amount == 0 and shift_type == 0:
+        return rm
+    if amount == 0 and shift_type == 3:
+        return f'{rm}, rrx'
+    return f'{rm}, {SHIFT_NAMES[shift_type]} #{_shift_amount(shift_type, amount)}'
+
+def _rotated_immediate(inst):
+    imm = _bits(inst, 7, 0)
+    rotate = _bits(inst, 11, 8) * 2
+    return ((imm >> rotate) | (imm << (32 - rotate))) & 0xffffffff if rotate else imm
+
+def _to_signed(value):
+    return value - (1 << 32) if value & 0x80000000 else value
+
+def _disassemble_data_processing(inst, cond):
+    opcode = DATA_OPCODES[_bits(inst, 24, 21)]
+    set_flags = 's' if _bit(inst, 20) and opcode not in TEST_OPCODES else ''
+    rd = REGISTER_NAMES[_bits(inst, 15, 12)]
+    rn = REGISTER_NAMES[_bits(inst, 19, 16)]
+    comment = ''
+    if _bit(inst, 25):
+        value = _rotated_immediate(inst)
+        operand2 = f'#{value}'
+        comment = _immediate_comment(_to_signed(value))
+    elif opcode == 'mov' and _bits(inst, 11, 4) != 0:
+        # Unified syntax shows shifted moves as shift instructions
+        rm = REGISTER_NAMES[_bits(inst, 3, 0)]
+        shift_type = _bits(inst, 6, 5)
+        if _bit(inst, 4):
+            shift = f'{SHIFT_NAMES[shift_type]}{set_flags}{cond}'
+            return f'{shift}\t{rd}, {rm}, {REGISTER_NAMES[_bits(inst, 11, 8)]}'
+        amount = _bits(inst, 11, 7)
+        if amount == 0 and shift_type == 3:
+            return f'rrx{set_flags}{cond}\t{rd}, {rm}'
+        shift = f'{SHIFT_NAMES[shift_type]}{set_flags}{cond}'
+        return f'{shift}\t{rd}, {rm}, #{_shift_amount(shift_type, amount)}'
+    else:
+        operand2 = _shifted_register(inst)
+    if opcode in TEST_OPCODES:
+        return f'{opcode}{cond}\t{rn}, {operand2}{comment}'
+    if opcode in MOVE_OPCODES:
+        return f'{opcode}{set_flags}{cond}\t{rd}, {operand2}{comment}'
+    return f'{opcode}{set_flags}{cond}\t{rd}, {rn}, {operand2}{comment}'
+
+def _disassemble_data_transfer(inst, cond, address):
+    load = _bit(inst, 20)
+    pre_index = _bit(inst, 24)
+    negative = not _bit(inst, 23)
+    writeback = _bit(inst, 21)
+    mnemonic = ('ldr' if load else 'str') + ('b' if _bit(inst, 22) else '')
+    if not pre_index and writeback:
+        # Post-indexed with W set is the user mode (translated) variant
+        mnemonic += 't'
+    rd = REGISTER_NAMES[_bits(inst, 15, 12)]
+    rn_index = _bits(inst, 19, 16)
+    rn = REGISTER_NAMES[rn_index]
+    sign = '-' if negative else ''
+    comment = ''
+    if not _bit(inst, 25):
+        offset = _bits(inst, 11, 0)
+        if rn_index == 15 and pre_index and not writeback:
+            # PC-relative: show the target address
+            target = address + 8 + (-offset if negative else offset)
+            return f'{mnemonic}{cond}\t{rd}, [pc, #{sign}{offset}]\t; 0x{target & 0xffffffff:x}'
+        if pre_index:
+            offset_text = f', #{sign}{offset}' if offset or negative else ''
+            operand = f'[{rn}{offset_text}]{"!" if writeback else ""}'
+        else:
+            operand = f'[{rn}], #{sign}{offset}'
+        comment = _immediate_comment(-offset if negative else offset)
+    else:
+        offset_text = sign + _shifted_register(inst)
+        if pre_index:
+            operand = f'[{rn}, {offset_text}]{"!" if writeback else ""}'
+        else:
+            operand = f'[{rn}], {offset_text}'
+    return f'{mnemonic}{cond}\t{rd}, {operand}{comment}'
+
+def _disassemble_branch(inst, cond, address):
+    offset = _bits(inst, 23, 0)
+    if offset & 0x800000:
+        offset -= 1 << 24
+    target = (address + 8 + offset * 4) & 0xffffffff
+    return f'{"bl" if _bit(inst, 24) else "b"}{cond}\t0x{target:x}'
+
+def _undefined(inst):
+    return f'\t; <UNDEFINED> instruction: 0x{inst:08x}'
+
+def disassemble(inst, address=0):
+    """Returns the objdump text of one instruction word at address"""
+    if inst == NOP:
+        return 'nop\t\t\t; (mov r0, r0)'
+    cond_index = _bits(inst, 31, 28)
+    if cond_index == 0xf:
+        return _undefined(inst)
+    cond = CONDITIONS[cond_index]
+    instruction_class = _bits(inst, 27, 26)
+    if instruction_class == 0b00:
+        # Multiplies, swaps and halfword transfers are not implemented
+        if not _bit(inst, 25) and _bit(inst, 4) and _bit(inst, 7):
+            return _undefined(inst)
+        opcode = DATA_OPCODES[_bits(inst, 24, 21)]
+        if opcode in TEST_OPCODES and not _bit(inst, 20):
+            # e.g. MRS/MSR, which are not implemented
+            return _undefined(inst)
+        return _disassemble_data_processing(inst, cond)
+    if instruction_class == 0b01:
+        if _bit(inst, 25) and _bit(inst, 4):
+            return _undefined(inst)
+        return _disassemble_data_transfer(inst, cond, address)
+    if instruction_class == 0b10 and _bit(inst, 25):
+        return _disassemble_branch(inst, cond, address)
+    return _undefined(inst)
+
+def format_listing(words, raw_name='code.raw'):
+    """
+    Returns the listing of instruction words like objdump --disassemble-all
+    of a big endian raw binary, which cpu_output.py reads
+    """
+    address_width = max(4, len(f'{max(len(words) - 1, 0) * 4:x}'))
+    lines = [
+        '',
+        f'{raw_name}:     file format binary',
+        '',
+        '',
+        'Disassembly of section .data:',
+        '',
+        '00000000 <.data>:',
+    ]
+    for index, inst in enumerate(words):
+        address = index * 4
+        lines.append(f'{address:>{address_width}x}:\t{inst:08x} \t{disassemble(inst, address)}')
+    return '\n'.join(lines) + '\n'
+
+def read_hex_words(hex_file):
+    """Reads the 32-bit words of a $readmemh file with one word per line"""
+    return [int(line, 16) for line in (x.strip() for x in hex_file) if line]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'hex', type=argparse.FileType('r'), help='Code hex file with one instruction per line')
+    parser.add_argument(
+        'output', type=argparse.FileType('w'), nargs='?', default=sys.stdout,
+        help='Listing to write (default: stdout)')
+    args = parser.parse_args()
+    args.output.write(format_listing(read_hex_words(args.hex)))
+
+if __name__ == '__main__':
+    main()
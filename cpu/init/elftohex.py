@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Converts the .text section of an ARM ELF object to the CPU's init files
+
+Writes the $readmemh code file with one big endian instruction word per line,
+and optionally the raw big endian binary and the disassembly listing that
+cpu_output.py reads, without running objdump.
+"""
+
+import argparse
+import struct
+import sys
+
+from armdis import format_listing
+
+ELF_MAGIC = b'\x7fELF'
+ELFCLASS32 = 1
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+def read_section(elf, section_name):
+    """Returns the contents and byte order ('<' or '>') of a section of an ELF32 file"""
+    if elf[:4] != ELF_MAGIC or elf[4] != ELFCLASS32:
+        raise ValueError('Not a 32-bit ELF file')
+    if elf[5] not in (ELFDATA2LSB, ELFDATA2MSB):
+        raise ValueError(f'Unknown ELF byte order: {elf[5]}')
+    endian = '<' if elf[5] == ELFDATA2LSB else '>'
+    section_offset, = struct.unpack_from(endian + 'I', elf, 0x20)
+    section_size, section_count, names_index = struct.unpack_from(endian + 'HHH', elf, 0x2e)
+
+    def section_header(index):
+        # name, type, flags, addr, offset, size
+        return struct.unpack_from(endian + 'IIIIII', elf, section_offset + index * section_size)
+
+    names_header = section_header(names_index)
+    names = elf[names_header[4]:names_header[4] + names_header[5]]
+    for index in range(section_count):
+        header = section_header(index)
+        name = names[header[0]:names.index(b'\0', header[0])].decode()
+        if name == section_name:
+            return elf[header[4]:header[4] + header[5]], endian
+    raise ValueError(f'No {section_name} section')
+
+def section_words(section, endian):
+    """Returns the 32-bit words of a section"""
+    if len(section) % 4:
+        raise ValueError('Section size is not a multiple of 4 bytes')
+    return list(struct.unpack(f'{endian}{len(section) // 4}I', section))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('elf', type=argparse.FileType('rb'), help='ELF object, e.g. code.o')
+    parser.add_argument('hex', type=argparse.FileType('w'), help='Code hex file to write')
+    parser.add_argument('--raw', type=argparse.FileType('wb'), help='Raw binary to write')
+    parser.add_argument(
+        '--listing', type=argparse.FileType('w'),
+        help='Disassembly listing to write, like code.objdump')
+    parser.add_argument(
+        '--section', default='.text', help='Section to convert (default: %(default)s)')
+    args = parser.parse_args()
+
+    try:
+        words = section_words(*read_section(args.elf.read(), args.section))
+    except (ValueError, struct.error) as exc:
+        print(f'ERROR: {args.elf.name}: {exc}')
+        sys.exit(1)
+    args.hex.write(''.join(f'{x:08x}\n' for x in words))
+    if args.raw:
+        args.raw.write(struct.pack(f'>{len(words)}I', *words))
+    if args.listing:
+        raw_name = args.raw.name if args.raw else 'code.raw'
+        args.listing.write(format_listing(words, raw_name=raw_name))
+
+if __name__ == '__main__':
+    main()
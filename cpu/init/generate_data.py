@@ -1,11 +1,112 @@
-with open('data.hex', 'w') as f:
-    for i in range(256):
-        result = 0
-        for j in range(4):
-            byte_value = i+j
-            if byte_value >= 256:
-                byte_value = 255 - (byte_value % 256)
-            assert byte_value < 256
-            assert byte_value >= 0
-            result += byte_value << (8*(3-j))
-        f.write(f'{result:0{8}x}\n')
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Generates the data memory image, data.hex by default
+
+The image has DATA_SIZE words (from cpu/constants.svh) unless --words is
+given. Patterns:
+
+* ramp: byte j of word i is i+j, mirrored back down past 255 (the default)
+* random: uniformly random words from --seed
+* zeros: all zeros
+* file: words from --input, a $readmemh file or a big endian raw binary,
+  padded with zeros
+"""
+
+from pathlib import Path
+import argparse
+import re
+import sys
+
+import numpy as np
+
+CONSTANTS_PATH = Path(__file__).resolve().parent.parent / 'constants.svh'
+PATTERNS = ('ramp', 'random', 'zeros', 'file')
+
+def data_size():
+    """Returns DATA_SIZE from the CPU constants"""
+    match = re.search(r'^`define\s+DATA_SIZE\s+(\d+)', CONSTANTS_PATH.read_text(), re.M)
+    return int(match.group(1))
+
+def ramp_words(num_words):
+    indices = np.arange(num_words, dtype=np.int64)[:, np.newaxis] + np.arange(4)
+    byte_values = np.where(indices >= 256, 255 - indices % 256, indices).astype(np.uint8)
+    # Byte 0 is the most significant byte
+    return byte_values.view('>u4').ravel().astype(np.uint32)
+
+def random_words(num_words, seed):
+    return np.random.default_rng(seed).integers(0, 1 << 32, num_words, dtype=np.uint32)
+
+def read_words(path):
+    """Reads the words of a $readmemh file (.hex) or a big endian raw binary"""
+    path = Path(path)
+    if path.suffix == '.hex':
+        lines = path.read_text().split()
+        return np.array([int(x, 16) for x in lines], dtype=np.uint32)
+    data = path.read_bytes()
+    if len(data) % 4:
+        raise ValueError(f'{path}: size is not a multiple of 4 bytes')
+    return np.frombuffer(data, dtype='>u4').astype(np.uint32)
+
+def file_words(num_words, path):
+    words = read_words(path)
+    if len(words) > num_words:
+        raise ValueError(f'{path}: {len(words)} words do not fit in {num_words}')
+    return np.pad(words, (0, num_words - len(words)))
+
+def generate(num_words, pattern='ramp', seed=None, input_path=None):
+    """Returns the image as an array of num_words uint32 words"""
+    if pattern == 'ramp':
+        return ramp_words(num_words)
+    if pattern == 'random':
+        return random_words(num_words, seed)
+    if pattern == 'zeros':
+        return np.zeros(num_words, dtype=np.uint32)
+    if pattern == 'file':
+        return file_words(num_words, input_path)
+    raise ValueError(f'Unknown pattern: {pattern}')
+
+def write_hex(words, hex_file):
+    hex_file.write(''.join(f'{x:08x}\n' for x in words.tolist()))
+
+def write_raw(words, raw_file):
+    raw_file.write(words.astype('>u4').tobytes())
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        'output', type=Path, nargs='?', default='data.hex',
+        help='Hex file to write (default: %(default)s)')
+    parser.add_argument(
+        '--pattern', choices=PATTERNS, default='ramp', help='Pattern (default: %(default)s)')
+    parser.add_argument(
+        '--words', type=int, default=None, help='Number of words (default: DATA_SIZE)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the random pattern')
+    parser.add_argument('--input', type=Path, help='Input file of the file pattern')
+    parser.add_argument('--raw', type=Path, help='Raw binary to write')
+    args = parser.parse_args()
+
+    if args.pattern == 'file' and args.input is None:
+        print('ERROR: The file pattern needs --input')
+        sys.exit(1)
+    num_words = data_size() if args.words is None else args.words
+    if num_words < 1 or num_words & (num_words - 1):
+        # The memory is addressed with DATA_SIZE_L2 bits
+        print(f'ERROR: --words must be a power of two to match DATA_SIZE_L2, not {num_words}')
+        sys.exit(1)
+    try:
+        words = generate(num_words, args.pattern, seed=args.seed, input_path=args.input)
+    except (OSError, ValueError) as exc:
+        print(f'ERROR: {exc}')
+        sys.exit(1)
+    # Only open the outputs now, so that errors leave them untouched
+    with args.output.open('w') as hex_file:
+        write_hex(words, hex_file)
+    if args.raw:
+        with args.raw.open('wb') as raw_file:
+            write_raw(words, raw_file)
+
+if __name__ == '__main__':
+    main()
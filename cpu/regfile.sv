@@ -28,7 +28,16 @@ module regfile(
     reg [`BIT_WIDTH-1:0] register_file [0:`REG_COUNT-2];
 
     initial begin
-        $readmemh("cpu/init/regfile.hex", register_file);
+        `ifdef SYNTHESIS
+            $readmemh("cpu/init/regfile.hex", register_file);
+        `else
+            // Simulations can load other register values with +regfile_hex=<path>
+            string regfile_hex;
+            if (!$value$plusargs("regfile_hex=%s", regfile_hex)) begin
+                regfile_hex = "cpu/init/regfile.hex";
+            end
+            $readmemh(regfile_hex, register_file);
+        `endif
     end
 
     always_comb begin
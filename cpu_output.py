@@ -1,16 +1,63 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import io
-import os
-import struct
-import subprocess
-
 """Functions to parse output from the TinyFPGA USB port"""
 
+from pathlib import Path
+import argparse
+import struct
+import sys
+
 # Adjust this number to be the number of debug bytes
 # i.e. cpu/constants.svh value minus one
 DEBUG_BYTES = 31
+# Size of one captured frame: the cycle counter byte, then the debug bytes
+FRAME_BYTES = DEBUG_BYTES + 1
+
+# Layout of the debug bytes from debug_port_vector in cpu/cpu.sv
+# Each entry is (name, byte offset, byte count, bit shift, bit count)
+DEBUG_FIELDS = (
+    ('pc', 0, 4, 0, 32),
+    ('ready_flags', 4, 1, 0, 5),
+    ('regfile_read_addr1', 5, 1, 0, 4),
+    ('regfile_read_value1', 6, 4, 0, 32),
+    ('regfile_read_addr2', 10, 1, 0, 4),
+    ('regfile_read_value2', 11, 4, 0, 32),
+    ('regfile_write_addr1', 15, 1, 0, 4),
+    ('regfile_write_value1', 16, 4, 0, 32),
+    ('regfile_update_pc', 20, 1, 6, 1),
+    ('regfile_write_enable1', 20, 1, 5, 1),
+    ('executor_condition_passes', 20, 1, 4, 1),
+    ('executor_cpsr', 20, 1, 0, 4),
+    ('fetcher_inst', 21, 4, 0, 32),
+    ('regfile_new_pc', 25, 4, 0, 32),
+)
+DEBUG_FIELD_NAMES = tuple(x[0] for x in DEBUG_FIELDS)
+# Registers addressed by the regfile ports, including the PC
+REG_COUNT = 16
+REG_PC_INDEX = 15
+# Binary output records: the cycle counter, then each debug field as uint8 or
+# uint32, little-endian without padding
+RECORD = struct.Struct('<B' + ''.join('B' if x[4] <= 8 else 'I' for x in DEBUG_FIELDS))
+# Bytes buffered by output sinks between writes to the file
+OUTPUT_BUFFER_BYTES = 1 << 20
+OUTPUT_FORMATS = ('text', 'ndjson', 'csv', 'binary')
+
+def _field_struct():
+    """Returns a struct of the byte groups of DEBUG_FIELDS, and (group, shift, mask) per field"""
+    groups = list()
+    struct_format = '>'
+    position = 0
+    parts = list()
+    for _, offset, size, shift, bits in DEBUG_FIELDS:
+        if (offset, size) not in groups:
+            struct_format += 'x' * (offset - position) + {1: 'B', 2: 'H', 4: 'I'}[size]
+            position = offset + size
+            groups.append((offset, size))
+        parts.append((groups.index((offset, size)), shift, (1 << bits) - 1))
+    return struct.Struct(struct_format), tuple(parts)
+
+_FIELD_STRUCT, _FIELD_PARTS = _field_struct()
 
 _DATA_OPCODES = {
     0b0001: 'EOR',
@@ -61,21 +108,50 @@ def _parse_code_objdump(filename):
     contents = {int(k.strip(), 16): v.strip().replace('\t', ' ') for k, v in contents}
     return contents
 
-_INST_ASM = _parse_code_objdump('cpu/init/code.objdump')
+# Listing and initial registers of the default program, independent of the
+# working directory, e.g. of simulations run from their own directories
+DEFAULT_OBJDUMP = Path(__file__).resolve().parent / 'cpu' / 'init' / 'code.objdump'
+DEFAULT_REGFILE = DEFAULT_OBJDUMP.with_name('regfile.hex')
+
+# Parsed on the first decode_instruction, since most users only decode fields
+_INST_ASM = None
+
+def load_code_objdump(filename):
+    """Use another code.objdump to show instructions, e.g. for other programs"""
+    global _INST_ASM
+    _INST_ASM = _parse_code_objdump(filename)
 
-def _decode_instruction(inst_int):
+def decode_instruction(inst_int):
+    """Returns the assembly of an instruction word from the code.objdump listing"""
+    if _INST_ASM is None:
+        load_code_objdump(DEFAULT_OBJDUMP)
     return _INST_ASM.get(inst_int, f'(could not get asm for: {hex(inst_int)})')
 
+# Bits of ready_flags of each pipeline stage, in order
+READY_FLAGS = {
+    'FET': 0b10000,
+    'DEC': 0b01000,
+    'EXE': 0b00100,
+    'MEM': 0b00010,
+    'WB': 0b00001,
+}
+# Bits of executor_cpsr, based on constants.svh
+CPSR_FLAGS = {
+    'N': 1 << 3,
+    'Z': 1 << 2,
+    'C': 1 << 1,
+    'V': 1 << 0,
+}
+
+def read_regfile_init(filename):
+    """Returns the REG_COUNT initial registers from a $readmemh file, zero where not given"""
+    with open(filename) as regfile_hex:
+        values = [int(x, 16) for x in regfile_hex.read().split()]
+    return (values + [0] * REG_COUNT)[:REG_COUNT]
+
 def _parse_ready_flags(ready_flags):
-    ready_codes = {
-        0b10000: 'FET',
-        0b01000: 'DEC',
-        0b00100: 'EXE',
-        0b00010: 'MEM',
-        0b00001: 'WB',
-    }
     asserted_ready = list()
-    for code, short_name in ready_codes.items():
+    for short_name, code in READY_FLAGS.items():
         if code & ready_flags:
             asserted_ready.append(short_name)
     if not asserted_ready:
@@ -85,67 +161,156 @@ def _parse_ready_flags(ready_flags):
 def _parse_cpsr(cpsr_int):
     assert cpsr_int >= 0
     assert cpsr_int < 2**4
-    # Based on constants.svh
-    cpsr_symbols = {
-        1 << 3: 'N',
-        1 << 2: 'Z',
-        1 << 1: 'C',
-        1 << 0: 'V',
-    }
     result = ''
-    for idx, sym_name in cpsr_symbols.items():
+    for sym_name, idx in CPSR_FLAGS.items():
         if cpsr_int & idx:
             result += sym_name
         else:
             result += ' '
     return result
 
-def _io_unpack(struct_format, buf):
-    """Reads from io.BytesIO with format according to struct_format"""
-    size = struct.calcsize(struct_format)
-    data = buf.read(size)
-    return struct.unpack(struct_format, data)
+def decode_field_values(cycle_output):
+    """Decodes one cycle output into a list of the values of DEBUG_FIELDS, in order"""
+    groups = _FIELD_STRUCT.unpack_from(cycle_output)
+    return [(groups[group] >> shift) & mask for group, shift, mask in _FIELD_PARTS]
 
-def _io_read_by_bitcount(struct_format, buf_io, *args):
-    """
-    Read multiple values from a single value and returns a tuple of those values
+def decode_cycle_output(cycle_output):
+    """Decodes one cycle output into a dict with the values of DEBUG_FIELDS"""
+    return dict(zip(DEBUG_FIELD_NAMES, decode_field_values(cycle_output)))
 
-    args specifies a sequence of bit counts
-    """
-    assert args
-    orig_value, = _io_unpack(struct_format, buf_io)
-    results = list()
-    for bitcount in reversed(args):
-        results.append(orig_value % (1 << bitcount))
-        orig_value >>= bitcount
-    return tuple(reversed(results))
-
-def parse_cycle_output(cycle_count, cycle_output):
-    """Parse one cycle output"""
+def format_cycle_output(cycle_output):
+    """Formats one cycle output as a human-readable line"""
     if int.from_bytes(cycle_output, 'little') == 0:
         # Hack to wait for initialization
-        print('Waiting...')
+        return 'Waiting...'
+    fields = decode_cycle_output(cycle_output)
+    regfile_write1_str = '<-' if fields['regfile_write_enable1'] else '//'
+    update_pc_str = '<-' if fields['regfile_update_pc'] else '//'
+    condition_passes_str = '' if fields['executor_condition_passes'] else '->!exe'
+    return (
+        f'pc={fields["pc"]} {_parse_ready_flags(fields["ready_flags"])}\t'
+        f'r{fields["regfile_read_addr1"]}->{fields["regfile_read_value1"]:#0{10}x} '
+        f'r{fields["regfile_read_addr2"]}->{fields["regfile_read_value2"]:#0{10}x} '
+        f'r{fields["regfile_write_addr1"]}{regfile_write1_str}{fields["regfile_write_value1"]:#0{10}x} '
+        f'pc{update_pc_str}{fields["regfile_new_pc"]}\t'
+        f'({_parse_cpsr(fields["executor_cpsr"])}){condition_passes_str}\t'
+        f'{decode_instruction(fields["fetcher_inst"])}'
+    )
+
+class _Sink:
+    """Buffered binary file of a sink, which adds a write(cycle_count, cycle_output) method"""
+
+    def __init__(self, filename='-'):
+        if filename == '-':
+            self.file = open(
+                sys.stdout.fileno(), 'wb', buffering=OUTPUT_BUFFER_BYTES, closefd=False)
+        else:
+            self.file = open(filename, 'wb', buffering=OUTPUT_BUFFER_BYTES)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class TextSink(_Sink):
+    """Writes the lines of format_cycle_output"""
+
+    def write(self, cycle_count, cycle_output):
+        self.file.write(format_cycle_output(cycle_output).encode() + b'\n')
+
+class NdjsonSink(_Sink):
+    """Writes one JSON object per line with the cycle counter and debug fields"""
+
+    _TEMPLATE = '{' + ','.join(f'"{x}":%d' for x in ('cycle',) + DEBUG_FIELD_NAMES) + '}\n'
+
+    def write(self, cycle_count, cycle_output):
+        values = decode_field_values(cycle_output)
+        self.file.write((self._TEMPLATE % (cycle_count, *values)).encode())
+
+class CsvSink(_Sink):
+    """Writes a header line, then one line of comma-separated values per cycle"""
+
+    _TEMPLATE = ','.join(['%d'] * (1 + len(DEBUG_FIELDS))) + '\n'
+
+    def __init__(self, filename='-'):
+        super().__init__(filename)
+        self.file.write((','.join(('cycle',) + DEBUG_FIELD_NAMES) + '\n').encode())
+
+    def write(self, cycle_count, cycle_output):
+        values = decode_field_values(cycle_output)
+        self.file.write((self._TEMPLATE % (cycle_count, *values)).encode())
+
+class BinarySink(_Sink):
+    """Writes one RECORD per cycle, e.g. for numpy.fromfile"""
+
+    def write(self, cycle_count, cycle_output):
+        self.file.write(RECORD.pack(cycle_count, *decode_field_values(cycle_output)))
+
+def open_sink(output_format, filename='-'):
+    """Returns a sink of one of OUTPUT_FORMATS writing to filename, or stdout for -"""
+    sinks = {
+        'text': TextSink,
+        'ndjson': NdjsonSink,
+        'csv': CsvSink,
+        'binary': BinarySink,
+    }
+    return sinks[output_format](filename)
+
+def parse_cycle_output(cycle_count, cycle_output, sink=None):
+    """Parse one cycle output, and print it or write it to a sink"""
+    if sink is None:
+        print(format_cycle_output(cycle_output))
+    else:
+        sink.write(cycle_count, cycle_output)
+
+def read_capture(capture_file, block_frames=4096):
+    """
+    Yields (cycle_count, cycle_output) for each frame in a capture file
+
+    Capture files are written by debug_console.py --capture and the native
+    simulation in tests/native/. The cycle count is the 8-bit cycle counter.
+    Captures encoded by trace_codec.py are decoded a block at a time.
+    """
+    # trace_codec imports this module and NumPy, so only import it here
+    import trace_codec
+    if trace_codec.is_encoded(capture_file):
+        for _, frames in trace_codec.read_encoded_chunks(capture_file):
+            block = frames.tobytes()
+            for offset in range(0, len(block), FRAME_BYTES):
+                yield block[offset], block[offset+1:offset+FRAME_BYTES]
         return
-    buf_io = io.BytesIO(cycle_output)
-    # Decode instruction from USB debug port
-    pc, ready_flags = _io_unpack('>IB', buf_io)
-    regfile_read_addr1, regfile_read_value1 = _io_unpack('>BI', buf_io)
-    regfile_read_addr2, regfile_read_value2 = _io_unpack('>BI', buf_io)
-    regfile_write_addr1, regfile_write_value1 = _io_unpack('>BI', buf_io)
-    (
-        regfile_update_pc, regfile_write_enable1,
-        executor_condition_passes, executor_cpsr
-    ) = _io_read_by_bitcount('>B', buf_io, 1, 1, 1, 4)
-    fetcher_inst, = _io_unpack('>I', buf_io)
-    regfile_new_pc, = _io_unpack('>I', buf_io)
-
-    print(f'pc={pc} {_parse_ready_flags(ready_flags)}', end='\t')
-    print(f'r{regfile_read_addr1}->{regfile_read_value1:#0{10}x}', end=' ')
-    print(f'r{regfile_read_addr2}->{regfile_read_value2:#0{10}x}', end=' ')
-    regfile_write1_str = '<-' if regfile_write_enable1 else '//'
-    print(f'r{regfile_write_addr1}{regfile_write1_str}{regfile_write_value1:#0{10}x}', end=' ')
-    update_pc_str = '<-' if regfile_update_pc else '//'
-    print(f'pc{update_pc_str}{regfile_new_pc}', end='\t')
-    condition_passes_str = '' if executor_condition_passes else '->!exe'
-    print(f'({_parse_cpsr(executor_cpsr)}){condition_passes_str}', end='\t')
-    print(_decode_instruction(fetcher_inst))
+    while True:
+        block = capture_file.read(FRAME_BYTES * block_frames)
+        for offset in range(0, len(block) - FRAME_BYTES + 1, FRAME_BYTES):
+            yield block[offset], block[offset+1:offset+FRAME_BYTES]
+        if len(block) < FRAME_BYTES * block_frames:
+            return
+
+def main():
+    parser = argparse.ArgumentParser(description='Decodes a capture file of debug port frames')
+    parser.add_argument('capture', help='Capture file to decode')
+    parser.add_argument(
+        '--objdump', default=DEFAULT_OBJDUMP,
+        help='Disassembly listing of the program (default: %(default)s)')
+    parser.add_argument(
+        '--format', choices=OUTPUT_FORMATS, default='text',
+        help='Output format (default: %(default)s)')
+    parser.add_argument(
+        '--output', default='-', help='File to write, or - for stdout (default: %(default)s)')
+    args = parser.parse_args()
+
+    load_code_objdump(args.objdump)
+    try:
+        with open(args.capture, 'rb') as capture_file, open_sink(args.format, args.output) as sink:
+            for cycle_count, cycle_output in read_capture(capture_file):
+                sink.write(cycle_count, cycle_output)
+    except BrokenPipeError:
+        # The reader exited, e.g. head; stop like other command-line tools
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Live dashboard of the CPU state, for debug_console.py --dashboard
+
+The state is updated from every frame: the register file (from the initial
+values and the writes of each frame), the counts of frames and of frames
+dropped according to gaps in the cycle counter, and the last frame. Updates
+are cheap: the fields of the last frame are only decoded when the screen is
+redrawn, at most refresh_rate times per second.
+"""
+
+import sys
+import time
+
+from cpu_output import (
+    CPSR_FLAGS, DEBUG_FIELDS, READY_FLAGS, REG_COUNT, REG_PC_INDEX, decode_cycle_output,
+    decode_field_values, decode_instruction
+)
+from frame_filter import compile_expression
+
+DEFAULT_REFRESH_RATE = 10
+_WRITE_ADDR_INDEX = [x[0] for x in DEBUG_FIELDS].index('regfile_write_addr1')
+_WRITE_VALUE_INDEX = [x[0] for x in DEBUG_FIELDS].index('regfile_write_value1')
+# ANSI escape codes
+_HOME = '\x1b[H'
+_CLEAR_LINE = '\x1b[K'
+_CLEAR_BELOW = '\x1b[J'
+_CLEAR_SCREEN = '\x1b[2J'
+_HIDE_CURSOR = '\x1b[?25l'
+_SHOW_CURSOR = '\x1b[?25h'
+
+class Dashboard:
+    """Running state of the CPU from frames, redrawn on a terminal at a capped rate"""
+
+    def __init__(self, registers, refresh_rate=DEFAULT_REFRESH_RATE, output=sys.stdout):
+        if not refresh_rate > 0:
+            raise ValueError(f'Refresh rate must be greater than 0, not {refresh_rate}')
+        self.registers = list(registers)
+        self.interval = 1 / refresh_rate
+        self.output = output
+        self.frames = 0
+        self.dropped = 0
+        self.frames_per_second = 0.0
+        self._written = compile_expression(
+            f'regfile_write_enable1 and regfile_write_addr1 != {REG_PC_INDEX}')
+        self._last_cycle = None
+        self._last_output = None
+        self._last_draw = None
+        self._frames_at_draw = 0
+
+    def update(self, cycle_count, cycle_output):
+        """Applies one frame, and redraws the screen if it is due"""
+        self.frames += 1
+        if self._last_cycle is not None:
+            # Frames with the same cycle are not passed, so a gap is dropped frames
+            self.dropped += (cycle_count - self._last_cycle - 1) & 0xff
+        self._last_cycle = cycle_count
+        self._last_output = cycle_output
+        if self._written(cycle_output):
+            values = decode_field_values(cycle_output)
+            self.registers[values[_WRITE_ADDR_INDEX]] = values[_WRITE_VALUE_INDEX]
+        now = time.monotonic()
+        if self._last_draw is None:
+            self.output.write(_HIDE_CURSOR + _CLEAR_SCREEN)
+            self._last_draw = now
+        elif now - self._last_draw >= self.interval:
+            self.frames_per_second = (self.frames - self._frames_at_draw) / (now - self._last_draw)
+            self._last_draw = now
+            self._frames_at_draw = self.frames
+            self.draw()
+
+    def lines(self):
+        """Returns the lines of the screen"""
+        lines = [
+            f'frames {self.frames:>12}   frames/s {self.frames_per_second:>10.0f}   '
+            f'dropped {self.dropped:>8}',
+        ]
+        if self._last_output is None:
+            return lines + ['Waiting for frames...']
+        fields = decode_cycle_output(self._last_output)
+        ready = ' '.join(
+            x if fields['ready_flags'] & y else '-' * len(x) for x, y in READY_FLAGS.items())
+        cpsr = ''.join(x if fields['executor_cpsr'] & y else '-' for x, y in CPSR_FLAGS.items())
+        condition = 'passes' if fields['executor_condition_passes'] else 'fails'
+        lines.extend((
+            f'pc {fields["pc"]:#010x}   ready {ready}   cpsr {cpsr}   condition {condition}',
+            f'fetched {fields["fetcher_inst"]:#010x}  {decode_instruction(fields["fetcher_inst"])}',
+            '',
+        ))
+        registers = self.registers[:]
+        registers[REG_PC_INDEX] = fields['pc']
+        for row in range(0, REG_COUNT, 4):
+            lines.append('   '.join(
+                f'{f"r{x}":>3} {registers[x]:#010x}' for x in range(row, row + 4)))
+        return lines
+
+    def draw(self):
+        """Redraws the screen in place"""
+        self.output.write(
+            _HOME + ''.join(x + _CLEAR_LINE + '\n' for x in self.lines()) + _CLEAR_BELOW)
+        self.output.flush()
+
+    def close(self):
+        """Restores the cursor, below the last screen and any messages after it"""
+        if self._last_draw is not None:
+            self.output.write(_SHOW_CURSOR)
+            self.output.flush()
+            self._last_draw = None
@@ -2,12 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import os
+import sys
 
 import serial
 import tinyprog
 import usb
 
-from cpu_output import DEBUG_BYTES, parse_cycle_output
+from cpu_output import (
+    DEBUG_BYTES, DEFAULT_REGFILE, OUTPUT_FORMATS, open_sink, parse_cycle_output,
+    read_regfile_init
+)
+from dashboard import DEFAULT_REFRESH_RATE, Dashboard
+from frame_filter import ExpressionError, FrameSelector
 
 # FPGA device USB ID
 USB_ID = '1d50:6130'
@@ -63,25 +70,87 @@ def _write_loop(port):
         # Done writing
         yield None
 
+def _discard_stdout():
+    """Sends the rest of stdout to os.devnull, after its reader exited (e.g. head)"""
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+def _parse_refresh_rate(arg):
+    """Parses --refresh-rate, which must be positive"""
+    try:
+        rate = float(arg)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected a number, got: {arg}')
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f'Must be greater than 0, got: {arg}')
+    return rate
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument(
+    display_group = parser.add_mutually_exclusive_group()
+    display_group.add_argument(
         '--verbose', '-v', action='store_true',
         help='Show debug port bytes in hex from USB serial')
+    display_group.add_argument(
+        '--dashboard', action='store_true',
+        help='Show the current PC, registers, CPSR, ready flags, frames/s and dropped frames '
+        'on a fixed screen instead of printing frames')
+    parser.add_argument(
+        '--refresh-rate', type=_parse_refresh_rate, default=DEFAULT_REFRESH_RATE,
+        help='Maximum redraws per second of the dashboard (default: %(default)s)')
+    parser.add_argument(
+        '--regfile', default=DEFAULT_REGFILE,
+        help='Initial register values for the dashboard (default: %(default)s)')
+    parser.add_argument(
+        '--capture', type=argparse.FileType('wb'),
+        help='Also write raw frames to this file (decode with cpu_output.py)')
+    parser.add_argument(
+        '--trigger', metavar='EXPR',
+        help='Only show frames around frames matching EXPR, e.g. "regfile_write_addr1 == 15 '
+        'and regfile_write_enable1" (see frame_filter.py)')
+    parser.add_argument(
+        '--filter', metavar='EXPR', help='Only show frames matching EXPR, e.g. "pc < 0x80"')
+    parser.add_argument(
+        '--pre', type=int, default=0, help='Frames to show before each trigger (default: %(default)s)')
+    parser.add_argument(
+        '--post', type=int, default=0, help='Frames to show after each trigger (default: %(default)s)')
+    parser.add_argument(
+        '--format', choices=OUTPUT_FORMATS, default='text',
+        help='Output format of frames, written through a large buffer unless printing '
+        'text to the terminal (default: %(default)s)')
+    parser.add_argument('--output', help='Write frames to this file instead of stdout')
     args = parser.parse_args()
+    if args.dashboard and args.output == '-':
+        parser.error('--dashboard draws on stdout, so --output cannot be -')
+
+    try:
+        selector = FrameSelector(args.trigger, args.filter, args.pre, args.post)
+    except ExpressionError as exc:
+        print(f'ERROR: {exc}')
+        sys.exit(1)
+    # Keep messages out of frames written to stdout
+    log_file = sys.stderr if args.format != 'text' and not args.output else sys.stdout
 
     ports = tinyprog.get_ports(USB_ID)
-    print(f'Found {len(ports)} serial port(s)')
+    print(f'Found {len(ports)} serial port(s)', file=log_file)
     if not ports:
         return
     if len(ports) > 1:
-        print('NOTE: Using first port')
+        print('NOTE: Using first port', file=log_file)
     port = ports[0]
     read_loop = _read_loop(port, verbose=args.verbose)
     # Initialize read loop to accept ch
     next(read_loop)
     write_loop = _write_loop(port)
-    print('===BEGIN SERIAL OUTPUT===')
+    # Plain text is printed as it comes in; other outputs go through a sink.
+    # The dashboard owns the screen, so frames then only go to --output.
+    sink = None
+    if args.output or (args.format != 'text' and not args.dashboard):
+        sink = open_sink(args.format, args.output or '-')
+    dashboard = None
+    if args.dashboard:
+        dashboard = Dashboard(read_regfile_init(args.regfile), args.refresh_rate)
+    print('===BEGIN SERIAL OUTPUT===', file=log_file)
     with port:
         try:
             while True:
@@ -90,11 +159,35 @@ def main():
                 cycle_count, cycle_output = read_loop.send(ch)
                 if cycle_output is not None:
                     # Cycle output is None if it is the same cycle as last time
-                    parse_cycle_output(cycle_count, cycle_output)
+                    if args.capture:
+                        args.capture.write(bytes((cycle_count,)) + cycle_output)
+                    if dashboard is not None:
+                        dashboard.update(cycle_count, cycle_output)
+                        if sink is None:
+                            continue
+                    # Expressions check the raw bytes, so only selected frames are decoded
+                    selected = selector.select(cycle_count, cycle_output)
+                    if selector.window_started and dashboard is None:
+                        print(f'=== Trigger {selector.triggers} ===', file=log_file)
+                    for frame in selected:
+                        parse_cycle_output(*frame, sink=sink)
         except KeyboardInterrupt:
-            print('Got KeyboardInterrupt. Exiting...')
+            print('Got KeyboardInterrupt. Exiting...', file=log_file)
         except serial.serialutil.SerialException as exc:
-            print(f'ERROR: Serial connection threw error: {exc}')
+            print(f'ERROR: Serial connection threw error: {exc}', file=log_file)
+        except BrokenPipeError:
+            # Stop like other command-line tools, and flush what is left to nowhere
+            _discard_stdout()
+        finally:
+            if dashboard is not None:
+                dashboard.close()
+            if args.capture:
+                args.capture.close()
+            if sink is not None:
+                try:
+                    sink.close()
+                except BrokenPipeError:
+                    _discard_stdout()
 
 if __name__ == '__main__':
     main()
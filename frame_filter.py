@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trigger and filter expressions over the debug fields of frames
+
+Expressions compare debug fields of cpu_output.DEBUG_FIELDS with constants,
+combined with and, or, not and parentheses, e.g.
+
+  regfile_write_enable1 and regfile_write_addr1 == 15
+  pc >= 0x40 and pc < 0x80 and not executor_condition_passes
+
+A field on its own is true when it is nonzero. Expressions are compiled once
+into a Python function of the debug bytes of one frame, which only checks
+bytes against masks and constants: one-byte fields are masked in place and
+multi-byte fields are compared as big-endian byte strings, so frames are not
+decoded to be checked.
+"""
+
+from collections import deque
+import re
+
+from cpu_output import DEBUG_FIELDS
+
+_FIELDS = {x[0]: x[1:] for x in DEBUG_FIELDS}
+_COMPARISONS = ('==', '!=', '<=', '>=', '<', '>')
+_TOKEN_RE = re.compile(r'\s*(?:(0[xX][0-9a-fA-F]+|0[bB][01]+|\d+)|(\w+)|(==|!=|<=|>=|<|>|\(|\)))')
+
+class ExpressionError(ValueError):
+    """An invalid trigger or filter expression"""
+
+def _tokenize(text):
+    tokens = list()
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match:
+            raise ExpressionError(f'Unexpected {text[position:].strip()!r} in {text!r}')
+        number, word, symbol = match.groups()
+        if number:
+            try:
+                tokens.append(('number', int(number, 0)))
+            except ValueError:
+                # e.g. 010, since Python has no leading zeros in decimal numbers
+                raise ExpressionError(f'Invalid number {number!r} in {text!r}')
+        elif word:
+            tokens.append(('word', word))
+        else:
+            tokens.append(('symbol', symbol))
+        position = match.end()
+    return tokens
+
+def _field_check(name, comparison=None, value=None):
+    """Returns Python source checking a field of the debug bytes d against value"""
+    offset, size, shift, bits = _FIELDS[name]
+    if comparison is None:
+        comparison, value = '!=', 0
+    if value >= 1 << bits:
+        raise ExpressionError(f'{value:#x} does not fit in {name} ({bits} bits)')
+    if size == 1:
+        # Shifting the constant instead of the field keeps the order of values
+        return f'd[{offset}] & {((1 << bits) - 1) << shift:#04x} {comparison} {value << shift:#04x}'
+    if shift == 0 and bits == 8 * size:
+        # Same-length byte strings compare like their big-endian values
+        return f'd[{offset}:{offset + size}] {comparison} {value.to_bytes(size, "big")!r}'
+    return (
+        f"(int.from_bytes(d[{offset}:{offset + size}], 'big') >> {shift} & "
+        f'{(1 << bits) - 1:#x}) {comparison} {value:#x}')
+
+class _Parser:
+    """Recursive descent parser from tokens to Python source"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def _next(self, what):
+        kind, value = self._peek()
+        if kind is None:
+            raise ExpressionError(f'Expected {what} at the end of {self.text!r}')
+        self.position += 1
+        return kind, value
+
+    def parse(self):
+        if not self.tokens:
+            raise ExpressionError('Empty expression')
+        source = self._or()
+        if self.position < len(self.tokens):
+            raise ExpressionError(f'Unexpected {self._peek()[1]!r} in {self.text!r}')
+        return source
+
+    def _or(self):
+        terms = [self._and()]
+        while self._peek() == ('word', 'or'):
+            self.position += 1
+            terms.append(self._and())
+        return ' or '.join(terms) if len(terms) == 1 else f'({" or ".join(terms)})'
+
+    def _and(self):
+        terms = [self._not()]
+        while self._peek() == ('word', 'and'):
+            self.position += 1
+            terms.append(self._not())
+        return ' and '.join(terms) if len(terms) == 1 else f'({" and ".join(terms)})'
+
+    def _not(self):
+        if self._peek() == ('word', 'not'):
+            self.position += 1
+            return f'not ({self._not()})'
+        return self._comparison()
+
+    def _comparison(self):
+        kind, value = self._next('a field')
+        if (kind, value) == ('symbol', '('):
+            source = self._or()
+            if self._next("')'") != ('symbol', ')'):
+                raise ExpressionError(f"Expected ')' in {self.text!r}")
+            return f'({source})'
+        if kind != 'word' or value not in _FIELDS:
+            raise ExpressionError(
+                f'Unknown field {value!r}, expected one of: {", ".join(_FIELDS)}')
+        name = value
+        kind, comparison = self._peek()
+        if kind != 'symbol' or comparison not in _COMPARISONS:
+            return f'({_field_check(name)})'
+        self.position += 1
+        kind, value = self._next('a number')
+        if kind != 'number':
+            raise ExpressionError(f'Expected a number after {name} {comparison}, got {value!r}')
+        return f'({_field_check(name, comparison, value)})'
+
+def compile_expression(text):
+    """
+    Compiles an expression into a function of the debug bytes of a frame
+    (cycle_output) that returns whether the frame matches. The generated
+    Python is in the source attribute of the function.
+    """
+    source = _Parser(text).parse()
+    function = eval(compile(f'lambda d: {source}', f'<expression {text!r}>', 'eval'))
+    function.source = source
+    return function
+
+class FrameSelector:
+    """
+    Selects which frames to show, from a trigger and a filter expression
+
+    Without a trigger, frames matching the filter are selected. With a
+    trigger, only frames from pre frames before to post frames after a frame
+    matching the trigger are selected, like a logic analyzer; triggers in the
+    window extend it. The filter then applies to the frames in windows.
+    """
+
+    def __init__(self, trigger=None, filter=None, pre=0, post=0):
+        self.trigger = compile_expression(trigger) if trigger else None
+        self.filter = compile_expression(filter) if filter else None
+        self.post = post
+        self.triggers = 0
+        # Whether the last frame opened a new window
+        self.window_started = False
+        self._before = deque(maxlen=pre)
+        self._remaining = 0
+
+    def select(self, cycle_count, cycle_output):
+        """Returns a list of the (cycle_count, cycle_output) to show after this frame"""
+        self.window_started = False
+        if self.trigger is None:
+            selected = [(cycle_count, cycle_output)]
+        elif self.trigger(cycle_output):
+            self.triggers += 1
+            self.window_started = self._remaining == 0
+            selected = list(self._before)
+            selected.append((cycle_count, cycle_output))
+            self._before.clear()
+            self._remaining = self.post
+        elif self._remaining:
+            self._remaining -= 1
+            selected = [(cycle_count, cycle_output)]
+        else:
+            self._before.append((cycle_count, cycle_output))
+            return []
+        if self.filter is None:
+            return selected
+        return [x for x in selected if self.filter(x[1])]
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Reports pipeline performance from a capture file: CPI, cycles lost to LDR
+stalls and branch flushes, squashed instructions and per-instruction latency
+
+A stage's ready flag is its enable from the previous cycle (see cpu/cpu.sv),
+so the enables of each cycle are read from the ready flags of the next frame.
+An enabled stage takes the instruction last taken by the stage before it,
+which follows each instruction from fetch to writeback. Frames are processed
+in chunks of arrays, so multi-million cycle captures are analyzed without a
+Python loop over the frames. Dropped frames (gaps in the cycle counter) and
+resets split the capture into segments that are analyzed separately.
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from capture_arrays import (
+    DEFAULT_CHUNK_FRAMES, STAGES, concat_columns, decode_frames, read_frame_chunks,
+    slice_columns, waiting_mask)
+from cpu_output import REG_PC_INDEX
+
+STAGE_NAMES = tuple(x[0] for x in STAGES)
+# Columns of the instructions taken by each stage
+_ENTRY_COLUMNS = ('time', 'fetch', 'address', 'valid', 'segment', 'cond_failed') + tuple(
+    f'enter_{x}' for x in range(len(STAGES)))
+# Counters kept per instruction address
+ADDRESS_COUNTERS = (
+    'cycles', 'retired', 'latency_cycles', 'ldr_stall_cycles', 'condition_failed', 'flushes',
+    'flush_cycles',
+)
+
+def _empty_entry():
+    """An invalid instruction before the start of the capture"""
+    entry = {x: np.full(1, -1, dtype=np.int64) for x in _ENTRY_COLUMNS}
+    entry['valid'] = np.zeros(1, dtype=bool)
+    entry['cond_failed'] = np.zeros(1, dtype=bool)
+    return entry
+
+class PipelineAnalyzer:
+    """Accumulates pipeline statistics over the chunks of a capture"""
+
+    def __init__(self):
+        self.counts = dict.fromkeys((
+            'frames', 'waiting_frames', 'unlinked_frames', 'cycles', 'retired',
+            'ldr_stall_cycles', 'flushes', 'flush_cycles', 'squashed', 'condition_failed',
+        ), 0)
+        self.by_address = dict()
+        self.latency_histogram = np.zeros(0, dtype=np.int64)
+        self.stage_cycles = np.zeros(len(STAGES) - 1, dtype=np.int64)
+        # Last frame, whose enables are in the next chunk
+        self._pending = None
+        self._segment = 0
+        # Per stage: the last instruction taken, if it was taken by the next
+        # stage, and the fetch time of the last instruction it took
+        self._last_entry = [_empty_entry() for _ in STAGES]
+        self._last_consumed = [False for _ in STAGES]
+        self._last_taken = [-1 for _ in STAGES]
+        # Branch waiting for the next instruction to retire: (time, address, segment)
+        self._pending_flush = None
+
+    def feed(self, frames, first_frame):
+        """Processes an array of frames starting at frame index first_frame"""
+        columns = decode_frames(frames, first_frame)
+        columns['waiting'] = waiting_mask(frames)
+        if self._pending is not None:
+            columns = concat_columns(self._pending, columns)
+        self._pending = slice_columns(columns, slice(-1, None))
+        if len(columns['frame']) >= 2:
+            self._process(columns)
+
+    def _count_by_address(self, counter, addresses, weights=None):
+        if not len(addresses):
+            return
+        unique, inverse = np.unique(addresses, return_inverse=True)
+        totals = np.bincount(inverse, weights=weights, minlength=len(unique))
+        for address, total in zip(unique.tolist(), totals.tolist()):
+            counters = self.by_address.setdefault(address, dict.fromkeys(ADDRESS_COUNTERS, 0))
+            counters[counter] += int(total)
+
+    def _process(self, columns):
+        current = slice_columns(columns, slice(None, -1))
+        next_ready = columns['ready_flags'][1:]
+        next_cycle = columns['cycle'][1:]
+        linked = (
+            ~current['waiting'] & ~columns['waiting'][1:]
+            & (next_cycle == ((current['cycle'].astype(np.int64) + 1) & 0xff)))
+        breaks = ~linked
+        segment = self._segment + np.concatenate(([0], np.cumsum(breaks)[:-1]))
+        self._segment += int(breaks.sum())
+        self.counts['frames'] += len(linked)
+        self.counts['waiting_frames'] += int(current['waiting'].sum())
+        self.counts['unlinked_frames'] += int((breaks & ~current['waiting']).sum())
+        self.counts['cycles'] += int(linked.sum())
+        # PC histogram
+        self._count_by_address('cycles', current['pc'][linked])
+        time = current['frame']
+
+        # Instructions taken by each stage
+        entries = list()
+        for stage, (_, ready_bit) in enumerate(STAGES):
+            enabled = linked & ((next_ready & ready_bit) != 0)
+            times = time[enabled]
+            if stage == 0:
+                entry = {x: np.full(len(times), -1, dtype=np.int64) for x in _ENTRY_COLUMNS}
+                entry.update(
+                    time=times, fetch=times, address=current['pc'][enabled].astype(np.int64),
+                    valid=np.ones(len(times), dtype=bool), segment=segment[enabled],
+                    cond_failed=np.zeros(len(times), dtype=bool), enter_0=times)
+                entries.append(entry)
+                continue
+            source = concat_columns(self._last_entry[stage - 1], entries[stage - 1])
+            index = np.searchsorted(source['time'], times, 'left') - 1
+            entry = slice_columns(source, index)
+            taken = entry['fetch']
+            previous_taken = np.concatenate(([self._last_taken[stage]], taken[:-1]))
+            # Taking the same instruction twice, or across a gap, takes a bubble
+            entry['valid'] = (
+                entry['valid'] & (entry['segment'] == segment[enabled]) & (taken != previous_taken))
+            entry['time'] = times
+            entry['segment'] = segment[enabled]
+            entry[f'enter_{stage}'] = times
+            if STAGE_NAMES[stage] == 'EXE':
+                failed = entry['valid'] & (current['executor_condition_passes'][enabled] == 0)
+                entry['cond_failed'] = failed
+                self.counts['condition_failed'] += int(failed.sum())
+                self._count_by_address('condition_failed', entry['address'][failed])
+            if len(times):
+                self._last_taken[stage] = int(taken[-1])
+            entries.append(entry)
+
+            # Instructions replaced in the previous stage before being taken were flushed
+            consumed = np.zeros(len(source['time']), dtype=bool)
+            consumed[0] = self._last_consumed[stage - 1]
+            consumed[index[entry['valid']]] = True
+            squashed = (
+                source['valid'][:-1] & ~consumed[:-1]
+                & (source['segment'][1:] == source['segment'][:-1]))
+            self.counts['squashed'] += int(squashed.sum())
+            if STAGE_NAMES[stage] == 'EXE':
+                # The source of the executor is the decoder
+                self._count_ldr_stalls(current, linked, source)
+            self._last_entry[stage - 1] = slice_columns(source, slice(-1, None))
+            self._last_consumed[stage - 1] = bool(consumed[-1])
+
+        self._count_retired(entries[-1])
+        self._count_flushes(current, linked, entries[-1])
+
+    def _count_ldr_stalls(self, current, linked, decoder_source):
+        # The PC does not advance while stalling, unless it is written
+        writes_pc = (
+            (current['regfile_write_enable1'] != 0)
+            & (current['regfile_write_addr1'] == REG_PC_INDEX))
+        stalled = linked & (current['regfile_update_pc'] == 0) & ~writes_pc
+        self.counts['ldr_stall_cycles'] += int(stalled.sum())
+        # Attribute the stall to the instruction in the decoder
+        index = np.searchsorted(decoder_source['time'], current['frame'][stalled], 'left') - 1
+        in_decoder = slice_columns(decoder_source, index)
+        self._count_by_address('ldr_stall_cycles', in_decoder['address'][in_decoder['valid']])
+
+    def _count_retired(self, writeback):
+        retired = slice_columns(writeback, writeback['valid'])
+        self.counts['retired'] += len(retired['time'])
+        latency = retired['time'] - retired['fetch'] + 1
+        self._count_by_address('retired', retired['address'])
+        self._count_by_address('latency_cycles', retired['address'], weights=latency)
+        histogram = np.bincount(latency) if len(latency) else np.zeros(0, dtype=np.int64)
+        size = max(len(histogram), len(self.latency_histogram))
+        self.latency_histogram = (
+            np.pad(self.latency_histogram, (0, size - len(self.latency_histogram)))
+            + np.pad(histogram, (0, size - len(histogram))))
+        for stage in range(len(STAGES) - 1):
+            self.stage_cycles[stage] += int(
+                (retired[f'enter_{stage + 1}'] - retired[f'enter_{stage}']).sum())
+
+    def _count_flushes(self, current, linked, writeback):
+        # Branches are taken when the regfilewriter writes a PC other than the next one
+        writes_pc = (
+            (current['regfile_write_enable1'] != 0)
+            & (current['regfile_write_addr1'] == REG_PC_INDEX))
+        next_pc = (current['pc'].astype(np.int64) + 4) & 0xffffffff
+        redirect = linked & (
+            writes_pc
+            | (current['regfile_update_pc'] != 0) & (current['regfile_new_pc'] != next_pc))
+        retired = slice_columns(writeback, writeback['valid'])
+        index = np.searchsorted(writeback['time'], current['frame'][redirect])
+        found = index < len(writeback['time'])
+        branch = slice_columns(writeback, index[found])
+        branch = slice_columns(
+            branch, branch['valid'] & (branch['time'] == current['frame'][redirect][found]))
+        self.counts['flushes'] += len(branch['time'])
+        self._count_by_address('flushes', branch['address'])
+
+        # Cycles until the next instruction retires
+        flush_time = branch['time']
+        flush_address = branch['address']
+        flush_segment = branch['segment']
+        if self._pending_flush is not None:
+            pending_time, pending_address, pending_segment = self._pending_flush
+            flush_time = np.concatenate(([pending_time], flush_time))
+            flush_address = np.concatenate(([pending_address], flush_address))
+            flush_segment = np.concatenate(([pending_segment], flush_segment))
+        self._pending_flush = None
+        index = np.searchsorted(retired['time'], flush_time, 'right')
+        resolved = index < len(retired['time'])
+        if len(flush_time) and not resolved[-1]:
+            self._pending_flush = (
+                int(flush_time[-1]), int(flush_address[-1]), int(flush_segment[-1]))
+        next_retired = slice_columns(retired, index[resolved])
+        same_segment = next_retired['segment'] == flush_segment[resolved]
+        lost = (next_retired['time'] - flush_time[resolved] - 1)[same_segment]
+        self.counts['flush_cycles'] += int(lost.sum())
+        self._count_by_address(
+            'flush_cycles', flush_address[resolved][same_segment], weights=lost)
+
+    def finish(self):
+        """Processes the last frame and returns the report as a dict"""
+        if self._pending is not None:
+            self.counts['frames'] += 1
+            waiting = bool(self._pending['waiting'][0])
+            self.counts['waiting_frames'] += int(waiting)
+            # Its enables are unknown
+            self.counts['unlinked_frames'] += int(not waiting)
+            self._pending = None
+        return self.report()
+
+    def report(self):
+        """Returns the statistics so far as a dict"""
+        counts = dict(self.counts)
+        lost = counts['cycles'] - counts['retired']
+        counts['cpi'] = counts['cycles'] / counts['retired'] if counts['retired'] else None
+        counts['lost_cycles'] = lost
+        counts['other_lost_cycles'] = lost - counts['ldr_stall_cycles'] - counts['flush_cycles']
+        latencies = np.nonzero(self.latency_histogram)[0]
+        retired = counts['retired']
+        counts['latency'] = {
+            'min': int(latencies[0]) if len(latencies) else None,
+            'mean': float((latencies * self.latency_histogram[latencies]).sum() / retired)
+                    if retired else None,
+            'max': int(latencies[-1]) if len(latencies) else None,
+            'histogram': {int(x): int(self.latency_histogram[x]) for x in latencies},
+        }
+        counts['stage_cycles'] = {
+            f'{STAGE_NAMES[x]}->{STAGE_NAMES[x + 1]}':
+                float(self.stage_cycles[x] / retired) if retired else None
+            for x in range(len(STAGES) - 1)
+        }
+        counts['by_address'] = {
+            f'0x{x:x}': self.by_address[x] for x in sorted(self.by_address)}
+        return counts
+
+def analyze_capture(capture_file, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """Returns the report of a capture file"""
+    analyzer = PipelineAnalyzer()
+    for first_frame, frames in read_frame_chunks(capture_file, chunk_frames):
+        analyzer.feed(frames, first_frame)
+    return analyzer.finish()
+
+def format_report(report):
+    """Formats a report as human-readable lines"""
+    def percent(value):
+        return f'{100 * value / report["cycles"]:.1f}%' if report['cycles'] else '-'
+    cpi = f'{report["cpi"]:.3f}' if report['cpi'] is not None else '-'
+    lines = [
+        f'Frames:              {report["frames"]} ({report["waiting_frames"]} waiting for reset, '
+        f'{report["unlinked_frames"]} before gaps)',
+        f'Cycles:              {report["cycles"]}',
+        f'Retired:             {report["retired"]}',
+        f'CPI:                 {cpi}',
+        f'Lost cycles:         {report["lost_cycles"]} ({percent(report["lost_cycles"])})',
+        f'  LDR stalls:        {report["ldr_stall_cycles"]} '
+        f'({percent(report["ldr_stall_cycles"])})',
+        f'  Branch flushes:    {report["flush_cycles"]} ({percent(report["flush_cycles"])}) '
+        f'in {report["flushes"]} flushes',
+        f'  Other (fill):      {report["other_lost_cycles"]}',
+        f'Squashed:            {report["squashed"]} fetched instructions flushed',
+        f'Condition failed:    {report["condition_failed"]}',
+    ]
+    latency = report['latency']
+    if latency['mean'] is not None:
+        lines.append(
+            f'Latency (fetch-WB):  min {latency["min"]}, mean {latency["mean"]:.2f}, '
+            f'max {latency["max"]} cycles')
+        lines.append('  ' + ', '.join(
+            f'{x} {y:.2f}' for x, y in report['stage_cycles'].items()))
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('capture', type=argparse.FileType('rb'), help='Capture file to analyze')
+    parser.add_argument(
+        '--json', type=argparse.FileType('w'),
+        help='Also write the report, including counters per instruction address, as JSON')
+    parser.add_argument(
+        '--chunk-frames', type=int, default=DEFAULT_CHUNK_FRAMES,
+        help='Frames to process at a time (default: %(default)s)')
+    args = parser.parse_args()
+
+    report = analyze_capture(args.capture, args.chunk_frames)
+    if not report['cycles']:
+        print('ERROR: No cycles with known pipeline state in capture')
+        sys.exit(1)
+    print(format_report(report))
+    if args.json:
+        json.dump(report, args.json, indent=4)
+        args.json.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Profiles where a program spends its cycles, from a capture file
+
+Shows the code.objdump listing with the cycles the PC was at each
+instruction, the instructions retired from it and their mean latency, and the
+LDR stall cycles, failed conditions and branch flush cycles attributed to it
+by pipeline_stats.py.
+"""
+
+import argparse
+import sys
+
+from capture_arrays import DEFAULT_CHUNK_FRAMES
+from cpu_output import DEFAULT_OBJDUMP
+from pipeline_stats import analyze_capture
+
+HEADER = ('cycles', '%', 'retired', 'latency', 'stalls', 'cfail', 'flush')
+
+def read_listing(filename):
+    """Returns the (address, instruction word, assembly) of each line of an objdump listing"""
+    with open(filename) as file:
+        contents = file.read()
+    listing = list()
+    for line in contents.split('<.data>:', 1)[-1].strip().splitlines():
+        address, rest = line.split(':', 1)
+        word, _, asm = rest.strip().partition(' ')
+        listing.append((int(address, 16), int(word, 16), asm.strip().replace('\t', ' ')))
+    return listing
+
+def _format_counters(counters, total_cycles):
+    if counters is None:
+        return [''] * len(HEADER)
+    retired = counters['retired']
+    latency = f'{counters["latency_cycles"] / retired:.2f}' if retired else '-'
+    return [
+        str(counters['cycles']),
+        f'{100 * counters["cycles"] / total_cycles:.1f}' if total_cycles else '-',
+        str(retired),
+        latency,
+        str(counters['ldr_stall_cycles'] or '-'),
+        str(counters['condition_failed'] or '-'),
+        str(counters['flush_cycles'] or '-'),
+    ]
+
+def annotate_listing(listing, report, hottest=None):
+    """
+    Returns the lines of the listing annotated with the counters per address
+    of a pipeline_stats.py report. If hottest is given, only that many of the
+    instructions with the most cycles are shown, hottest first.
+    """
+    by_address = {int(x, 16): y for x, y in report['by_address'].items()}
+    rows = [(x, f'{x:4x}:  {y:08x}  {z}') for x, y, z in listing]
+    listed = {x for x, _, _ in listing}
+    # The PC can leave the program, e.g. after a bad branch
+    rows.extend(
+        (x, f'{x:4x}:  (not in listing)') for x in sorted(by_address) if x not in listed)
+    if hottest is not None:
+        rows.sort(key=lambda x: by_address.get(x[0], {}).get('cycles', 0), reverse=True)
+        rows = rows[:hottest]
+    table = [list(HEADER) + ['']] + [
+        _format_counters(by_address.get(x), report['cycles']) + [y] for x, y in rows]
+    widths = [max(len(row[x]) for row in table) for x in range(len(HEADER))]
+    return [
+        ('  '.join(row[x].rjust(widths[x]) for x in range(len(HEADER))) + '  ' + row[-1]).rstrip()
+        for row in table
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('capture', type=argparse.FileType('rb'), help='Capture file to profile')
+    parser.add_argument(
+        '--objdump', default=DEFAULT_OBJDUMP,
+        help='Disassembly listing of the program (default: %(default)s)')
+    parser.add_argument(
+        '--top', type=int, default=None,
+        help='Only show this many instructions with the most cycles, hottest first')
+    parser.add_argument(
+        '--chunk-frames', type=int, default=DEFAULT_CHUNK_FRAMES,
+        help='Frames to process at a time (default: %(default)s)')
+    args = parser.parse_args()
+
+    listing = read_listing(args.objdump)
+    report = analyze_capture(args.capture, args.chunk_frames)
+    if not report['cycles']:
+        print('ERROR: No cycles with known pipeline state in capture')
+        sys.exit(1)
+    print('\n'.join(annotate_listing(listing, report, hottest=args.top)))
+    cpi = f'{report["cpi"]:.3f}' if report['cpi'] is not None else '-'
+    print(f'{report["cycles"]} cycles, {report["retired"]} retired, CPI {cpi}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Reconstructs the register file at any frame of a capture file
+
+Frames only show the register file write port, so the registers at frame N
+are the initial values from cpu/init/regfile.hex with the writes of all
+earlier frames applied. The index stores snapshots of all registers every
+--interval frames, so the registers at any frame are found by replaying at
+most that many frames from the nearest snapshot. The PC (r15) is read from
+the frame itself. A saved index is only used if the capture file, the
+interval and the initial registers are the same as when it was built.
+"""
+
+from pathlib import Path
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from capture_arrays import DEFAULT_CHUNK_FRAMES, decode_frames, read_frame_chunks
+from cpu_output import (
+    DEFAULT_REGFILE, FRAME_BYTES, REG_COUNT, REG_PC_INDEX, read_regfile_init
+)
+from trace_codec import is_encoded, read_frame_range
+
+DEFAULT_INTERVAL = 4096
+
+def read_regfile_hex(filename):
+    """Returns the initial registers from a $readmemh file, zero where not given"""
+    return np.array(read_regfile_init(filename), dtype=np.uint32)
+
+def _apply_writes(registers, columns):
+    """Returns registers after the writes in columns, in order"""
+    registers = registers.copy()
+    written = (columns['regfile_write_enable1'] != 0) & (
+        columns['regfile_write_addr1'] != REG_PC_INDEX)
+    addresses = columns['regfile_write_addr1'][written]
+    values = columns['regfile_write_value1'][written]
+    # The last write to each register wins
+    unique, last_reversed = np.unique(addresses[::-1], return_index=True)
+    registers[unique] = values[::-1][last_reversed]
+    return registers
+
+def capture_stamp(capture_file):
+    """Returns the (size, modification time in ns) of a capture file, or of its data"""
+    try:
+        stat = os.fstat(capture_file.fileno())
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        # Not a file, e.g. io.BytesIO
+        position = capture_file.tell()
+        size = capture_file.seek(0, os.SEEK_END)
+        capture_file.seek(position)
+        return size, 0
+
+class RegfileIndex:
+    """Register file snapshots every interval frames of a capture file"""
+
+    def __init__(self, snapshots, interval, num_frames, stamp=None):
+        self.snapshots = snapshots
+        self.interval = interval
+        self.num_frames = num_frames
+        # capture_stamp of the capture file, None if unknown
+        self.stamp = stamp
+
+    @classmethod
+    def build(cls, capture_file, initial, interval=DEFAULT_INTERVAL,
+              chunk_frames=DEFAULT_CHUNK_FRAMES):
+        """Builds the index of a capture file, from the initial registers"""
+        stamp = capture_stamp(capture_file)
+        snapshots = [initial.copy()]
+        registers = initial.copy()
+        num_frames = 0
+        capture_file.seek(0)
+        for first_frame, frames in read_frame_chunks(capture_file, chunk_frames):
+            columns = decode_frames(frames, first_frame)
+            num_frames = first_frame + len(frames)
+            # Snapshots at multiples of interval in this chunk, i.e. before those frames
+            boundaries = np.arange(
+                len(snapshots) * interval, num_frames + 1, interval) - first_frame
+            written = (columns['regfile_write_enable1'] != 0) & (
+                columns['regfile_write_addr1'] != REG_PC_INDEX)
+            chunk_snapshots = np.empty((len(boundaries), REG_COUNT), dtype=np.uint32)
+            for register in range(REG_COUNT):
+                writes = np.flatnonzero(written & (columns['regfile_write_addr1'] == register))
+                # Last write before each boundary
+                index = np.searchsorted(writes, boundaries, 'left') - 1
+                if not len(writes):
+                    chunk_snapshots[:, register] = registers[register]
+                    continue
+                values = columns['regfile_write_value1'][writes[np.maximum(index, 0)]]
+                chunk_snapshots[:, register] = np.where(index >= 0, values, registers[register])
+            snapshots.extend(chunk_snapshots)
+            registers = _apply_writes(registers, columns)
+        return cls(np.array(snapshots, dtype=np.uint32), interval, num_frames, stamp)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            # Indexes saved without a stamp are never current
+            stamp = tuple(data['stamp'].tolist()) if 'stamp' in data else None
+            return cls(
+                data['snapshots'], int(data['interval']), int(data['num_frames']), stamp)
+
+    def save(self, filename):
+        with open(filename, 'wb') as file:
+            np.savez(
+                file, snapshots=self.snapshots, interval=self.interval,
+                num_frames=self.num_frames,
+                stamp=np.array(self.stamp if self.stamp else (), dtype=np.int64))
+
+    def is_current(self, capture_file, initial, interval):
+        """Returns whether the index matches a capture file, initial registers and interval"""
+        return (
+            self.stamp is not None and self.stamp == capture_stamp(capture_file)
+            and self.interval == interval and np.array_equal(self.snapshots[0], initial))
+
+    def registers_at(self, capture_file, frame):
+        """
+        Returns the 16 registers at the start of a frame, i.e. with the writes
+        of earlier frames, by replaying from the nearest snapshot
+        """
+        if not 0 <= frame < self.num_frames:
+            raise IndexError(f'Frame {frame} not in capture of {self.num_frames} frames')
+        snapshot = frame // self.interval
+        start = snapshot * self.interval
+        if is_encoded(capture_file):
+            frames = read_frame_range(capture_file, start, frame + 1)
+        else:
+            # Frames have a fixed size, so seek to the snapshot
+            capture_file.seek(start * FRAME_BYTES)
+            data = capture_file.read((frame + 1 - start) * FRAME_BYTES)
+            frames = np.frombuffer(data, dtype=np.uint8).reshape(-1, FRAME_BYTES)
+        columns = decode_frames(frames[:-1], start)
+        registers = _apply_writes(self.snapshots[snapshot], columns)
+        registers[REG_PC_INDEX] = decode_frames(frames[-1:], frame)['pc'][0]
+        return registers
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'capture', type=argparse.FileType('rb'), help='Capture file to reconstruct from')
+    parser.add_argument(
+        'frames', type=int, nargs='+', help='Frame indices to show the registers of')
+    parser.add_argument(
+        '--regfile', default=DEFAULT_REGFILE,
+        help='Initial register values (default: %(default)s)')
+    parser.add_argument(
+        '--interval', type=int, default=DEFAULT_INTERVAL,
+        help='Frames between snapshots (default: %(default)s)')
+    parser.add_argument(
+        '--index', type=Path,
+        help='Load the index from this file if it is for this capture, otherwise build '
+             'and save it')
+    args = parser.parse_args()
+
+    initial = read_regfile_hex(args.regfile)
+    index = None
+    if args.index and args.index.is_file():
+        index = RegfileIndex.load(args.index)
+        if not index.is_current(args.capture, initial, args.interval):
+            index = None
+    if index is None:
+        index = RegfileIndex.build(args.capture, initial, args.interval)
+        if args.index:
+            index.save(args.index)
+    for frame in args.frames:
+        try:
+            registers = index.registers_at(args.capture, frame)
+        except IndexError as exc:
+            print(f'ERROR: {exc}')
+            sys.exit(1)
+        print(f'frame {frame}: ' + ' '.join(
+            f'r{x}={y:#010x}' for x, y in enumerate(registers.tolist())))
+
+if __name__ == '__main__':
+    main()
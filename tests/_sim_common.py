@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""Helpers to compile and run the cocotb simulation outside of SCons"""
+
+from pathlib import Path
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+
+TESTS_DIR = Path(__file__).resolve().parent
+ROOT_DIR = TESTS_DIR.parent
+MAKEFILE = TESTS_DIR / 'Makefile'
+
+# Must match SConstruct
+COCOTB_DUT_PATH = TESTS_DIR / 'gen' / 'cocotb_dut.sv'
+COCOTB_DUT_NAME = 'cocotb_dut'
+DEFAULT_SIM_BUILD = TESTS_DIR / 'sim_build'
+
+# Must match init_posedge_clk() in _tests_common.py
+CLOCK_PERIOD_NS = 10 * 1000
+
+# Default memory init files, which can be overridden with plusargs
+INIT_DIR = ROOT_DIR / 'cpu' / 'init'
+INIT_FILES = ('code', 'data', 'regfile')
+
+def get_test_modules():
+    """Returns the names of all cocotb test modules run by apio verify"""
+    return sorted(x.stem for x in TESTS_DIR.glob('*_cocotb.py'))
+
+def default_verilog_sources():
+    """Returns the same Verilog sources SConstruct uses for cocotb"""
+    sources = sorted((ROOT_DIR / 'cpu').glob('*.sv'))
+    sources.append(COCOTB_DUT_PATH)
+    return sources
+
+def _make_command(work_dir, verilog_sources, sim_build, target=None, **variables):
+    command = [
+        'make', '-f', str(MAKEFILE), '-C', str(work_dir),
+        f'PYTHON_BIN={sys.executable}',
+        'VERILOG_SOURCES=' + ' '.join(str(Path(x).resolve()) for x in verilog_sources),
+        f'TOPLEVEL={COCOTB_DUT_NAME}',
+        f'SIM_BUILD={Path(sim_build).resolve()}',
+    ]
+    command.extend(f'{name}={value}' for name, value in variables.items())
+    if target:
+        command.append(target)
+    return command
+
+def _run_logged(command, log_path):
+    if log_path is None:
+        return subprocess.run(command)
+    with open(log_path, 'w') as log_file:
+        return subprocess.run(command, stdout=log_file, stderr=subprocess.STDOUT)
+
+def build_sim(verilog_sources, sim_build=DEFAULT_SIM_BUILD, log_path=None, **variables):
+    """
+    Compiles the Verilator simulation once, so that many runs can share it
+
+    Returns True if the build succeeded
+    """
+    command = _make_command(
+        TESTS_DIR, verilog_sources, sim_build, target='build-sim', **variables)
+    return _run_logged(command, log_path).returncode == 0
+
+def format_plusargs(plusargs):
+    """Formats a dict of plusargs; values of True are passed as flags"""
+    return ' '.join(
+        f'+{name}' if value is True else f'+{name}={value}'
+        for name, value in plusargs.items())
+
+def run_sim(work_dir, module, verilog_sources, sim_build=DEFAULT_SIM_BUILD,
+            testcase=None, plusargs=None, log_path=None, **variables):
+    """
+    Runs cocotb tests in work_dir against an already-compiled simulation
+
+    Each run should have its own work_dir, since the simulator writes its
+    outputs (results.xml, waveforms) into the current directory.
+    Returns the subprocess.CompletedProcess
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    if testcase:
+        variables['TESTCASE'] = testcase
+    if plusargs:
+        variables['PLUSARGS'] = format_plusargs(plusargs)
+    command = _make_command(work_dir, verilog_sources, sim_build, MODULE=module, **variables)
+    return _run_logged(command, log_path)
+
+def parse_results(results_xml):
+    """
+    Parses a cocotb results.xml
+
+    Returns a list of dicts with each test's name, pass status, simulated time
+    and real time
+    """
+    results = list()
+    for testcase in ET.parse(results_xml).getroot().iter('testcase'):
+        results.append({
+            'module': testcase.get('classname'),
+            'name': testcase.get('name'),
+            'passed': (
+                testcase.find('failure') is None
+                and testcase.find('error') is None
+                and testcase.find('skipped') is None
+            ),
+            'sim_time_ns': float(testcase.get('sim_time_ns', 0)),
+            'real_time': float(testcase.get('time', 0)),
+        })
+    return results
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from pathlib import Path
+
 import cocotb
 from cocotb.clock import Clock
 from cocotb.handle import SimHandleBase
@@ -26,8 +28,19 @@ def init_posedge_clk(dut_clk):
     cocotb.fork(Clock(dut_clk, 10, 'us').start(start_high=False))
     return RisingEdge(dut_clk)
 
+# Default memory init files, independent of the directory simulations run in
+INIT_DIR = Path(__file__).resolve().parent.parent / 'cpu' / 'init'
+
+def init_file_path(name):
+    """
+    Returns the path of a memory init file (e.g. code, data, regfile)
+
+    Simulations may override the default in cpu/init/ with +<name>_hex=<path>
+    """
+    return cocotb.plusargs.get(f'{name}_hex', str(INIT_DIR / f'{name}.hex'))
+
 def read_regfile_init(mutable=False):
-    with open('cpu/init/regfile.hex') as regfile_init_hex:
+    with open(init_file_path('regfile')) as regfile_init_hex:
         hex_entries = regfile_init_hex.read().splitlines()
     result = tuple(int(line, 16) for line in hex_entries if line)
     if mutable:
@@ -37,7 +50,7 @@ def read_regfile_init(mutable=False):
 # Data memory helpers
 
 def read_data_memory_init():
-    with open('cpu/init/data.hex') as data_hex:
+    with open(init_file_path('data')) as data_hex:
         hex_entries = data_hex.read().splitlines()
         return list(int(line, 16) for line in hex_entries if line)
 
@@ -0,0 +1,30 @@
+import json
+import time
+
+import cocotb
+
+from _tests_common import init_posedge_clk
+
+# NOTE: This module is not named *_cocotb.py so it is not run by "apio verify".
+# It is run by benchmark.py
+
+@cocotb.test()
+async def test_await_overhead(dut):
+    """Measure the wall time of awaiting one clock edge"""
+
+    clkedge = init_posedge_clk(dut.cpu_clk)
+
+    # Hold the CPU in reset so the measurement is mostly cocotb and GPI overhead
+    dut.cpu_nreset <= 0
+    await clkedge
+
+    num_awaits = int(cocotb.plusargs.get('awaits', 10000))
+    start_time = time.perf_counter()
+    for _ in range(num_awaits):
+        await clkedge
+    elapsed = time.perf_counter() - start_time
+
+    dut._log.info(f'{num_awaits} awaits took {elapsed:.3f}s')
+    if 'bench_out' in cocotb.plusargs:
+        with open(cocotb.plusargs['bench_out'], 'w') as bench_file:
+            json.dump({'awaits': num_awaits, 'elapsed': elapsed}, bench_file)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks the cocotb/Verilator simulation
+
+Measures Verilator compile time, simulated cycles per wall-second of each
+cocotb test module and of a long full-CPU run, and the wall time of one await
+on a clock edge, for each Verilator build profile in tests/Makefile. Results
+are saved as JSON per commit and compared against a stored baseline.
+"""
+
+from pathlib import Path
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import time
+
+from _sim_common import (
+    CLOCK_PERIOD_NS, INIT_DIR, INIT_FILES, ROOT_DIR, TESTS_DIR, build_sim, default_verilog_sources,
+    get_test_modules, parse_results, run_sim
+)
+
+DEFAULT_WORK_DIR = TESTS_DIR / 'bench'
+DEFAULT_BASELINE = TESTS_DIR / 'bench_baseline.json'
+
+# Verilator build profiles defined in tests/Makefile
+PROFILES = ('check', 'fast')
+
+# Metrics compared against the baseline, and whether higher values are better
+METRIC_HIGHER_IS_BETTER = {
+    'compile_time': False,
+    'await_overhead_us': False,
+    'cycles_per_second': True,
+    'wall_per_cycle_us': False,
+}
+
+def _get_commit():
+    """Returns the current commit, marked if there are uncommitted changes"""
+    commit = subprocess.run(
+        ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+        stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+    status = subprocess.run(
+        ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_DIR,
+        stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+    if status:
+        commit += '-dirty'
+    return commit or 'unknown'
+
+def _speed_metrics(test_results):
+    """Computes simulation speed metrics from cocotb test results"""
+    cycles = sum(x['sim_time_ns'] for x in test_results) / CLOCK_PERIOD_NS
+    real_time = sum(x['real_time'] for x in test_results)
+    return {
+        'cycles': cycles,
+        'real_time': real_time,
+        'cycles_per_second': cycles / real_time if real_time else 0.0,
+        # Every test awaits about once per cycle, so this is mostly the
+        # Python/GPI overhead of an await
+        'wall_per_cycle_us': real_time / cycles * 1e6 if cycles else 0.0,
+    }
+
+def _run_benchmark(name, work_dir, module, verilog_sources, sim_build, profile, plusargs=None):
+    run_dir = work_dir / 'runs' / profile / name
+    # Simulations run in run_dir, so give the memory init files as absolute paths
+    plusargs = dict(plusargs or dict())
+    for init_name in INIT_FILES:
+        plusargs.setdefault(f'{init_name}_hex', (INIT_DIR / f'{init_name}.hex').resolve())
+    run_sim(
+        run_dir, module, verilog_sources, sim_build=sim_build, plusargs=plusargs,
+        log_path=run_dir / 'sim.log', PROFILE=profile)
+    results_xml = run_dir / 'results.xml'
+    if not results_xml.is_file():
+        raise RuntimeError(f'Benchmark {name} did not produce results. See {run_dir / "sim.log"}')
+    test_results = parse_results(results_xml)
+    if not all(x['passed'] for x in test_results):
+        raise RuntimeError(f'Benchmark {name} failed. See {run_dir / "sim.log"}')
+    return test_results
+
+def run_profile_benchmarks(verilog_sources, work_dir, profile, cpu_cycles, awaits, modules):
+    """Runs all benchmarks with one Verilator build profile and returns the results"""
+    results = dict()
+    # Always compile from scratch to measure compile time
+    sim_build = work_dir / 'sim_build' / profile
+    if sim_build.exists():
+        shutil.rmtree(sim_build)
+    print(f'[{profile}] Compiling simulation...')
+    build_log = work_dir / f'build-{profile}.log'
+    start_time = time.monotonic()
+    if not build_sim(verilog_sources, sim_build, log_path=build_log, PROFILE=profile):
+        raise RuntimeError(f'Simulation failed to compile. See {build_log}')
+    results['compile_time'] = time.monotonic() - start_time
+
+    print(f'[{profile}] Measuring await overhead...')
+    bench_out = work_dir / f'await-{profile}.json'
+    _run_benchmark(
+        'await', work_dir, 'bench_await', verilog_sources, sim_build, profile,
+        plusargs={'awaits': awaits, 'bench_out': bench_out.resolve()})
+    await_result = json.loads(bench_out.read_text())
+    results['await_overhead_us'] = await_result['elapsed'] / await_result['awaits'] * 1e6
+
+    results['modules'] = dict()
+    for module in modules:
+        print(f'[{profile}] Running {module}...')
+        test_results = _run_benchmark(module, work_dir, module, verilog_sources, sim_build, profile)
+        results['modules'][module] = _speed_metrics(test_results)
+
+    print(f'[{profile}] Running full CPU for {cpu_cycles} cycles...')
+    test_results = _run_benchmark(
+        'full_cpu', work_dir, 'cpu_cocotb', verilog_sources, sim_build, profile,
+        plusargs={'cycles': cpu_cycles, 'quiet': True})
+    results['full_cpu'] = _speed_metrics(test_results)
+    return results
+
+def run_benchmarks(verilog_sources, work_dir, profiles, cpu_cycles, awaits, modules):
+    """Runs all benchmarks for each profile and returns the results"""
+    results = {
+        'commit': _get_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'profiles': dict(),
+    }
+    for profile in profiles:
+        results['profiles'][profile] = run_profile_benchmarks(
+            verilog_sources, work_dir, profile, cpu_cycles, awaits, modules)
+    return results
+
+def _flatten_metrics(results):
+    """Yields (metric name, value, higher is better) for comparisons"""
+    for profile, profile_results in results.get('profiles', dict()).items():
+        for metric, higher_is_better in METRIC_HIGHER_IS_BETTER.items():
+            if metric in profile_results:
+                yield f'{profile}.{metric}', profile_results[metric], higher_is_better
+        entries = [('full_cpu', profile_results.get('full_cpu', dict()))]
+        entries.extend(profile_results.get('modules', dict()).items())
+        for entry_name, entry in entries:
+            for metric, higher_is_better in METRIC_HIGHER_IS_BETTER.items():
+                if metric in entry:
+                    yield f'{profile}.{entry_name}.{metric}', entry[metric], higher_is_better
+
+def print_summary(results):
+    """Prints the main metrics of each profile side by side"""
+    profiles = results['profiles']
+    print(f'{"metric":24}' + ''.join(f'{profile:>14}' for profile in profiles))
+    rows = (
+        ('compile time (s)', lambda x: x['compile_time']),
+        ('await overhead (us)', lambda x: x['await_overhead_us']),
+        ('full CPU cycles/s', lambda x: x['full_cpu']['cycles_per_second']),
+    )
+    for row_name, get_value in rows:
+        print(f'{row_name:24}' + ''.join(f'{get_value(x):>14.3f}' for x in profiles.values()))
+
+def compare_results(results, baseline, threshold):
+    """
+    Prints a comparison of results against a baseline
+
+    Returns the names of metrics that regressed by more than threshold percent
+    """
+    baseline_metrics = {name: value for name, value, _ in _flatten_metrics(baseline)}
+    regressions = list()
+    print(f'Comparison against baseline at commit {baseline.get("commit", "unknown")}:')
+    print(f'{"metric":48}{"baseline":>14}{"current":>14}{"change":>10}')
+    for name, value, higher_is_better in _flatten_metrics(results):
+        if name not in baseline_metrics:
+            print(f'{name:48}{"-":>14}{value:>14.3f}')
+            continue
+        baseline_value = baseline_metrics[name]
+        change = (value - baseline_value) / baseline_value * 100 if baseline_value else 0.0
+        regressed = -change > threshold if higher_is_better else change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f'{name:48}{baseline_value:>14.3f}{value:>14.3f}{change:>+9.1f}%{" REGRESSION" if regressed else ""}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--verilog-sources', nargs='+', type=Path, default=default_verilog_sources(),
+        help='Verilog sources of the cocotb DUT (default: same as SConstruct)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for benchmark builds and results (default: %(default)s)')
+    parser.add_argument(
+        '--profiles', nargs='+', choices=PROFILES, default=PROFILES,
+        help='Verilator build profiles to benchmark (default: all)')
+    parser.add_argument(
+        '--modules', nargs='+', default=get_test_modules(),
+        help='cocotb test modules to benchmark (default: all)')
+    parser.add_argument(
+        '--cpu-cycles', type=int, default=20000,
+        help='Number of cycles for the long full-CPU run (default: %(default)s)')
+    parser.add_argument(
+        '--awaits', type=int, default=10000,
+        help='Number of awaits to measure await overhead (default: %(default)s)')
+    parser.add_argument(
+        '--baseline', type=Path, default=DEFAULT_BASELINE,
+        help='Baseline results to compare against (default: %(default)s)')
+    parser.add_argument(
+        '--save-baseline', action='store_true',
+        help='Save the results as the new baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=10.0,
+        help='Percent change of a metric that counts as a regression (default: %(default)s)')
+    parser.add_argument(
+        '--fail-on-regression', action='store_true',
+        help='Exit with an error if any metric regressed')
+    args = parser.parse_args()
+
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        results = run_benchmarks(
+            args.verilog_sources, args.work_dir, args.profiles, args.cpu_cycles,
+            args.awaits, args.modules)
+    except RuntimeError as exc:
+        print(f'ERROR: {exc}')
+        sys.exit(1)
+
+    results_dir = args.work_dir / 'results'
+    results_dir.mkdir(exist_ok=True)
+    results_path = results_dir / f'{results["commit"]}.json'
+    results_path.write_text(json.dumps(results, indent=4) + '\n')
+    print(f'Saved results to {results_path}')
+    print_summary(results)
+
+    regressions = list()
+    if args.baseline.is_file():
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare_results(results, baseline, args.threshold)
+    else:
+        print(f'No baseline found at {args.baseline}')
+    if args.save_baseline:
+        shutil.copyfile(results_path, args.baseline)
+        print(f'Saved baseline to {args.baseline}')
+    if regressions and args.fail_on_regression:
+        print(f'ERROR: {len(regressions)} metric(s) regressed')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+"""
+pytest configuration for the tests of the Python tools, tests/test_*.py
+
+The cocotb tests (*_cocotb.py) run in simulations instead, see tests/Makefile.
+"""
+
+import sys
+
+import numpy as np
+import pytest
+
+from _sim_common import INIT_DIR, ROOT_DIR
+
+# The tools are scripts in the root directory and cpu/init/, not a package
+sys.path[:0] = [str(ROOT_DIR), str(INIT_DIR)]
+
+@pytest.fixture
+def rng():
+    """Random generator with a fixed seed, so failures are reproducible"""
+    return np.random.default_rng(469)
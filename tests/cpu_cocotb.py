@@ -1,12 +1,31 @@
+import json
+
 import cocotb
 
-from _tests_common import init_posedge_clk
+from _tests_common import init_file_path, init_posedge_clk
 
 from cpu_output import DEBUG_BYTES, parse_cycle_output
 
 # Padding to handle multiple cycles for startup, branching, other hazards
 PIPELINE_PADDING = 15
 
+def _read_cpu_state(dut):
+    """Reads the final architectural state of the CPU"""
+    the_regfile = dut.dut_cpu.the_regfile
+    the_data_memory = dut.dut_cpu.the_memaccessor.the_data_memory
+    return {
+        'pc': the_regfile.pc.value.integer,
+        # The regfile does not store the PC, so it has one less register
+        'regfile': [
+            the_regfile.register_file[idx].value.integer
+            for idx in range(len(the_regfile.register_file))
+        ],
+        'data_memory': [
+            the_data_memory.data_memory_ram[idx].value.integer
+            for idx in range(len(the_data_memory.data_memory_ram))
+        ],
+    }
+
 @cocotb.test()
 async def test_cpu(dut):
     """Run cpu normally and process debug port outputs"""
@@ -20,13 +39,30 @@ async def test_cpu(dut):
     await clkedge
     dut._log.debug('Reset complete')
 
-    with open('cpu/init/code.hex') as code_file:
-        num_instructions = len(code_file.read().splitlines())
+    # Number of cycles can be overridden with +cycles=<count>
+    if 'cycles' in cocotb.plusargs:
+        num_cycles = int(cocotb.plusargs['cycles'])
+    else:
+        with open(init_file_path('code')) as code_file:
+            num_instructions = len(code_file.read().splitlines())
+        num_cycles = num_instructions+PIPELINE_PADDING
+    # Skip parsing debug port outputs with +quiet
+    quiet = 'quiet' in cocotb.plusargs
 
-    print("===========BEGIN PARSED DEBUG PORT OUTPUT===========")
-    for cycle_count in range(num_instructions+PIPELINE_PADDING):
+    if not quiet:
+        print("===========BEGIN PARSED DEBUG PORT OUTPUT===========")
+    for cycle_count in range(num_cycles):
         dut._log.debug(f'Running CPU cycle {cycle_count}')
-        debug_port_bytes = dut.cpu_debug_port_vector.value.integer.to_bytes(DEBUG_BYTES, 'big')
-        parse_cycle_output(cycle_count, debug_port_bytes)
+        if not quiet:
+            debug_port_bytes = dut.cpu_debug_port_vector.value.integer.to_bytes(DEBUG_BYTES, 'big')
+            parse_cycle_output(cycle_count, debug_port_bytes)
         await clkedge
-    print("===========END PARSED DEBUG PORT OUTPUT===========")
+    if not quiet:
+        print("===========END PARSED DEBUG PORT OUTPUT===========")
+
+    # Write final CPU state with +state_out=<path> (used by run_programs.py)
+    if 'state_out' in cocotb.plusargs:
+        cpu_state = _read_cpu_state(dut)
+        cpu_state['cycles'] = num_cycles
+        with open(cocotb.plusargs['state_out'], 'w') as state_file:
+            json.dump(cpu_state, state_file)
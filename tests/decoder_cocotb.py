@@ -1,7 +1,7 @@
 import cocotb
 from cocotb.triggers import Timer
 
-from _tests_common import assert_eq, init_posedge_clk
+from _tests_common import assert_eq, init_file_path, init_posedge_clk
 
 @cocotb.test()
 async def test_decoder_assert(dut):
@@ -16,7 +16,7 @@ async def test_decoder_assert(dut):
     dut.decoder_enable <= 1
 
     # Read instruction hex
-    with open('cpu/init/code.hex') as code_hex:
+    with open(init_file_path('code')) as code_hex:
         for inst_hexstr in code_hex.read().splitlines():
             dut._log.debug('Testing decoder instruction:', inst_hexstr)
             instr = int(inst_hexstr, 16)
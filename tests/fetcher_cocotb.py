@@ -1,10 +1,10 @@
 import cocotb
 from cocotb.triggers import Timer
 
-from _tests_common import assert_eq, init_posedge_clk
+from _tests_common import assert_eq, init_file_path, init_posedge_clk
 
 def read_code_memory():
-    with open('cpu/init/code.hex') as code_hex:
+    with open(init_file_path('code')) as code_hex:
         hex_entries = code_hex.read().splitlines()
         return tuple(int(line, 16) for line in hex_entries if line)
 
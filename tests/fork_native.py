@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Runs random variants of a scenario from a checkpoint of the native simulation
+
+The program prefix is simulated once up to a cycle or PC, where a checkpoint
+is saved. Each variant then continues from the checkpoint in parallel, with
+random values in the chosen registers and data memory words, and writes its
+own capture file, which can be decoded with cpu_output.py.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+
+from _sim_common import INIT_FILES, ROOT_DIR, TESTS_DIR
+from run_native import build_native, native_command
+
+# cpu_output.py is in the root directory, which is not a package
+sys.path.insert(0, str(ROOT_DIR))
+from cpu_output import FRAME_BYTES
+
+DEFAULT_WORK_DIR = TESTS_DIR / 'fork'
+
+def save_checkpoint(checkpoint, cycle, pc, init_paths, log_path):
+    """Simulates up to the checkpoint and saves it; returns True if successful"""
+    # cycles only bounds the search for the PC
+    command = native_command(
+        cycle + 1 if cycle is not None else 2**63, os.devnull, init_paths=init_paths,
+        save=checkpoint, save_cycle=cycle, save_pc=pc, exit_after_save=True)
+    with open(log_path, 'w') as log_file:
+        result = subprocess.run(command, cwd=ROOT_DIR, stdout=log_file, stderr=subprocess.STDOUT)
+    return result.returncode == 0
+
+def make_variants(count, seed, regs, mem_addrs):
+    """Returns count variants, each a dict of random register and memory values"""
+    rng = random.Random(seed)
+    variants = list()
+    for _ in range(count):
+        variants.append({
+            'regs': {reg: rng.getrandbits(32) for reg in regs},
+            'mems': {addr: rng.getrandbits(32) for addr in mem_addrs},
+        })
+    return variants
+
+def _last_pc(capture):
+    """Returns the PC of the last frame in a capture, or None if it is empty"""
+    with open(capture, 'rb') as capture_file:
+        capture_file.seek(0, os.SEEK_END)
+        if capture_file.tell() < FRAME_BYTES:
+            return None
+        capture_file.seek(-FRAME_BYTES, os.SEEK_END)
+        return int.from_bytes(capture_file.read(FRAME_BYTES)[1:5], 'big')
+
+def run_variant(index, variant, checkpoint, cycles, work_dir):
+    """Runs one variant from the checkpoint and returns its result"""
+    variant_dir = work_dir / f'variant{index:04d}'
+    variant_dir.mkdir(parents=True, exist_ok=True)
+    capture = variant_dir / 'capture.bin'
+    (variant_dir / 'variant.json').write_text(json.dumps(variant, indent=4) + '\n')
+    command = native_command(
+        cycles, capture, restore=checkpoint, set_regs=variant['regs'],
+        set_mems=variant['mems'])
+    with open(variant_dir / 'sim.log', 'w') as log_file:
+        returncode = subprocess.run(
+            command, cwd=ROOT_DIR, stdout=log_file, stderr=subprocess.STDOUT).returncode
+    return {
+        'index': index,
+        'passed': returncode == 0,
+        'capture': capture,
+        'frames': capture.stat().st_size // FRAME_BYTES if capture.is_file() else 0,
+        'last_pc': _last_pc(capture) if returncode == 0 else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    checkpoint_group = parser.add_mutually_exclusive_group(required=True)
+    checkpoint_group.add_argument(
+        '--save-cycle', type=int, help='Cycle to save the checkpoint at')
+    checkpoint_group.add_argument(
+        '--save-pc', type=lambda x: int(x, 0),
+        help='Save the checkpoint at the first cycle with this PC')
+    checkpoint_group.add_argument(
+        '--checkpoint', type=Path, help='Use an existing checkpoint from run_native.py --save')
+    parser.add_argument(
+        '--cycles', type=int, default=1000,
+        help='Cycle to stop each variant at, counting from reset (default: %(default)s)')
+    parser.add_argument(
+        '--variants', type=int, default=8, help='Number of variants (default: %(default)s)')
+    parser.add_argument(
+        '--random-regs', type=int, nargs='+', default=list(), metavar='N',
+        help='Registers (r0 to r14) to randomize in each variant')
+    parser.add_argument(
+        '--random-mem', type=lambda x: int(x, 0), nargs='+', default=list(), metavar='ADDR',
+        help='Data memory byte addresses to randomize in each variant')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: %(default)s)')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help='Number of variants to run in parallel (default: number of CPUs)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for the checkpoint and variant captures (default: %(default)s)')
+    for init_name in INIT_FILES:
+        parser.add_argument(
+            f'--{init_name}', type=Path,
+            help=f'Path to {init_name}.hex (default: cpu/init/{init_name}.hex)')
+    args = parser.parse_args()
+    if any(not 0 <= reg < 15 for reg in args.random_regs):
+        parser.error('--random-regs must be between 0 and 14; the PC cannot be set')
+
+    if not build_native():
+        print('ERROR: Native simulation failed to build')
+        sys.exit(1)
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = args.checkpoint
+    if checkpoint is None:
+        checkpoint = args.work_dir / 'checkpoint.bin'
+        init_paths = {x: getattr(args, x) for x in INIT_FILES}
+        log_path = args.work_dir / 'checkpoint.log'
+        if not save_checkpoint(checkpoint, args.save_cycle, args.save_pc, init_paths, log_path):
+            print(f'ERROR: Could not save the checkpoint. See {log_path}')
+            sys.exit(1)
+        print(f'Saved checkpoint to {checkpoint}')
+
+    variants = make_variants(args.variants, args.seed, args.random_regs, args.random_mem)
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(
+            lambda x: run_variant(x[0], x[1], checkpoint, args.cycles, args.work_dir),
+            enumerate(variants)))
+
+    num_failed = 0
+    for result in results:
+        if result['passed']:
+            last_pc = '-' if result['last_pc'] is None else f'{result["last_pc"]:#010x}'
+            print(f'variant {result["index"]:4d}: {result["frames"]} cycles, '
+                  f'last pc {last_pc}, {result["capture"]}')
+        else:
+            num_failed += 1
+            print(f'variant {result["index"]:4d}: FAILED, see {result["capture"].parent / "sim.log"}')
+    if num_failed:
+        print(f'ERROR: {num_failed} variant(s) failed')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+// Native Verilator simulation of the cpu module for long program runs
+// Writes one frame per cycle: the cycle counter byte followed by the debug
+// port bytes, i.e. the same capture format as debug_console.py --capture,
+// which can be decoded with cpu_output.py
+//
+// The model is built as savable, so the state at a given cycle or PC can be
+// saved to a checkpoint, and later runs can start from that checkpoint instead
+// of cycle 0. Registers and data memory can be changed after restoring, e.g.
+// to run variants of a scenario.
+//
+// Usage: Vcpu [--cycles N] [--out FILE] [--trace FILE] [--trace-start N]
+//             [--trace-stop N] [--save FILE (--save-cycle N | --save-pc ADDR)]
+//             [--exit-after-save] [--restore FILE] [--set-reg N=VALUE]...
+//             [--set-mem ADDR=VALUE]... [+code_hex=PATH] [+data_hex=PATH]
+//             [+regfile_hex=PATH]
+
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <memory>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "Vcpu.h"
+#include "verilated.h"
+#include "verilated_save.h"
+#include "verilated_vpi.h"
+#if VM_TRACE
+#if VM_TRACE_FST
+#include "verilated_fst_c.h"
+typedef VerilatedFstC TraceFile;
+#else
+#include "verilated_vcd_c.h"
+typedef VerilatedVcdC TraceFile;
+#endif
+#endif
+
+// Must match DEBUG_BYTES in cpu_output.py (i.e. cpu/constants.svh minus one)
+static const int DEBUG_BYTES = 31;
+// Cycle counter byte followed by the debug bytes
+static const int FRAME_BYTES = DEBUG_BYTES + 1;
+// Must match the clock period in tests/_tests_common.py, in us
+static const vluint64_t CLOCK_PERIOD = 10;
+
+static vluint64_t main_time = 0;
+double sc_time_stamp() { return main_time; }
+
+// Signals made public in native.vlt, for changing state after a restore
+static const char* REGFILE_NAME = "cpu.the_regfile.register_file";
+static const char* DATA_MEMORY_NAME = "cpu.the_memaccessor.the_data_memory.data_memory_ram";
+
+struct Options {
+    // Cycle to stop at; restored runs continue from the checkpoint's cycle
+    vluint64_t cycles = 1000;
+    const char* out_path = "capture.bin";
+    const char* trace_path = nullptr;
+    vluint64_t trace_start = 0;
+    vluint64_t trace_stop = ~0ULL;
+    const char* save_path = nullptr;
+    vluint64_t save_cycle = ~0ULL;
+    bool has_save_pc = false;
+    uint32_t save_pc = 0;
+    bool exit_after_save = false;
+    const char* restore_path = nullptr;
+    // (index, value) pairs to write after restoring
+    std::vector<std::pair<uint32_t, uint32_t>> set_regs;
+    std::vector<std::pair<uint32_t, uint32_t>> set_mems;
+};
+
+static void usage(const char* program) {
+    fprintf(stderr,
+            "Usage: %s [--cycles N] [--out FILE] [--trace FILE] [--trace-start N]\n"
+            "       [--trace-stop N] [--save FILE (--save-cycle N | --save-pc ADDR)]\n"
+            "       [--exit-after-save] [--restore FILE] [--set-reg N=VALUE]...\n"
+            "       [--set-mem ADDR=VALUE]... [+code_hex=PATH] [+data_hex=PATH]\n"
+            "       [+regfile_hex=PATH]\n",
+            program);
+}
+
+// Parses "INDEX=VALUE" for --set-reg and --set-mem
+static bool parse_assignment(const char* arg, std::pair<uint32_t, uint32_t>& assignment) {
+    char* end = nullptr;
+    assignment.first = strtoul(arg, &end, 0);
+    if (end == arg || *end != '=') return false;
+    const char* value = end + 1;
+    assignment.second = strtoul(value, &end, 0);
+    return end != value && *end == '\0';
+}
+
+static bool parse_options(int argc, char** argv, Options& options) {
+    for (int idx = 1; idx < argc; idx++) {
+        const char* arg = argv[idx];
+        const bool has_value = idx + 1 < argc;
+        if (arg[0] == '+') {
+            // Plusargs are read by the Verilog code
+            continue;
+        } else if (!strcmp(arg, "--cycles") && has_value) {
+            options.cycles = strtoull(argv[++idx], nullptr, 0);
+        } else if (!strcmp(arg, "--out") && has_value) {
+            options.out_path = argv[++idx];
+        } else if (!strcmp(arg, "--trace") && has_value) {
+            options.trace_path = argv[++idx];
+        } else if (!strcmp(arg, "--trace-start") && has_value) {
+            options.trace_start = strtoull(argv[++idx], nullptr, 0);
+        } else if (!strcmp(arg, "--trace-stop") && has_value) {
+            options.trace_stop = strtoull(argv[++idx], nullptr, 0);
+        } else if (!strcmp(arg, "--save") && has_value) {
+            options.save_path = argv[++idx];
+        } else if (!strcmp(arg, "--save-cycle") && has_value) {
+            options.save_cycle = strtoull(argv[++idx], nullptr, 0);
+        } else if (!strcmp(arg, "--save-pc") && has_value) {
+            options.has_save_pc = true;
+            options.save_pc = strtoul(argv[++idx], nullptr, 0);
+        } else if (!strcmp(arg, "--exit-after-save")) {
+            options.exit_after_save = true;
+        } else if (!strcmp(arg, "--restore") && has_value) {
+            options.restore_path = argv[++idx];
+        } else if ((!strcmp(arg, "--set-reg") || !strcmp(arg, "--set-mem")) && has_value) {
+            std::pair<uint32_t, uint32_t> assignment;
+            if (!parse_assignment(argv[idx + 1], assignment)) return false;
+            if (!strcmp(arg, "--set-reg")) {
+                options.set_regs.push_back(assignment);
+            } else {
+                // Data memory addresses are bytes, but it stores words
+                assignment.first >>= 2;
+                options.set_mems.push_back(assignment);
+            }
+            idx++;
+        } else {
+            return false;
+        }
+    }
+    if (options.save_path && options.save_cycle == ~0ULL && !options.has_save_pc) {
+        return false;
+    }
+    if (!options.restore_path && (!options.set_regs.empty() || !options.set_mems.empty())) {
+        return false;
+    }
+    return true;
+}
+
+// Writes one word of a memory made public in native.vlt
+static bool set_memory_word(const char* name, uint32_t index, uint32_t value) {
+    // Depending on the Verilator version, scope names may start with TOP
+    vpiHandle memory = vpi_handle_by_name(const_cast<PLI_BYTE8*>(name), nullptr);
+    if (!memory) {
+        const std::string top_name = std::string("TOP.") + name;
+        memory = vpi_handle_by_name(const_cast<PLI_BYTE8*>(top_name.c_str()), nullptr);
+    }
+    if (!memory) return false;
+    vpiHandle word = vpi_handle_by_index(memory, index);
+    if (!word) return false;
+    s_vpi_value vpi_value;
+    vpi_value.format = vpiIntVal;
+    vpi_value.value.integer = static_cast<PLI_INT32>(value);
+    vpi_put_value(word, &vpi_value, nullptr, vpiNoDelay);
+    return true;
+}
+
+static uint32_t debug_port_pc(const uint8_t* debug_bytes) {
+    // See DEBUG_FIELDS in cpu_output.py
+    return (debug_bytes[0] << 24) | (debug_bytes[1] << 16) | (debug_bytes[2] << 8) | debug_bytes[3];
+}
+
+// Copies debug_port_vector into frame with the most significant byte first,
+// like cocotb's value.integer.to_bytes(DEBUG_BYTES, 'big') in cpu_cocotb.py
+template <typename T>
+static void pack_debug_port(const T& vector, uint8_t* frame) {
+    for (int idx = 0; idx < DEBUG_BYTES; idx++) {
+        const int bit = (DEBUG_BYTES - 1 - idx) * 8;
+        frame[idx] = (vector[bit / 32] >> (bit % 32)) & 0xff;
+    }
+}
+
+int main(int argc, char** argv) {
+    Verilated::commandArgs(argc, argv);
+    Options options;
+    if (!parse_options(argc, argv, options)) {
+        usage(argv[0]);
+        return 1;
+    }
+
+    std::unique_ptr<Vcpu> top(new Vcpu);
+#if VM_TRACE
+    std::unique_ptr<TraceFile> trace;
+    if (options.trace_path) {
+        Verilated::traceEverOn(true);
+        trace.reset(new TraceFile);
+        top->trace(trace.get(), 99);
+        trace->open(options.trace_path);
+    }
+#else
+    if (options.trace_path) {
+        fprintf(stderr, "ERROR: Tracing requires a build with TRACE=1\n");
+        return 1;
+    }
+#endif
+
+    FILE* out = fopen(options.out_path, "wb");
+    if (!out) {
+        perror(options.out_path);
+        return 1;
+    }
+    // Frames are small, so buffer writes in large blocks
+    static char out_buffer[1 << 20];
+    setvbuf(out, out_buffer, _IOFBF, sizeof(out_buffer));
+
+    vluint64_t cycle = 0;
+    // Runs one clock cycle, dumping the trace inside the window
+    auto tick = [&]() {
+#if VM_TRACE
+        const bool dump = trace && cycle >= options.trace_start && cycle < options.trace_stop;
+#endif
+        top->clk = 1;
+        top->eval();
+#if VM_TRACE
+        if (dump) trace->dump(main_time);
+#endif
+        main_time += CLOCK_PERIOD / 2;
+        top->clk = 0;
+        top->eval();
+#if VM_TRACE
+        if (dump) trace->dump(main_time);
+#endif
+        main_time += CLOCK_PERIOD / 2;
+    };
+
+    vluint64_t start_cycle = 0;
+    if (options.restore_path) {
+        // Continue from the checkpoint instead of resetting
+        VerilatedRestore restore;
+        restore.open(options.restore_path);
+        restore >> main_time >> start_cycle;
+        restore >> *top;
+        restore.close();
+        for (const auto& reg : options.set_regs) {
+            // The regfile does not store the PC (r15)
+            if (reg.first >= 15 || !set_memory_word(REGFILE_NAME, reg.first, reg.second)) {
+                fprintf(stderr, "ERROR: Could not set r%u\n", reg.first);
+                return 1;
+            }
+        }
+        for (const auto& mem : options.set_mems) {
+            if (!set_memory_word(DATA_MEMORY_NAME, mem.first, mem.second)) {
+                fprintf(stderr, "ERROR: Could not set data memory word %u\n", mem.first);
+                return 1;
+            }
+        }
+        top->eval();
+    } else {
+        // Reset CPU for one cycle, like cpu_cocotb.py
+        top->clk = 0;
+        top->nreset = 0;
+        top->eval();
+        tick();
+        top->nreset = 1;
+        tick();
+    }
+
+    uint8_t frame[FRAME_BYTES];
+    bool saved = false;
+    for (cycle = start_cycle; cycle < options.cycles && !Verilated::gotFinish(); cycle++) {
+        frame[0] = cycle & 0xff;
+        pack_debug_port(top->debug_port_vector, frame + 1);
+        if (options.save_path && !saved
+                && (cycle == options.save_cycle
+                    || (options.has_save_pc && debug_port_pc(frame + 1) == options.save_pc))) {
+            // Save before this cycle's frame, so restored runs start with it
+            VerilatedSave save;
+            save.open(options.save_path);
+            save << main_time << cycle;
+            save << *top;
+            save.close();
+            saved = true;
+            fprintf(stderr, "Saved checkpoint at cycle %llu to %s\n",
+                    static_cast<unsigned long long>(cycle), options.save_path);
+            if (options.exit_after_save) break;
+        }
+        fwrite(frame, 1, FRAME_BYTES, out);
+        tick();
+    }
+    if (options.save_path && !saved) {
+        fprintf(stderr, "ERROR: Did not reach the checkpoint\n");
+        return 2;
+    }
+
+    top->final();
+#if VM_TRACE
+    if (trace) trace->close();
+#endif
+    fclose(out);
+    return 0;
+}
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Runs a program on the native Verilator simulation of the cpu module
+
+The simulation runs without cocotb and writes the debug port frames of every
+cycle to a capture file, which is decoded afterwards with cpu_output.py.
+Runs can save a checkpoint at a given cycle or PC, and later runs can continue
+from it instead of simulating the program prefix again.
+"""
+
+from pathlib import Path
+import argparse
+import subprocess
+import sys
+
+from _sim_common import INIT_DIR, INIT_FILES, ROOT_DIR, TESTS_DIR
+
+NATIVE_DIR = TESTS_DIR / 'native'
+NATIVE_MAKEFILE = NATIVE_DIR / 'Makefile'
+DEFAULT_CAPTURE = NATIVE_DIR / 'capture.bin'
+
+def native_binary(trace=False):
+    """Returns the path of the native simulation binary"""
+    return NATIVE_DIR / 'build' / ('trace' if trace else 'notrace') / 'Vcpu'
+
+def build_native(trace=False):
+    """Builds the native simulation if needed; returns True if successful"""
+    command = ['make', '-f', str(NATIVE_MAKEFILE), f'TRACE={1 if trace else 0}']
+    return subprocess.run(command, cwd=ROOT_DIR).returncode == 0
+
+def native_command(cycles, capture, init_paths=None, trace=None, trace_start=None,
+                   trace_stop=None, save=None, save_cycle=None, save_pc=None,
+                   exit_after_save=False, restore=None, set_regs=None, set_mems=None):
+    """
+    Returns the command to run the native simulation
+
+    save writes a checkpoint at save_cycle or at the first cycle with PC
+    save_pc. restore continues from a checkpoint, up to cycle cycles, after
+    setting the registers and data memory words (by byte address) in the dicts
+    set_regs and set_mems.
+    """
+    command = [
+        str(native_binary(trace=bool(trace))), '--cycles', str(cycles),
+        '--out', str(Path(capture).resolve()),
+    ]
+    if trace:
+        command.extend(('--trace', str(Path(trace).resolve())))
+        if trace_start is not None:
+            command.extend(('--trace-start', str(trace_start)))
+        if trace_stop is not None:
+            command.extend(('--trace-stop', str(trace_stop)))
+    if save:
+        command.extend(('--save', str(Path(save).resolve())))
+        if save_cycle is not None:
+            command.extend(('--save-cycle', str(save_cycle)))
+        if save_pc is not None:
+            command.extend(('--save-pc', hex(save_pc)))
+        if exit_after_save:
+            command.append('--exit-after-save')
+    if restore:
+        command.extend(('--restore', str(Path(restore).resolve())))
+        for reg, value in (set_regs or dict()).items():
+            command.extend(('--set-reg', f'{reg}={value:#x}'))
+        for addr, value in (set_mems or dict()).items():
+            command.extend(('--set-mem', f'{addr:#x}={value:#x}'))
+    init_paths = init_paths or dict()
+    for init_name in INIT_FILES:
+        init_path = init_paths.get(init_name) or INIT_DIR / f'{init_name}.hex'
+        command.append(f'+{init_name}_hex={Path(init_path).resolve()}')
+    return command
+
+def _parse_assignment(arg):
+    """Parses INDEX=VALUE for --set-reg and --set-mem"""
+    try:
+        index, value = arg.split('=')
+        return int(index, 0), int(value, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected INDEX=VALUE, got: {arg}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--cycles', type=int, default=1000,
+        help='Cycle to stop at, counting from reset (default: %(default)s)')
+    parser.add_argument(
+        '--capture', type=Path, default=DEFAULT_CAPTURE,
+        help='Capture file to write (default: %(default)s)')
+    for init_name in INIT_FILES:
+        parser.add_argument(
+            f'--{init_name}', type=Path,
+            help=f'Path to {init_name}.hex (default: cpu/init/{init_name}.hex)')
+    parser.add_argument('--trace', type=Path, help='Write an FST waveform trace to this path')
+    parser.add_argument('--trace-start', type=int, help='First cycle to trace')
+    parser.add_argument('--trace-stop', type=int, help='Cycle to stop tracing at')
+    parser.add_argument('--save', type=Path, help='Save a checkpoint to this path')
+    save_group = parser.add_mutually_exclusive_group()
+    save_group.add_argument('--save-cycle', type=int, help='Cycle to save the checkpoint at')
+    save_group.add_argument(
+        '--save-pc', type=lambda x: int(x, 0),
+        help='Save the checkpoint at the first cycle with this PC')
+    parser.add_argument(
+        '--exit-after-save', action='store_true', help='Stop after saving the checkpoint')
+    parser.add_argument('--restore', type=Path, help='Continue from this checkpoint')
+    parser.add_argument(
+        '--set-reg', type=_parse_assignment, action='append', default=list(),
+        metavar='N=VALUE', help='Set register rN after restoring (r0 to r14)')
+    parser.add_argument(
+        '--set-mem', type=_parse_assignment, action='append', default=list(),
+        metavar='ADDR=VALUE', help='Set the data memory word at byte address ADDR after restoring')
+    parser.add_argument(
+        '--decode', action='store_true',
+        help='Decode and print the capture with cpu_output.py afterwards')
+    parser.add_argument(
+        '--objdump', type=Path, default=INIT_DIR / 'code.objdump',
+        help='Disassembly listing for --decode (default: %(default)s)')
+    args = parser.parse_args()
+    if args.save and args.save_cycle is None and args.save_pc is None:
+        parser.error('--save requires --save-cycle or --save-pc')
+    if (args.set_reg or args.set_mem) and not args.restore:
+        parser.error('--set-reg and --set-mem require --restore')
+
+    if not build_native(trace=bool(args.trace)):
+        print('ERROR: Native simulation failed to build')
+        sys.exit(1)
+    init_paths = {x: getattr(args, x) for x in INIT_FILES}
+    command = native_command(
+        args.cycles, args.capture, init_paths=init_paths, trace=args.trace,
+        trace_start=args.trace_start, trace_stop=args.trace_stop, save=args.save,
+        save_cycle=args.save_cycle, save_pc=args.save_pc,
+        exit_after_save=args.exit_after_save, restore=args.restore,
+        set_regs=dict(args.set_reg), set_mems=dict(args.set_mem))
+    if subprocess.run(command, cwd=ROOT_DIR).returncode != 0:
+        print('ERROR: Native simulation failed')
+        sys.exit(1)
+    print(f'Wrote capture to {args.capture}')
+    if args.decode:
+        subprocess.run(
+            [sys.executable, 'cpu_output.py', str(args.capture.resolve()),
+             '--objdump', str(args.objdump.resolve())],
+            cwd=ROOT_DIR)
+
+if __name__ == '__main__':
+    main()
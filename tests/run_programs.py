@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Runs a directory of CPU programs on the full CPU, one Verilator process each
+
+Each subdirectory of the programs directory is one program:
+
+    code.hex        Code memory image (required)
+    data.hex        Data memory image (default: cpu/init/data.hex)
+    regfile.hex     Initial register values (default: cpu/init/regfile.hex)
+    expected.json   Expected final state (optional), e.g.:
+                    {"cycles": 100, "pc": 64, "regfile": {"r4": "0x5"},
+                     "data_memory": {"0x10": "0xdeadbeef"}}
+
+The simulation is compiled once and shared by all runs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+
+from _sim_common import (
+    INIT_DIR, INIT_FILES, TESTS_DIR, build_sim, default_verilog_sources,
+    parse_results, run_sim
+)
+
+DEFAULT_WORK_DIR = TESTS_DIR / 'regress'
+
+# cocotb test that runs whole programs
+CPU_TEST_MODULE = 'cpu_cocotb'
+CPU_TEST_CASE = 'test_cpu'
+
+def find_programs(programs_dir):
+    """Yields (name, program directory) for all programs"""
+    for program_dir in sorted(Path(programs_dir).iterdir()):
+        if (program_dir / 'code.hex').is_file():
+            yield program_dir.name, program_dir
+
+def _read_expected(program_dir):
+    expected_path = program_dir / 'expected.json'
+    if not expected_path.is_file():
+        return dict()
+    return json.loads(expected_path.read_text())
+
+def compare_state(expected, actual):
+    """Returns a list of mismatches between expected and actual CPU state"""
+    mismatches = list()
+    if 'pc' in expected and int(str(expected['pc']), 0) != actual['pc']:
+        mismatches.append(f'pc: expected {int(str(expected["pc"]), 0):#x}, got {actual["pc"]:#x}')
+    for reg_name, value in expected.get('regfile', dict()).items():
+        value = int(str(value), 0)
+        # Registers are r0 to r15, e.g. not pc or sp
+        if not re.fullmatch(r'r(1[0-5]|[0-9])', reg_name):
+            mismatches.append(f'{reg_name}: not a register, expected r0 to r15')
+            continue
+        reg_idx = int(reg_name[1:])
+        # The regfile does not store the PC (r15)
+        actual_value = actual['pc'] if reg_idx == 15 else actual['regfile'][reg_idx]
+        if actual_value != value:
+            mismatches.append(f'{reg_name}: expected {value:#x}, got {actual_value:#x}')
+    for addr, value in expected.get('data_memory', dict()).items():
+        # Data memory is word-addressed; addresses in expected.json are bytes
+        word_idx = int(str(addr), 0) >> 2
+        value = int(str(value), 0)
+        if not 0 <= word_idx < len(actual['data_memory']):
+            mismatches.append(
+                f'mem[{addr}]: past the data memory of {len(actual["data_memory"]) * 4} bytes')
+            continue
+        if actual['data_memory'][word_idx] != value:
+            mismatches.append(
+                f'mem[{addr}]: expected {value:#x}, got {actual["data_memory"][word_idx]:#x}')
+    return mismatches
+
+def _record_expected(program_dir, actual, init_data):
+    """Writes expected.json from the actual final state"""
+    expected = {
+        'cycles': actual['cycles'],
+        'pc': hex(actual['pc']),
+        'regfile': {f'r{idx}': hex(value) for idx, value in enumerate(actual['regfile'])},
+        # Only record memory words that were changed by the program
+        'data_memory': {
+            hex(idx << 2): hex(value)
+            for idx, (value, init_value) in enumerate(zip(actual['data_memory'], init_data))
+            if value != init_value
+        },
+    }
+    (program_dir / 'expected.json').write_text(json.dumps(expected, indent=4) + '\n')
+
+def _read_hex(path):
+    return [int(line, 16) for line in Path(path).read_text().splitlines() if line]
+
+def run_program(name, program_dir, work_dir, verilog_sources, sim_build, profile, record=False):
+    """Runs one program and returns its result entry for the report"""
+    expected = _read_expected(program_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    state_path = work_dir / 'state.json'
+    if state_path.exists():
+        state_path.unlink()
+    init_paths = {
+        init_name: (program_dir / f'{init_name}.hex') if (program_dir / f'{init_name}.hex').is_file()
+        else (INIT_DIR / f'{init_name}.hex')
+        for init_name in INIT_FILES
+    }
+    plusargs = {f'{init_name}_hex': path.resolve() for init_name, path in init_paths.items()}
+    plusargs['state_out'] = state_path
+    plusargs['quiet'] = True
+    if 'cycles' in expected:
+        plusargs['cycles'] = expected['cycles']
+    start_time = time.monotonic()
+    run_sim(
+        work_dir, CPU_TEST_MODULE, verilog_sources, sim_build=sim_build,
+        testcase=CPU_TEST_CASE, plusargs=plusargs, log_path=work_dir / 'sim.log',
+        PROFILE=profile)
+    result = {
+        'name': name,
+        'wall_time': time.monotonic() - start_time,
+        'log': str(work_dir / 'sim.log'),
+        'mismatches': list(),
+    }
+    results_xml = work_dir / 'results.xml'
+    test_results = parse_results(results_xml) if results_xml.is_file() else list()
+    if not state_path.is_file() or not all(x['passed'] for x in test_results):
+        result['status'] = 'error'
+        return result
+    actual = json.loads(state_path.read_text())
+    result['cycles'] = actual['cycles']
+    if record and not expected:
+        _record_expected(program_dir, actual, _read_hex(init_paths['data']))
+        result['status'] = 'recorded'
+        return result
+    result['mismatches'] = compare_state(expected, actual)
+    result['status'] = 'fail' if result['mismatches'] else 'pass'
+    return result
+
+def _print_report(results):
+    for result in results:
+        print(f'{result["status"].upper():9}{result["name"]} ({result["wall_time"]:.2f}s)')
+        for mismatch in result['mismatches']:
+            print(f'    {mismatch}')
+        if result['status'] == 'error':
+            print(f'    See {result["log"]}')
+    counts = dict()
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print(', '.join(f'{count} {status}' for status, count in sorted(counts.items())))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('programs_dir', type=Path, help='Directory of programs to run')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help='Number of simulations to run in parallel (default: %(default)s)')
+    parser.add_argument(
+        '--verilog-sources', nargs='+', type=Path, default=default_verilog_sources(),
+        help='Verilog sources of the cocotb DUT (default: same as SConstruct)')
+    parser.add_argument(
+        '--profile', choices=('check', 'fast'), default='check',
+        help='Verilator build profile from tests/Makefile (default: %(default)s)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for simulation outputs (default: %(default)s)')
+    parser.add_argument(
+        '--sim-build', type=Path,
+        help='Verilator build directory (default: <work-dir>/sim_build/<profile>)')
+    parser.add_argument(
+        '--report', type=Path,
+        help='Write the aggregated report as JSON to this path')
+    parser.add_argument(
+        '--record', action='store_true',
+        help='Write expected.json from the results for programs without one')
+    args = parser.parse_args()
+
+    programs = list(find_programs(args.programs_dir))
+    if not programs:
+        print(f'ERROR: No programs with a code.hex found in {args.programs_dir}')
+        sys.exit(1)
+    sim_build = args.sim_build or args.work_dir / 'sim_build' / args.profile
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f'Compiling simulation into {sim_build}...')
+    build_log = args.work_dir / 'build.log'
+    if not build_sim(args.verilog_sources, sim_build, log_path=build_log, PROFILE=args.profile):
+        print(f'ERROR: Simulation failed to compile. See {build_log}')
+        sys.exit(1)
+
+    print(f'Running {len(programs)} program(s) with {args.jobs} job(s)...')
+    runs_dir = args.work_dir / 'runs'
+    if runs_dir.exists():
+        shutil.rmtree(runs_dir)
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [
+            executor.submit(
+                run_program, name, program_dir, runs_dir / name,
+                args.verilog_sources, sim_build, args.profile, args.record)
+            for name, program_dir in programs
+        ]
+        results = [future.result() for future in futures]
+    total_time = time.monotonic() - start_time
+
+    _print_report(results)
+    print(f'Total time: {total_time:.2f}s')
+    if args.report:
+        args.report.write_text(json.dumps({
+            'total_time': total_time,
+            'jobs': args.jobs,
+            'results': results,
+        }, indent=4) + '\n')
+    if any(result['status'] in ('fail', 'error') for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""Tests armasm.py and armdis.py against code.s, code.hex and code.objdump"""
+
+import pytest
+
+from armasm import AssemblyError, assemble
+from armdis import disassemble, format_listing, read_hex_words
+from _sim_common import INIT_DIR
+
+def read_code_hex():
+    with open(INIT_DIR / 'code.hex') as hex_file:
+        return read_hex_words(hex_file)
+
+def test_assemble_code_s():
+    assert assemble((INIT_DIR / 'code.s').read_text()) == read_code_hex()
+
+def test_listing_of_code_s():
+    words = assemble((INIT_DIR / 'code.s').read_text())
+    assert format_listing(words) == (INIT_DIR / 'code.objdump').read_text()
+
+def test_disassemble_code_hex():
+    assert format_listing(read_code_hex()) == (INIT_DIR / 'code.objdump').read_text()
+
+@pytest.mark.parametrize('source', [
+    'mov\tr0, #1',
+    'add\tr1, r2, r3, lsl #2',
+    'ldr\tr0, [r1, #4]',
+])
+def test_round_trip(source):
+    assert [disassemble(x) for x in assemble(source)] == [source]
+
+def test_unencodable_immediate():
+    with pytest.raises(AssemblyError, match='line 2: Immediate 257 cannot be encoded'):
+        assemble('mov r0, #1\nmov r0, #0x101')
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""Tests frame_filter.py expressions against the decoded fields of frames"""
+
+import re
+
+import numpy as np
+import pytest
+
+from cpu_output import DEBUG_FIELD_NAMES, FRAME_BYTES, decode_cycle_output
+from frame_filter import ExpressionError, FrameSelector, compile_expression
+
+NUM_FRAMES = 5000
+
+@pytest.fixture
+def outputs(rng):
+    """Random debug bytes of frames, with their decoded fields"""
+    frames = rng.integers(0, 256, (NUM_FRAMES, FRAME_BYTES - 1), dtype=np.uint8)
+    return [(x.tobytes(), decode_cycle_output(x.tobytes())) for x in frames]
+
+# Expressions covering one-byte and multi-byte fields, each comparison and
+# the operators
+@pytest.mark.parametrize('expression', [
+    'pc < 0x80000000',
+    'pc >= 0x40 and pc <= 0xffffff00',
+    'regfile_write_enable1 and regfile_write_addr1 == 15',
+    'not regfile_update_pc or regfile_new_pc != 0x12345678',
+    'executor_cpsr > 7 and (executor_condition_passes or ready_flags == 0b10000)',
+    'ready_flags >= 0x10 or regfile_read_addr1 <= 3',
+    'fetcher_inst > 0xe0000000 and not (regfile_read_value1 < 0x1000)',
+    'regfile_write_value1',
+    # Fields of the shared flags byte, which are shifted
+    'regfile_update_pc == 1 and (executor_condition_passes < 1 or regfile_write_enable1 >= 1)',
+])
+def test_matches_decoded_fields(outputs, expression):
+    compiled = compile_expression(expression)
+    # Reference: the expression as Python over the decoded fields
+    reference = re.sub(
+        r'\b(' + '|'.join(DEBUG_FIELD_NAMES) + r')\b', r"fields['\1']", expression)
+    mismatches = [
+        fields for output, fields in outputs
+        if bool(compiled(output)) != bool(eval(reference, {'fields': fields}))
+    ]
+    assert not mismatches
+
+@pytest.mark.parametrize('expression, message', [
+    ('', 'Empty expression'),
+    ('pc ==', 'Expected a number'),
+    ('pc == 010', 'Invalid number'),
+    ('pc == 0x100000000', 'does not fit'),
+    ('nonexistent', 'Unknown field'),
+    ('(pc', "Expected '\\)'"),
+    ('pc pc', 'Unexpected'),
+    ('pc == 1 $', 'Unexpected'),
+])
+def test_invalid(expression, message):
+    with pytest.raises(ExpressionError, match=message):
+        compile_expression(expression)
+
+def frame(pc):
+    return pc.to_bytes(4, 'big') + bytes(FRAME_BYTES - 5)
+
+def select_pcs(selector, pcs):
+    """Returns the PCs of the frames selected, with the cycle counts as indices"""
+    selected = list()
+    for index, pc in enumerate(pcs):
+        selected.extend(selector.select(index, frame(pc)))
+    return [int.from_bytes(x[1][:4], 'big') for x in selected]
+
+def test_filter():
+    selector = FrameSelector(filter='pc >= 8')
+    assert select_pcs(selector, [0, 4, 8, 12]) == [8, 12]
+
+def test_trigger_window():
+    selector = FrameSelector(trigger='pc == 20', pre=2, post=1)
+    pcs = [0, 4, 8, 12, 16, 20, 24, 28, 20, 32]
+    assert select_pcs(selector, pcs) == [12, 16, 20, 24, 28, 20, 32]
+    assert selector.triggers == 2
+
+def test_trigger_with_filter():
+    selector = FrameSelector(trigger='pc == 20', filter='pc != 16', pre=2, post=1)
+    assert select_pcs(selector, [0, 4, 8, 12, 16, 20, 24, 28]) == [12, 20, 24]
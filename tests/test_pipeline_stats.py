@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""Tests pipeline_stats.py on synthetic captures"""
+
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from cpu_output import FRAME_BYTES
+from pipeline_stats import analyze_capture, format_report
+
+# Cycle, PC, ready flags, write address and value, flags byte, fetched
+# instruction and new PC; the regfile read ports are left zero
+FRAME = struct.Struct('>BIB10xBIBII2x')
+NOP = 0xe1a00000
+
+def frame(cycle, pc, ready=0x1f, update_pc=True):
+    """Returns a frame of straight-line code with every stage enabled"""
+    flags = update_pc << 6 | 1 << 4
+    return FRAME.pack(cycle & 0xff, pc, ready, 0, 0, flags, NOP, pc + 4 if update_pc else pc)
+
+def straight_line(num_frames):
+    return b''.join(frame(x, 4 * x) for x in range(num_frames))
+
+def test_frame_size():
+    assert FRAME.size == FRAME_BYTES
+
+def test_straight_line():
+    report = analyze_capture(io.BytesIO(straight_line(100)))
+    # The enables of the last frame are in the next frame, which is missing
+    assert report['frames'] == 100
+    assert report['unlinked_frames'] == 1
+    assert report['cycles'] == 99
+    # Instructions retire from the fifth cycle on, one per cycle
+    assert report['retired'] == 95
+    assert report['latency']['histogram'] == {5: 95}
+    assert report['stage_cycles'] == dict.fromkeys(
+        ('FET->DEC', 'DEC->EXE', 'EXE->MEM', 'MEM->WB'), 1.0)
+    assert report['ldr_stall_cycles'] == report['flushes'] == report['squashed'] == 0
+    assert report['other_lost_cycles'] == 4
+    assert report['by_address']['0x40'] == {
+        'cycles': 1, 'retired': 1, 'latency_cycles': 5, 'ldr_stall_cycles': 0,
+        'condition_failed': 0, 'flushes': 0, 'flush_cycles': 0,
+    }
+
+def test_waiting_and_gaps():
+    frames = [frame(x, 4 * x) for x in range(100)]
+    # Dropped frames leave a gap in the cycle counter
+    del frames[50:53]
+    report = analyze_capture(io.BytesIO(bytes(FRAME_BYTES) * 3 + b''.join(frames)))
+    assert report['waiting_frames'] == 3
+    assert report['unlinked_frames'] == 2
+    assert report['cycles'] == 95
+    # The pipeline fills again after the gap
+    assert report['retired'] == 95 - 2 * 4
+
+def test_ldr_stall():
+    # The PC is held at 0x50 for a cycle
+    pcs = [4 * x for x in range(21)] + [4 * x for x in range(20, 99)]
+    frames = [frame(x, pc, update_pc=x != 20) for x, pc in enumerate(pcs)]
+    report = analyze_capture(io.BytesIO(b''.join(frames)))
+    assert report['ldr_stall_cycles'] == 1
+    assert report['by_address']['0x50']['cycles'] == 2
+
+@pytest.mark.parametrize('chunk_frames', [1, 2, 7, 64])
+def test_chunks(rng, chunk_frames):
+    frames = rng.integers(0, 256, (1000, FRAME_BYTES), dtype=np.uint8)
+    frames[:, 0] = np.arange(1000) % 256
+    # A gap in the cycle counter
+    frames[100:110, 0] += 3
+    data = frames.tobytes()
+    expected = analyze_capture(io.BytesIO(data))
+    assert analyze_capture(io.BytesIO(data), chunk_frames) == expected
+
+def test_empty():
+    report = analyze_capture(io.BytesIO(b''))
+    assert report['cycles'] == report['retired'] == 0
+    assert report['cpi'] is None
+    assert 'CPI:                 -' in format_report(report)
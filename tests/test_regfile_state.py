@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""Tests regfile_state.py against replaying every write from the start"""
+
+import io
+
+import numpy as np
+import pytest
+
+from capture_arrays import decode_frames
+from cpu_output import FRAME_BYTES, REG_COUNT, REG_PC_INDEX
+from regfile_state import RegfileIndex
+import trace_codec
+
+NUM_FRAMES = 1000
+INTERVAL = 64
+
+@pytest.fixture
+def frames(rng):
+    return rng.integers(0, 256, (NUM_FRAMES, FRAME_BYTES), dtype=np.uint8)
+
+@pytest.fixture
+def initial(rng):
+    return rng.integers(0, 1 << 32, REG_COUNT, dtype=np.uint32)
+
+def replay(frames, initial):
+    """Returns the registers at the start of each frame, one frame at a time"""
+    columns = decode_frames(frames)
+    registers = initial.copy()
+    states = list()
+    for frame in range(len(frames)):
+        state = registers.copy()
+        state[REG_PC_INDEX] = columns['pc'][frame]
+        states.append(state)
+        address = columns['regfile_write_addr1'][frame]
+        if columns['regfile_write_enable1'][frame] and address != REG_PC_INDEX:
+            registers[address] = columns['regfile_write_value1'][frame]
+    return states
+
+@pytest.mark.parametrize('encode', [False, True])
+@pytest.mark.parametrize('chunk_frames', [100, NUM_FRAMES])
+def test_registers_at(frames, initial, encode, chunk_frames):
+    capture_file = io.BytesIO(frames.tobytes())
+    if encode:
+        encoded = io.BytesIO()
+        trace_codec.encode_capture(capture_file, encoded, keyframe_interval=300)
+        capture_file = encoded
+    index = RegfileIndex.build(capture_file, initial, INTERVAL, chunk_frames)
+    assert index.num_frames == NUM_FRAMES
+    assert len(index.snapshots) == NUM_FRAMES // INTERVAL + 1
+    states = replay(frames, initial)
+    for frame in (0, 1, INTERVAL - 1, INTERVAL, 500, NUM_FRAMES - 1):
+        assert index.registers_at(capture_file, frame).tolist() == states[frame].tolist()
+    with pytest.raises(IndexError):
+        index.registers_at(capture_file, NUM_FRAMES)
+
+def test_save_load(frames, initial, tmp_path):
+    capture_file = io.BytesIO(frames.tobytes())
+    index = RegfileIndex.build(capture_file, initial, INTERVAL)
+    index.save(tmp_path / 'index.npz')
+    loaded = RegfileIndex.load(tmp_path / 'index.npz')
+    assert np.array_equal(loaded.snapshots, index.snapshots)
+    assert (loaded.interval, loaded.num_frames) == (INTERVAL, NUM_FRAMES)
+    assert loaded.is_current(capture_file, initial, INTERVAL)
+
+def test_stale(frames, initial, tmp_path):
+    capture_path = tmp_path / 'capture.bin'
+    capture_path.write_bytes(frames.tobytes())
+    with open(capture_path, 'rb') as capture_file:
+        index = RegfileIndex.build(capture_file, initial, INTERVAL)
+        assert index.is_current(capture_file, initial, INTERVAL)
+        assert not index.is_current(capture_file, initial, INTERVAL * 2)
+        assert not index.is_current(capture_file, initial + 1, INTERVAL)
+    # A longer capture in the same file
+    capture_path.write_bytes(frames.tobytes() * 2)
+    with open(capture_path, 'rb') as capture_file:
+        assert not index.is_current(capture_file, initial, INTERVAL)
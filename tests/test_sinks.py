@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Tests the output sinks of cpu_output.py against decode_cycle_output"""
+
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from cpu_output import (
+    DEBUG_FIELD_NAMES, FRAME_BYTES, OUTPUT_FORMATS, RECORD, decode_cycle_output,
+    format_cycle_output, open_sink
+)
+
+NUM_FRAMES = 200
+
+@pytest.fixture
+def frames(rng):
+    frames = rng.integers(0, 256, (NUM_FRAMES, FRAME_BYTES), dtype=np.uint8)
+    # The text sink decodes the fetched instruction from code.objdump
+    frames[:, 22:26] = [0xe1, 0xa0, 0x00, 0x00]
+    return [(int(x[0]), x[1:].tobytes()) for x in frames]
+
+def write_sink(output_format, frames, path):
+    with open_sink(output_format, str(path)) as sink:
+        for cycle_count, cycle_output in frames:
+            sink.write(cycle_count, cycle_output)
+    return path
+
+def expected_fields(frames):
+    return [dict(cycle=x, **decode_cycle_output(y)) for x, y in frames]
+
+def test_text(frames, tmp_path):
+    path = write_sink('text', frames, tmp_path / 'frames.txt')
+    assert path.read_text().splitlines() == [format_cycle_output(x[1]) for x in frames]
+
+def test_ndjson(frames, tmp_path):
+    path = write_sink('ndjson', frames, tmp_path / 'frames.ndjson')
+    lines = path.read_text().splitlines()
+    assert [json.loads(x) for x in lines] == expected_fields(frames)
+    assert list(json.loads(lines[0])) == ['cycle', *DEBUG_FIELD_NAMES]
+
+def test_csv(frames, tmp_path):
+    path = write_sink('csv', frames, tmp_path / 'frames.csv')
+    with open(path, newline='') as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert [{x: int(y) for x, y in row.items()} for row in rows] == expected_fields(frames)
+
+def test_binary(frames, tmp_path):
+    path = write_sink('binary', frames, tmp_path / 'frames.bin')
+    records = [
+        dict(zip(('cycle', *DEBUG_FIELD_NAMES), x))
+        for x in RECORD.iter_unpack(path.read_bytes())]
+    assert records == expected_fields(frames)
+
+@pytest.mark.parametrize('output_format', OUTPUT_FORMATS)
+def test_empty(output_format, tmp_path):
+    path = write_sink(output_format, [], tmp_path / 'frames')
+    expected = ','.join(('cycle', *DEBUG_FIELD_NAMES)) + '\n' if output_format == 'csv' else ''
+    assert path.read_text() == expected
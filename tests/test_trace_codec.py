@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Tests trace_codec.py, which must restore captures byte for byte"""
+
+import io
+
+import numpy as np
+import pytest
+
+from capture_arrays import read_frame_chunks
+from cpu_output import FRAME_BYTES, read_capture
+import trace_codec
+
+NUM_FRAMES = 5000
+# Leaves a partial last block
+KEYFRAME_INTERVAL = 1000
+
+class _Unseekable(io.RawIOBase):
+    """Bytes that can only be read in order, like standard input from a pipe"""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._data.readinto(buffer)
+
+def unseekable(data):
+    return io.BufferedReader(_Unseekable(data))
+
+def random_frames(rng, num_frames):
+    """Returns frames that change a few random bytes each, with counting cycle and PC"""
+    frames = np.empty((num_frames, FRAME_BYTES), dtype=np.uint8)
+    frame = rng.integers(0, 256, FRAME_BYTES, dtype=np.uint8)
+    pc = 0
+    for index in range(num_frames):
+        changed = rng.integers(0, FRAME_BYTES, rng.integers(0, 4))
+        frame[changed] = rng.integers(0, 256, len(changed), dtype=np.uint8)
+        # Mostly straight-line code, with some branches
+        pc = int(rng.integers(0, 1 << 32)) if rng.random() < 0.05 else (pc + 4) & 0xffffffff
+        frame[0] = index & 0xff
+        frame[1:5] = np.frombuffer(pc.to_bytes(4, 'big'), dtype=np.uint8)
+        frames[index] = frame
+    return frames
+
+@pytest.fixture
+def frames(rng):
+    return random_frames(rng, NUM_FRAMES)
+
+@pytest.fixture
+def encoded(frames):
+    encoded = io.BytesIO()
+    num_frames = trace_codec.encode_capture(
+        io.BytesIO(frames.tobytes()), encoded, keyframe_interval=KEYFRAME_INTERVAL)
+    assert num_frames == NUM_FRAMES
+    return encoded.getvalue()
+
+def test_decode(frames, encoded):
+    chunks = trace_codec.read_encoded_chunks(io.BytesIO(encoded))
+    assert b''.join(x.tobytes() for _, x in chunks) == frames.tobytes()
+
+def test_smaller(frames, encoded):
+    assert len(encoded) < len(frames.tobytes()) / 2
+
+@pytest.mark.parametrize('start, stop', [
+    (0, 1), (999, 1001), (1234, 4321), (NUM_FRAMES - 5, NUM_FRAMES + 5),
+])
+def test_frame_range(frames, encoded, start, stop):
+    frame_range = trace_codec.read_frame_range(io.BytesIO(encoded), start, stop)
+    assert frame_range.tobytes() == frames[start:stop].tobytes()
+
+def test_is_encoded(frames, encoded):
+    capture_file = io.BytesIO(encoded)
+    capture_file.seek(5)
+    assert trace_codec.is_encoded(capture_file)
+    assert capture_file.tell() == 5
+    assert not trace_codec.is_encoded(io.BytesIO(frames.tobytes()))
+
+def test_read_capture(frames, encoded):
+    expected = list(read_capture(io.BytesIO(frames.tobytes())))
+    assert list(read_capture(io.BytesIO(encoded))) == expected
+
+@pytest.mark.parametrize('encode', [False, True])
+def test_unseekable(frames, encoded, encode):
+    capture_file = unseekable(encoded if encode else frames.tobytes())
+    assert trace_codec.is_encoded(capture_file) == encode
+    chunks = read_frame_chunks(capture_file, chunk_frames=KEYFRAME_INTERVAL)
+    assert b''.join(x.tobytes() for _, x in chunks) == frames.tobytes()
+
+def test_keyframe_interval_below_one(frames):
+    with pytest.raises(ValueError):
+        trace_codec.encode_capture(io.BytesIO(frames.tobytes()), io.BytesIO(), keyframe_interval=0)
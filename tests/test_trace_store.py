@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Tests trace_store.py against decoding a whole capture at once"""
+
+import io
+
+import numpy as np
+import pytest
+
+from capture_arrays import decode_frames
+from cpu_output import FRAME_BYTES
+from trace_store import (
+    STORE_COLUMNS, TraceStore, all_of, cpsr_set, pc_equals, register_written, write_store
+)
+
+NUM_FRAMES = 1000
+# Leaves a partial last chunk
+CHUNK_FRAMES = 300
+
+@pytest.fixture
+def frames(rng):
+    frames = rng.integers(0, 256, (NUM_FRAMES, FRAME_BYTES), dtype=np.uint8)
+    # Few PCs, so that queries for one match several frames
+    frames[:, 1:5] = 0
+    frames[:, 4] = rng.integers(0, 16, NUM_FRAMES) * 4
+    return frames
+
+@pytest.fixture
+def store(frames, tmp_path):
+    capture_file = io.BytesIO(frames.tobytes())
+    assert write_store(capture_file, tmp_path, CHUNK_FRAMES) == NUM_FRAMES
+    return TraceStore(tmp_path)
+
+def test_columns(frames, store):
+    assert len(store) == NUM_FRAMES
+    assert store.chunk_sizes == [300, 300, 300, 100]
+    columns = decode_frames(frames)
+    for name in STORE_COLUMNS:
+        assert np.array_equal(store.column(name), columns[name])
+
+def test_rows(frames, store):
+    indices = [999, 0, 299, 300, 301, 5]
+    columns = decode_frames(frames)
+    rows = store.rows(indices, ('pc', 'cycle'))
+    assert np.array_equal(rows['pc'], columns['pc'][indices])
+    assert np.array_equal(rows['cycle'], columns['cycle'][indices])
+    with pytest.raises(IndexError):
+        store.rows([NUM_FRAMES])
+
+@pytest.mark.parametrize('predicate, reference', [
+    (pc_equals(0x20), lambda x: x['pc'] == 0x20),
+    (register_written(4),
+     lambda x: (x['regfile_write_enable1'] == 1) & (x['regfile_write_addr1'] == 4)),
+    (cpsr_set('NZ'), lambda x: (x['executor_cpsr'] & 0b1100) == 0b1100),
+    (all_of(pc_equals(0x20), cpsr_set('c')),
+     lambda x: (x['pc'] == 0x20) & ((x['executor_cpsr'] & 0b0010) != 0)),
+])
+def test_queries(frames, store, predicate, reference):
+    expected = np.flatnonzero(reference(decode_frames(frames)))
+    assert len(expected)
+    assert np.array_equal(store.where(predicate, predicate.columns), expected)
+    assert store.first(predicate, predicate.columns) == expected[0]
+    assert store.count(predicate, predicate.columns) == len(expected)
+
+def test_rebuild_smaller(frames, store, tmp_path):
+    write_store(io.BytesIO(frames[:10].tobytes()), tmp_path, CHUNK_FRAMES)
+    store = TraceStore(tmp_path)
+    assert len(store) == 10
+    assert len(store.column('pc')) == 10
+
+def test_empty(tmp_path):
+    assert write_store(io.BytesIO(b''), tmp_path) == 0
+    store = TraceStore(tmp_path)
+    assert len(store) == 0
+    assert len(store.column('pc')) == 0
+    assert len(store.rows([])['pc']) == 0
+    assert len(store.where(pc_equals(0), ('pc',))) == 0
+    assert store.first(pc_equals(0), ('pc',)) is None
+
+def test_errors(store, tmp_path):
+    with pytest.raises(KeyError):
+        store.rows([0], ('nonexistent',))
+    with pytest.raises(ValueError):
+        cpsr_set('X')
+    with pytest.raises(FileNotFoundError):
+        TraceStore(tmp_path / 'nonexistent')
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""
+Finds the dependencies between Verilog/SystemVerilog sources
+
+This is a lightweight parser for the style of the sources in this repository,
+not a full SystemVerilog parser: it finds module definitions, instantiations of
+other known modules, functions defined outside modules and calls to them,
+`include files and $readmemh/$readmemb files with literal paths.
+"""
+
+from collections import namedtuple
+from pathlib import Path
+import hashlib
+import re
+
+from _tools_common import ROOT_DIR, synth_sources
+
+# Dependencies of one source file. Paths are relative to the root directory. The
+# interface is the source without comments and module bodies, i.e. the module
+# headers and what is outside modules, which is all other files depend on
+SourceInfo = namedtuple('SourceInfo', (
+    'path', 'modules', 'instances', 'includes', 'memfiles', 'functions', 'calls', 'interface'))
+
+_COMMENT_RE = re.compile(r'//[^\n]*|/\*.*?\*/', re.S)
+_MODULE_RE = re.compile(r'^\s*module\s+(\w+)', re.M)
+_ENDMODULE_RE = re.compile(r'\bendmodule\b')
+# e.g. "fetcher the_fetcher (" or "usb_fs_pe #(.NUM_OUT_EPS(...)) usb_fs_pe_inst ("
+_INSTANCE_RE = re.compile(r'\b(\w+)\s*(?:#\s*\((?:[^()]|\([^()]*\))*\)\s*)?(\w+)\s*\(')
+_INCLUDE_RE = re.compile(r'`include\s+"([^"]+)"')
+_READMEM_RE = re.compile(r'\$readmem[hb]\s*\(\s*"([^"]+)"')
+# e.g. "function automatic [3:0] decode_condition;" or "function logic f(input x);"
+_FUNCTION_RE = re.compile(
+    r'\bfunction\s+(?:automatic\s+|static\s+)?(?:\w+\s+)?(?:\[[^\]]*\]\s*)?(\w+)\s*[;(]')
+_WORD_RE = re.compile(r'\w+')
+
+def _parse_source(path, text, module_names, function_names):
+    text = _COMMENT_RE.sub('', text)
+    interface = _interface(text)
+    functions = _FUNCTION_RE.findall(interface)
+    modules = _MODULE_RE.findall(text)
+    # (module, instantiated module) pairs; instances outside a module are ignored
+    instances = list()
+    for body in _module_bodies(text):
+        module = _MODULE_RE.search(body).group(1)
+        for match in _INSTANCE_RE.finditer(body):
+            if match.group(1) in module_names and match.group(1) != module:
+                instances.append((module, match.group(1)))
+    return SourceInfo(
+        path=path,
+        modules=tuple(modules),
+        instances=tuple(instances),
+        includes=tuple(Path(x) for x in _INCLUDE_RE.findall(text)),
+        memfiles=tuple(Path(x) for x in _READMEM_RE.findall(text)),
+        functions=tuple(functions),
+        calls=tuple(sorted(function_names.intersection(_WORD_RE.findall(text)) - set(functions))),
+        interface=interface,
+    )
+
+def _module_bodies(text):
+    """Yields the text of each module ... endmodule block"""
+    for match in _MODULE_RE.finditer(text):
+        end_match = _ENDMODULE_RE.search(text, match.end())
+        yield text[match.start():end_match.start() if end_match else len(text)]
+
+def _header_end(text, position):
+    """Returns the end of the module header from position, after its ports and ';'"""
+    depth = 0
+    for index in range(position, len(text)):
+        if text[index] == '(':
+            depth += 1
+        elif text[index] == ')':
+            depth -= 1
+        elif text[index] == ';' and depth == 0:
+            return index + 1
+    return len(text)
+
+def _interface(text):
+    """Returns text with the body of each module removed, keeping its header"""
+    parts = list()
+    position = 0
+    for match in _MODULE_RE.finditer(text):
+        if match.start() < position:
+            continue
+        end_match = _ENDMODULE_RE.search(text, match.end())
+        parts.append(text[position:_header_end(text, match.end())])
+        parts.append('\nendmodule')
+        position = end_match.end() if end_match else len(text)
+    parts.append(text[position:])
+    return ''.join(parts)
+
+def parse_sources(sources, root_dir=ROOT_DIR):
+    """
+    Parses sources (paths relative to root_dir)
+
+    Returns a dict of path to SourceInfo
+    """
+    root_dir = Path(root_dir)
+    texts = {Path(x): (root_dir / x).read_text(errors='replace') for x in sources}
+    module_names = set()
+    function_names = set()
+    for text in texts.values():
+        text = _COMMENT_RE.sub('', text)
+        module_names.update(_MODULE_RE.findall(text))
+        function_names.update(_FUNCTION_RE.findall(_interface(text)))
+    return {
+        path: _parse_source(path, text, module_names, function_names)
+        for path, text in texts.items()
+    }
+
+class SourceGraph:
+    """Module and file dependencies of a set of sources"""
+
+    def __init__(self, infos):
+        self.infos = infos
+        self.module_files = dict()
+        self.module_instances = dict()
+        self.function_files = dict()
+        for info in infos.values():
+            for function in info.functions:
+                self.function_files[function] = info.path
+            for module in info.modules:
+                self.module_files[module] = info.path
+                self.module_instances[module] = list()
+            for module, instance in info.instances:
+                self.module_instances[module].append(instance)
+
+    @classmethod
+    def from_sources(cls, sources=None, root_dir=ROOT_DIR):
+        if sources is None:
+            sources = synth_sources(root_dir)
+        return cls(parse_sources(sources, root_dir))
+
+    def submodules(self, module):
+        """Returns the modules instantiated by module, directly or not"""
+        found = set()
+        pending = list(self.module_instances.get(module, ()))
+        while pending:
+            submodule = pending.pop()
+            if submodule not in found:
+                found.add(submodule)
+                pending.extend(self.module_instances.get(submodule, ()))
+        return found
+
+    def file_dependencies(self, path):
+        """Returns the included and memory init files that a source file reads"""
+        info = self.infos.get(Path(path))
+        if info is None:
+            return set()
+        return set(info.includes) | set(info.memfiles)
+
+    def interface_dependencies(self, path):
+        """
+        Returns the other source files whose interfaces a source file needs: those
+        of the modules it instantiates and of the functions it calls, and those
+        of the functions called in these interfaces
+        """
+        info = self.infos[Path(path)]
+        files = {self.module_files[x] for _, x in info.instances}
+        files.update(self.function_files[x] for x in info.calls)
+        pending = list(files)
+        while pending:
+            words = set(_WORD_RE.findall(self.infos[pending.pop()].interface))
+            for function in words.intersection(self.function_files):
+                if self.function_files[function] not in files:
+                    files.add(self.function_files[function])
+                    pending.append(self.function_files[function])
+        files.discard(info.path)
+        return sorted(files)
+
+    def module_sources(self, module):
+        """Returns the source files needed to elaborate module"""
+        modules = {module} | self.submodules(module)
+        return sorted({self.module_files[x] for x in modules if x in self.module_files})
+
+    def module_inputs(self, module):
+        """Returns every file module depends on: sources, includes and memory files"""
+        files = set(self.module_sources(module))
+        for path in list(files):
+            files |= self.file_dependencies(path)
+        return sorted(files)
+
+    def dependents(self, changed_files):
+        """Returns the modules affected by changes to changed_files"""
+        changed_files = {Path(x) for x in changed_files}
+        return {
+            module for module in self.module_files
+            if changed_files.intersection(self.module_inputs(module))
+        }
+
+def hash_files(paths, root_dir=ROOT_DIR, salt=''):
+    """Returns a hash of the names and contents of files, e.g. for cache keys"""
+    digest = hashlib.sha256(salt.encode())
+    for path in sorted(Path(x) for x in paths):
+        digest.update(str(path).encode() + b'\0')
+        full_path = Path(root_dir) / path
+        digest.update(full_path.read_bytes() if full_path.is_file() else b'<missing>')
+        digest.update(b'\0')
+    return digest.hexdigest()
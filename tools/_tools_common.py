@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Helpers to run synthesis, place & route and timing outside of SCons"""
+
+from pathlib import Path
+import os
+import re
+import subprocess
+
+TOOLS_DIR = Path(__file__).resolve().parent
+ROOT_DIR = TOOLS_DIR.parent
+
+# FPGA of the TinyFPGA BX board in apio.ini
+DEFAULT_DEVICE = 'lp8k'
+DEFAULT_PACKAGE = 'cm81'
+DEFAULT_PCF = ROOT_DIR / 'pins.pcf'
+# Must match the pnr builder in SConstruct
+DEFAULT_FREQ = 16
+
+# Must match the synth builder in SConstruct
+DEFAULT_SYNTH_FLAGS = '-abc9'
+
+# e.g. "SB_LUT4                      6145"
+_YOSYS_CELL_RE = re.compile(r'^\s*(\$?[\w$]+)\s+(\d+)\s*$')
+# e.g. "Number of cells:               7919"
+_YOSYS_NUMBER_RE = re.compile(r'^\s*Number of ([\w ]+):\s+(\d+)\s*$')
+
+# e.g. "Total path delay: 45.67 ns (21.90 MHz)"
+_ICETIME_FMAX_RE = re.compile(r'Total path delay:\s*([\d.]+)\s*ns\s*\(([\d.]+)\s*MHz\)')
+
+def default_chipdb(device=DEFAULT_DEVICE):
+    """Returns the icetime chip database path for a device, like SConstruct"""
+    icebox_path = Path(os.environ.get('ICEBOX', ''))
+    return icebox_path / f'chipdb-{device[2:]}.txt'
+
+def synth_sources(root_dir=ROOT_DIR):
+    """Returns the synthesis sources like src_synth in SConstruct, relative to root_dir"""
+    root_dir = Path(root_dir)
+    sources = list()
+    for pattern in ('*.v', 'usb/*.v', 'cpu/*.v', 'cpu/*.sv'):
+        sources.extend(sorted(root_dir.glob(pattern)))
+    return [
+        x.relative_to(root_dir) for x in sources
+        if not x.name.upper().endswith(('_TB.V', '_TB.SV'))
+    ]
+
+def get_tool_version(command):
+    """Returns the version output of a tool, or an empty string if it is missing"""
+    try:
+        return subprocess.run(
+            command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True).stdout.strip()
+    except OSError:
+        return ''
+
+def run_logged(command, log_path, cwd=ROOT_DIR):
+    """Runs a command with its output in log_path; returns True if successful"""
+    with open(log_path, 'w') as log_file:
+        try:
+            result = subprocess.run(
+                [str(x) for x in command], cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT)
+        except OSError as exc:
+            # e.g. the tool is not installed
+            log_file.write(f'ERROR: {exc}\n')
+            return False
+    return result.returncode == 0
+
+def run_yosys(sources, json_path, stat_path, log_path, flags=DEFAULT_SYNTH_FLAGS, top=None,
+              cwd=ROOT_DIR):
+    """
+    Synthesizes sources for the iCE40 like the synth builder in SConstruct
+
+    The output of yosys stat is written to stat_path. Returns True if successful
+    """
+    script = 'read_verilog -sv -nolatches {0} ; synth_ice40 {1} {2} -json {3} ; tee -q -o {4} stat'.format(
+        ' '.join(str(x) for x in sources), flags, f'-top {top}' if top else '', json_path,
+        stat_path)
+    return run_logged(['yosys', '-p', script], log_path, cwd=cwd)
+
+def parse_yosys_stat(stat):
+    """
+    Parses the output of yosys stat
+
+    Returns a dict of the cell counts by cell type and the totals by name, e.g.
+    'SB_LUT4' and 'cells'. Only the last design in stat is parsed, which is the
+    top module when there is a hierarchy.
+    """
+    counts = dict()
+    for line in stat.splitlines():
+        match = _YOSYS_NUMBER_RE.match(line)
+        if match:
+            name = match.group(1).strip()
+            if name == 'wires' and counts.get('wires') is not None:
+                # Start of the next design
+                counts = dict()
+            counts[name] = int(match.group(2))
+            continue
+        match = _YOSYS_CELL_RE.match(line)
+        if match and 'cells' in counts:
+            counts[match.group(1)] = int(match.group(2))
+    return counts
+
+def summarize_cells(counts):
+    """Returns the iCE40 resource usage of parsed yosys stat counts"""
+    return {
+        'lut': counts.get('SB_LUT4', 0),
+        'ff': sum(count for cell, count in counts.items() if cell.startswith('SB_DFF')),
+        'carry': counts.get('SB_CARRY', 0),
+        'bram': counts.get('SB_RAM40_4K', 0),
+        'cells': counts.get('cells', 0),
+    }
+
+def run_nextpnr(json_path, asc_path, log_path, device=DEFAULT_DEVICE, package=DEFAULT_PACKAGE,
+                pcf=DEFAULT_PCF, freq=DEFAULT_FREQ, seed=None):
+    """Places and routes a synthesized design; returns True if successful"""
+    command = [
+        'nextpnr-ice40', '--freq', freq, f'--{device}', '--package', package, '--pcf', pcf,
+        '--asc', asc_path, '--json', json_path,
+    ]
+    command.extend(('--seed', seed) if seed is not None else ('--randomize-seed',))
+    return run_logged(command, log_path)
+
+def run_icetime(asc_path, rpt_path, log_path, device=DEFAULT_DEVICE, package=DEFAULT_PACKAGE,
+                chipdb=None):
+    """
+    Runs icetime timing analysis like the time_rpt builder in SConstruct
+
+    Returns the maximum frequency in MHz, or None if it failed
+    """
+    command = [
+        'icetime', '-d', device, '-P', package, '-C', chipdb or default_chipdb(device),
+        '-mtr', rpt_path, asc_path,
+    ]
+    if not run_logged(command, log_path):
+        return None
+    return parse_icetime_fmax(Path(rpt_path).read_text())
+
+def parse_icetime_fmax(report):
+    """Returns the maximum frequency in MHz of an icetime report, or None"""
+    match = _ICETIME_FMAX_RE.search(report)
+    return float(match.group(2)) if match else None
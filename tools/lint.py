@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lints the cpu modules with Verilator, incrementally and in parallel
+
+Each module in the hierarchy of the top module is linted as its own top
+module, with its own source file and only the interfaces of the files it
+depends on: the headers of the modules it instantiates and the functions it
+calls, written to a stub file with empty module bodies. Results are cached by
+a hash of the source, its includes, these interfaces and the Verilator
+arguments, so after an edit only the modules of the changed file are linted
+again, and the modules instantiating them only if the ports changed. The
+warnings of all modules are merged into one report without duplicates.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from _sv_deps import SourceGraph, hash_files
+from _tools_common import ROOT_DIR, get_tool_version
+
+DEFAULT_WORK_DIR = ROOT_DIR / 'build' / 'lint'
+DEFAULT_TOP = 'cpu'
+
+def lint_module(module, graph, verilator_args, stub_dir, cache_dir, salt):
+    """
+    Lints one module against the interfaces of its dependencies, which are
+    written to stub_dir, or loads the cached result unless cache_dir is None
+
+    Returns a dict with the return code and the list of diagnostics
+    """
+    path = graph.module_files[module]
+    dependencies = graph.interface_dependencies(path)
+    stubs = ''.join(f'// Interface of {x}\n{graph.infos[x].interface}\n' for x in dependencies)
+    cache_path = None
+    if cache_dir is not None:
+        inputs = {path} | graph.file_dependencies(path)
+        for dependency in dependencies:
+            inputs.update(graph.infos[dependency].includes)
+        cache_key = hash_files(inputs, salt=f'{salt}\0{stubs}')
+        cache_path = cache_dir / f'{module}-{cache_key[:16]}.json'
+    if cache_path and cache_path.is_file():
+        result = json.loads(cache_path.read_text())
+        result['cached'] = True
+        return result
+    command = ['verilator', '--lint-only', '-Wno-fatal', '--top-module', module]
+    command.extend(verilator_args)
+    command.append(str(path))
+    stub_path = None
+    if stubs:
+        stub_path = stub_dir / f'{module}.sv'
+        stub_path.parent.mkdir(parents=True, exist_ok=True)
+        stub_path.write_text(stubs)
+        command.append(str(stub_path))
+    try:
+        process = subprocess.run(
+            command, cwd=ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True)
+    except OSError as exc:
+        return {'returncode': 1, 'diagnostics': [f'%Error: {exc}'], 'cached': False}
+    # The stubs have e.g. undriven outputs, which are not warnings of the module
+    result = {
+        'returncode': process.returncode,
+        'diagnostics': [
+            x for x in parse_diagnostics(process.stdout)
+            if stub_path is None or str(stub_path) not in x.split('\n')[0]
+        ],
+    }
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(result, indent=4) + '\n')
+    result['cached'] = False
+    return result
+
+def parse_diagnostics(output):
+    """Splits Verilator output into diagnostics, each with its continuation lines"""
+    diagnostics = list()
+    for line in output.splitlines():
+        if line.startswith('%'):
+            if line.startswith(('%Error: Exiting due to', '%Warning: Exiting due to')):
+                continue
+            diagnostics.append(line)
+        elif diagnostics and line.strip():
+            diagnostics[-1] += '\n' + line
+    return diagnostics
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--top', default=DEFAULT_TOP,
+        help='Top module whose hierarchy to lint; empty for every module under cpu/ '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--verilator-args', default='',
+        help='Extra Verilator arguments, e.g. "-Wall -Wno-style" (default: none)')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help='Number of modules to lint in parallel (default: number of CPUs)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for stubs and cached results (default: %(default)s)')
+    parser.add_argument(
+        '--no-cache', dest='cache', action='store_false', help='Lint every module again')
+    args = parser.parse_args()
+
+    graph = SourceGraph.from_sources()
+    if args.top:
+        if args.top not in graph.module_files:
+            print(f'ERROR: Unknown top module: {args.top}')
+            sys.exit(1)
+        modules = sorted({args.top} | graph.submodules(args.top))
+    else:
+        modules = sorted(x for x, path in graph.module_files.items() if path.parts[0] == 'cpu')
+
+    verilator_args = shlex.split(args.verilator_args)
+    salt = '\0'.join([get_tool_version(['verilator', '--version'])] + verilator_args)
+    work_dir = args.work_dir.resolve()
+    cache_dir = work_dir / 'cache' if args.cache else None
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = dict(zip(modules, executor.map(
+            lambda x: lint_module(x, graph, verilator_args, work_dir / 'stubs', cache_dir, salt),
+            modules)))
+
+    # Modules of the same file are each linted with the whole file, so merge duplicates
+    diagnostics = list()
+    for module in modules:
+        for diagnostic in results[module]['diagnostics']:
+            if diagnostic not in diagnostics:
+                diagnostics.append(diagnostic)
+    for diagnostic in diagnostics:
+        print(diagnostic)
+    num_linted = sum(1 for x in results.values() if not x['cached'])
+    failed = [x for x in modules if results[x]['returncode'] != 0]
+    print(f'Linted {num_linted} of {len(modules)} modules ({len(modules) - num_linted} cached): '
+          f'{len(diagnostics)} warning(s)/error(s)')
+    if diagnostics or failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Attributes the synthesized area of the design to its modules
+
+Every module under cpu/ and usb/ is synthesized on its own, in parallel, with
+the sources it instantiates. Results are cached by a hash of those sources,
+so only modules whose sources changed are synthesized again. The report
+shows each module's total area with its submodules, and its own area without
+them. Since yosys optimizes across module boundaries in the full design, the
+numbers are estimates, not an exact split of the totals.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import sys
+
+from _sv_deps import SourceGraph, hash_files
+from _tools_common import (
+    DEFAULT_SYNTH_FLAGS, ROOT_DIR, get_tool_version, parse_yosys_stat, run_yosys,
+    summarize_cells
+)
+
+DEFAULT_WORK_DIR = ROOT_DIR / 'build' / 'module_area'
+DEFAULT_DIRS = ('cpu', 'usb')
+
+# Resources attributed to modules
+METRICS = ('lut', 'ff', 'carry', 'bram')
+
+def synth_module(module, graph, work_dir, flags, yosys_version):
+    """
+    Synthesizes one module, or loads the cached result
+
+    Returns a dict with the module's resource usage, or None if it failed
+    """
+    cache_key = hash_files(graph.module_inputs(module), salt=f'{flags}\0{yosys_version}')
+    cache_path = work_dir / 'cache' / f'{module}-{cache_key[:16]}.json'
+    if cache_path.is_file():
+        return json.loads(cache_path.read_text())
+    module_dir = work_dir / 'modules' / module
+    module_dir.mkdir(parents=True, exist_ok=True)
+    stat_path = module_dir / 'stat.txt'
+    if not run_yosys(graph.module_sources(module), module_dir / 'module.json', stat_path,
+                     module_dir / 'yosys.log', flags=flags, top=module):
+        return None
+    result = summarize_cells(parse_yosys_stat(stat_path.read_text()))
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(result, indent=4) + '\n')
+    return result
+
+def attribute_area(graph, totals):
+    """
+    Computes each module's own area by subtracting its direct instances
+
+    totals maps module names to their synthesized area including submodules
+    """
+    own = dict()
+    for module, total in totals.items():
+        if total is None:
+            continue
+        own[module] = dict(total)
+        for instance in graph.module_instances[module]:
+            instance_total = totals.get(instance)
+            if instance_total is None:
+                continue
+            for metric in METRICS:
+                own[module][metric] -= instance_total[metric]
+    return own
+
+def print_report(totals, own, sort_by):
+    print(f'{"module":24}' + ''.join(f'{metric.upper() + " own":>10}' for metric in METRICS)
+          + ''.join(f'{metric.upper() + " total":>12}' for metric in METRICS))
+    for module in sorted(own, key=lambda x: -own[x][sort_by]):
+        print(f'{module:24}' + ''.join(f'{own[module][x]:>10}' for x in METRICS)
+              + ''.join(f'{totals[module][x]:>12}' for x in METRICS))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--dirs', nargs='+', default=DEFAULT_DIRS,
+        help='Directories whose modules to report (default: %(default)s)')
+    parser.add_argument(
+        '--modules', nargs='+', help='Modules to report (default: all in --dirs)')
+    parser.add_argument(
+        '--flags', default=DEFAULT_SYNTH_FLAGS, help='synth_ice40 flags (default: %(default)s)')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help='Number of modules to synthesize in parallel (default: number of CPUs)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for logs and cached results (default: %(default)s)')
+    parser.add_argument(
+        '--sort', choices=METRICS, default='lut',
+        help='Own resource to sort the report by (default: %(default)s)')
+    parser.add_argument('--json', type=Path, help='Write the results as JSON to this path')
+    args = parser.parse_args()
+
+    graph = SourceGraph.from_sources()
+    modules = args.modules or sorted(
+        module for module, path in graph.module_files.items() if path.parts[0] in args.dirs)
+    unknown = [x for x in modules if x not in graph.module_files]
+    if unknown:
+        print(f'ERROR: Unknown modules: {", ".join(unknown)}')
+        sys.exit(1)
+    # Own areas need the totals of the direct instances too
+    to_synth = set(modules)
+    for module in modules:
+        to_synth.update(graph.module_instances[module])
+
+    yosys_version = get_tool_version(['yosys', '-V'])
+    work_dir = args.work_dir.resolve()
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        totals = dict(zip(sorted(to_synth), executor.map(
+            lambda x: synth_module(x, graph, work_dir, args.flags, yosys_version),
+            sorted(to_synth))))
+
+    own = attribute_area(graph, totals)
+    print_report(totals, {x: own[x] for x in modules if x in own}, args.sort)
+    if args.json:
+        args.json.write_text(json.dumps(
+            {x: {'total': totals[x], 'own': own.get(x)} for x in modules}, indent=4) + '\n')
+    failed = [x for x in sorted(to_synth) if totals[x] is None]
+    for module in failed:
+        print(f'ERROR: Synthesis of {module} failed. See {work_dir / "modules" / module}')
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Places and routes a synthesized design with many nextpnr seeds in parallel
+
+Each seed's result is scored with icetime. The result with the best Fmax is
+copied to the output .asc, and the Fmax distribution over all seeds is
+reported.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+
+from _tools_common import (
+    DEFAULT_DEVICE, DEFAULT_FREQ, DEFAULT_PACKAGE, DEFAULT_PCF, ROOT_DIR, run_icetime,
+    run_nextpnr
+)
+
+DEFAULT_WORK_DIR = ROOT_DIR / 'build' / 'pnr_sweep'
+
+def run_seed(seed, json_path, work_dir, device, package, pcf, freq, chipdb):
+    """Places, routes and times one seed; returns its result"""
+    seed_dir = work_dir / f'seed{seed}'
+    seed_dir.mkdir(parents=True, exist_ok=True)
+    asc_path = seed_dir / 'hardware.asc'
+    rpt_path = seed_dir / 'hardware.rpt'
+    result = {'seed': seed, 'asc': asc_path, 'rpt': rpt_path, 'fmax': None}
+    if not run_nextpnr(json_path, asc_path, seed_dir / 'nextpnr.log', device=device,
+                       package=package, pcf=pcf, freq=freq, seed=seed):
+        return result
+    result['fmax'] = run_icetime(
+        asc_path, rpt_path, seed_dir / 'icetime.log', device=device, package=package,
+        chipdb=chipdb)
+    return result
+
+def sweep_seeds(json_path, seeds, jobs, work_dir, device, package, pcf, freq, chipdb):
+    """Runs all seeds in parallel; returns their results ordered by seed"""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(
+            lambda x: run_seed(x, json_path, work_dir, device, package, pcf, freq, chipdb),
+            seeds))
+
+def summarize(results):
+    """Returns the Fmax distribution of the successful seeds"""
+    fmaxes = sorted(x['fmax'] for x in results if x['fmax'] is not None)
+    if not fmaxes:
+        return dict(seeds=len(results), passed=0)
+    return {
+        'seeds': len(results),
+        'passed': len(fmaxes),
+        'min': fmaxes[0],
+        'median': statistics.median(fmaxes),
+        'mean': statistics.mean(fmaxes),
+        'max': fmaxes[-1],
+        'stdev': statistics.stdev(fmaxes) if len(fmaxes) > 1 else 0.0,
+    }
+
+def print_report(results, summary, freq):
+    print(f'{"seed":>6}{"Fmax (MHz)":>12}')
+    for result in sorted(results, key=lambda x: -(x['fmax'] or 0)):
+        fmax = f'{result["fmax"]:.2f}' if result['fmax'] is not None else 'FAILED'
+        print(f'{result["seed"]:>6}{fmax:>12}')
+    if not summary['passed']:
+        return
+    print(f'{summary["passed"]}/{summary["seeds"]} seeds succeeded; Fmax min {summary["min"]:.2f}, '
+          f'median {summary["median"]:.2f}, mean {summary["mean"]:.2f}, '
+          f'max {summary["max"]:.2f} MHz (stdev {summary["stdev"]:.2f})')
+    num_met = sum(1 for x in results if x['fmax'] is not None and x['fmax'] >= freq)
+    print(f'{num_met}/{summary["seeds"]} seeds meet the {freq} MHz target')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('json', type=Path, help='Synthesized design from yosys')
+    parser.add_argument('asc', type=Path, help='Output .asc of the best seed')
+    parser.add_argument(
+        '--seeds', type=int, default=8, help='Number of seeds to try (default: %(default)s)')
+    parser.add_argument(
+        '--first-seed', type=int, default=1, help='First seed to try (default: %(default)s)')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help='Number of seeds to run in parallel (default: number of CPUs)')
+    parser.add_argument(
+        '--device', default=DEFAULT_DEVICE, help='FPGA type and size (default: %(default)s)')
+    parser.add_argument(
+        '--package', default=DEFAULT_PACKAGE, help='FPGA package (default: %(default)s)')
+    parser.add_argument(
+        '--pcf', type=Path, default=DEFAULT_PCF, help='Pin constraints (default: %(default)s)')
+    parser.add_argument(
+        '--freq', type=float, default=DEFAULT_FREQ,
+        help='Target frequency in MHz (default: %(default)s)')
+    parser.add_argument('--chipdb', type=Path, help='icetime chip database (default: from $ICEBOX)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for the results of each seed (default: %(default)s)')
+    parser.add_argument('--report', type=Path, help='Write the results as JSON to this path')
+    args = parser.parse_args()
+
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    print(f'Placing and routing {args.seeds} seeds with {args.jobs} jobs...')
+    results = sweep_seeds(
+        args.json.resolve(), seeds, args.jobs, args.work_dir.resolve(), args.device,
+        args.package, args.pcf.resolve(), args.freq, args.chipdb)
+    summary = summarize(results)
+    print_report(results, summary, args.freq)
+    if args.report:
+        args.report.write_text(json.dumps({
+            'summary': summary,
+            'seeds': [{'seed': x['seed'], 'fmax': x['fmax']} for x in results],
+        }, indent=4) + '\n')
+    if not summary['passed']:
+        print(f'ERROR: All seeds failed. See the logs in {args.work_dir}')
+        sys.exit(1)
+
+    best = max((x for x in results if x['fmax'] is not None), key=lambda x: x['fmax'])
+    shutil.copyfile(best['asc'], args.asc)
+    print(f'Best seed {best["seed"]} with Fmax {best["fmax"]:.2f} MHz; wrote {args.asc}')
+
+if __name__ == '__main__':
+    main()
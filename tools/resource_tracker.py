@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tracks FPGA resource usage and Fmax across git commits
+
+Each commit in a range is checked out into its own git worktree, and the
+commits are synthesized, placed, routed and timed in parallel. The LUT, FF,
+carry and BRAM counts and the icetime Fmax are stored in a local SQLite
+database, so each commit is only measured once. Failed builds are stored too,
+but measured again on the next run (unless --skip-failed), since a failure
+may be transient, e.g. a missing tool or a killed job. Commits whose resources or
+Fmax got worse than the previous commit by more than a threshold are flagged.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from _tools_common import (
+    DEFAULT_DEVICE, DEFAULT_PACKAGE, DEFAULT_SYNTH_FLAGS, ROOT_DIR, parse_yosys_stat,
+    run_icetime, run_nextpnr, run_yosys, summarize_cells, synth_sources
+)
+
+DEFAULT_DB = ROOT_DIR / 'build' / 'resources.sqlite'
+DEFAULT_WORK_DIR = ROOT_DIR / 'build' / 'resource_tracker'
+
+# Metrics checked for regressions, and whether higher values are better
+METRIC_HIGHER_IS_BETTER = {
+    'lut': False,
+    'ff': False,
+    'carry': False,
+    'bram': False,
+    'fmax': True,
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    commit_hash TEXT NOT NULL,
+    flags TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    commit_date TEXT,
+    subject TEXT,
+    passed INTEGER NOT NULL,
+    lut INTEGER,
+    ff INTEGER,
+    carry INTEGER,
+    bram INTEGER,
+    cells INTEGER,
+    fmax REAL,
+    measured TEXT,
+    PRIMARY KEY (commit_hash, flags, seed)
+)
+'''
+
+# Serializes worktree changes, which lock the repository
+_worktree_lock = threading.Lock()
+
+def _git(*args, cwd=ROOT_DIR):
+    return subprocess.run(
+        ('git',) + args, cwd=cwd, stdout=subprocess.PIPE, check=True,
+        universal_newlines=True).stdout
+
+def list_commits(revisions):
+    """Returns (hash, date, subject) of the commits in revisions, oldest first"""
+    commits = list()
+    for revision in revisions:
+        if '..' in revision:
+            hashes = _git('rev-list', '--reverse', revision).split()
+        else:
+            hashes = [_git('rev-parse', '--verify', revision + '^{commit}').strip()]
+        for commit_hash in hashes:
+            date, subject = _git('show', '-s', '--format=%cI%n%s', commit_hash).splitlines()[:2]
+            commits.append((commit_hash, date, subject))
+    return commits
+
+def open_db(db_path):
+    """Opens the results database, creating it if needed"""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(db_path))
+    db.row_factory = sqlite3.Row
+    db.execute(_SCHEMA)
+    return db
+
+def measure_commit(commit_hash, work_dir, flags, seed, timing, device, package, chipdb):
+    """Synthesizes one commit in a temporary worktree; returns its result"""
+    commit_dir = work_dir / commit_hash[:12]
+    worktree = commit_dir / 'src'
+    commit_dir.mkdir(parents=True, exist_ok=True)
+    with _worktree_lock:
+        if worktree.exists():
+            _git('worktree', 'remove', '--force', str(worktree))
+        _git('worktree', 'add', '--detach', str(worktree), commit_hash)
+    result = {'passed': False, 'fmax': None}
+    try:
+        json_path = commit_dir / 'hardware.json'
+        stat_path = commit_dir / 'stat.txt'
+        if not run_yosys(synth_sources(worktree), json_path, stat_path, commit_dir / 'yosys.log',
+                         flags=flags, cwd=worktree):
+            return result
+        result.update(summarize_cells(parse_yosys_stat(stat_path.read_text())))
+        result['passed'] = True
+        asc_path = commit_dir / 'hardware.asc'
+        if timing and run_nextpnr(json_path, asc_path, commit_dir / 'nextpnr.log',
+                                  device=device, package=package, pcf=worktree / 'pins.pcf',
+                                  seed=seed):
+            result['fmax'] = run_icetime(
+                asc_path, commit_dir / 'hardware.rpt', commit_dir / 'icetime.log',
+                device=device, package=package, chipdb=chipdb)
+    finally:
+        with _worktree_lock:
+            _git('worktree', 'remove', '--force', str(worktree))
+    return result
+
+def store_result(db, commit, flags, seed, result):
+    commit_hash, date, subject = commit
+    db.execute(
+        'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (commit_hash, flags, seed, date, subject, int(result['passed']), result.get('lut'),
+         result.get('ff'), result.get('carry'), result.get('bram'), result.get('cells'),
+         result.get('fmax'), time.strftime('%Y-%m-%dT%H:%M:%S')))
+    db.commit()
+
+def load_results(db, commits, flags, seed):
+    """Returns the stored results of commits in order, None for missing ones"""
+    results = list()
+    for commit_hash, _, _ in commits:
+        row = db.execute(
+            'SELECT * FROM results WHERE commit_hash = ? AND flags = ? AND seed = ?',
+            (commit_hash, flags, seed)).fetchone()
+        results.append(dict(row) if row else None)
+    return results
+
+def find_regressions(results, threshold):
+    """
+    Compares each result against the previous successful one
+
+    Returns a list with the names of the regressed metrics of each result
+    """
+    regressions = list()
+    previous = None
+    for result in results:
+        regressed = list()
+        if result and result['passed']:
+            if previous:
+                for metric, higher_is_better in METRIC_HIGHER_IS_BETTER.items():
+                    old, new = previous[metric], result[metric]
+                    if not old or new is None:
+                        continue
+                    change = (new - old) / old * 100
+                    if (-change if higher_is_better else change) > threshold:
+                        regressed.append(metric)
+            previous = result
+        regressions.append(regressed)
+    return regressions
+
+def print_table(commits, results, regressions):
+    print(f'{"commit":10} {"LUT":>6} {"FF":>6} {"CARRY":>6} {"BRAM":>5} {"Fmax":>7}  subject')
+    for (commit_hash, _, subject), result, regressed in zip(commits, results, regressions):
+        if result is None or not result['passed']:
+            status = 'FAILED' if result else 'missing'
+            print(f'{commit_hash[:10]} {status:>34}  {subject}')
+            continue
+        fmax = f'{result["fmax"]:.2f}' if result['fmax'] is not None else '-'
+        marker = f'  REGRESSION: {", ".join(regressed)}' if regressed else ''
+        print(f'{commit_hash[:10]} {result["lut"]:>6} {result["ff"]:>6} {result["carry"]:>6} '
+              f'{result["bram"]:>5} {fmax:>7}  {subject}{marker}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'revisions', nargs='+',
+        help='Commits or ranges to measure, e.g. b6bea32..HEAD (ranges exclude their start)')
+    parser.add_argument(
+        '--db', type=Path, default=DEFAULT_DB, help='Results database (default: %(default)s)')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help='Number of commits to measure in parallel (default: number of CPUs)')
+    parser.add_argument(
+        '--flags', default=DEFAULT_SYNTH_FLAGS,
+        help='synth_ice40 flags (default: %(default)s)')
+    parser.add_argument(
+        '--seed', type=int, default=1, help='nextpnr seed (default: %(default)s)')
+    parser.add_argument(
+        '--no-timing', dest='timing', action='store_false',
+        help='Skip place & route and icetime')
+    parser.add_argument(
+        '--device', default=DEFAULT_DEVICE, help='FPGA type and size (default: %(default)s)')
+    parser.add_argument(
+        '--package', default=DEFAULT_PACKAGE, help='FPGA package (default: %(default)s)')
+    parser.add_argument('--chipdb', type=Path, help='icetime chip database (default: from $ICEBOX)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for worktrees and logs (default: %(default)s)')
+    parser.add_argument(
+        '--force', action='store_true', help='Measure commits again even if they are stored')
+    parser.add_argument(
+        '--skip-failed', action='store_true',
+        help='Do not measure commits again whose stored build failed')
+    parser.add_argument(
+        '--threshold', type=float, default=5.0,
+        help='Percent change of a metric that counts as a regression (default: %(default)s)')
+    parser.add_argument(
+        '--fail-on-regression', action='store_true',
+        help='Exit with an error if any commit regressed')
+    args = parser.parse_args()
+
+    commits = list_commits(args.revisions)
+    db = open_db(args.db)
+    stored = load_results(db, commits, args.flags, args.seed)
+    pending = [
+        commit for commit, result in zip(commits, stored)
+        if args.force or result is None
+        or (not result['passed'] and not args.skip_failed)
+        or (args.timing and result['passed'] and result['fmax'] is None)
+    ]
+    if pending:
+        print(f'Measuring {len(pending)} of {len(commits)} commits with {args.jobs} jobs...')
+        work_dir = args.work_dir.resolve()
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [
+                (commit, executor.submit(
+                    measure_commit, commit[0], work_dir, args.flags, args.seed, args.timing,
+                    args.device, args.package, args.chipdb))
+                for commit in pending
+            ]
+            # Store results from this thread, since sqlite connections are per thread
+            for commit, future in futures:
+                store_result(db, commit, args.flags, args.seed, future.result())
+        _git('worktree', 'prune')
+
+    results = load_results(db, commits, args.flags, args.seed)
+    regressions = find_regressions(results, args.threshold)
+    print_table(commits, results, regressions)
+    num_regressed = sum(1 for x in regressions if x)
+    if num_regressed and args.fail_on_regression:
+        print(f'ERROR: {num_regressed} commit(s) regressed')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
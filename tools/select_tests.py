@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Selects the cocotb test modules affected by changed files
+
+Each tests/<name>_cocotb.py module is mapped to the cpu modules it exercises,
+i.e. the module it is named after and the modules whose ports it uses through
+the cocotb DUT. A test is affected if any of their sources, `include files or
+$readmemh files changed, or the test itself or a local module it imports (from
+tests/ or the root, e.g. cpu_output.py) or a file these read.
+Changes to the shared simulation setup affect every test.
+"""
+
+from pathlib import Path
+import argparse
+import re
+import subprocess
+
+from _sv_deps import SourceGraph
+from _tools_common import ROOT_DIR
+
+TESTS_DIR = ROOT_DIR / 'tests'
+
+# Files that affect every test
+COMMON_FILES = (
+    Path('SConstruct'),
+    Path('tests/Makefile'),
+    Path('tests/generate_cocotb_dut.py'),
+)
+
+# Files read by the local Python modules of tests, besides their imports
+PYTHON_DATA_FILES = {
+    # Loaded by cpu_output to show instructions
+    Path('cpu_output.py'): (Path('cpu/init/code.objdump'),),
+}
+# Files read by test modules themselves, besides the $readmemh files of their cpu modules
+TEST_DATA_FILES = {
+    'cpu_cocotb': (
+        Path('cpu/init/code.hex'),
+        Path('cpu/init/code.objdump'),
+        Path('cpu/init/data.hex'),
+        Path('cpu/init/regfile.hex'),
+    ),
+}
+
+_IMPORT_RE = re.compile(r'^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))', re.M)
+# Ports of the cocotb DUT are named <module>_<port>, instances dut_<module>
+_DUT_REFERENCE_RE = re.compile(r'\bdut\.(?:dut_)?(\w+)')
+
+def changed_files(base=None):
+    """
+    Returns the files changed since base, including uncommitted and untracked
+    files, relative to the root directory
+    """
+    diff_command = ['git', 'diff', '--name-only']
+    if base:
+        diff_command.append(base)
+    else:
+        diff_command.append('HEAD')
+    files = subprocess.run(
+        diff_command, cwd=ROOT_DIR, stdout=subprocess.PIPE, check=True,
+        universal_newlines=True).stdout.split()
+    files.extend(subprocess.run(
+        ['git', 'ls-files', '--others', '--exclude-standard'], cwd=ROOT_DIR,
+        stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout.split())
+    return {Path(x) for x in files}
+
+def test_modules():
+    """Returns the names of all cocotb test modules, like SConstruct"""
+    return sorted(x.stem for x in TESTS_DIR.glob('*_cocotb.py'))
+
+def _python_module_file(name):
+    """Returns the file of a local module like the test path, tests/ then the root, or None"""
+    for directory in (TESTS_DIR, ROOT_DIR):
+        path = directory / f'{name}.py'
+        if path.is_file():
+            return path.relative_to(ROOT_DIR)
+    return None
+
+def _test_python_files(test, seen=None):
+    """
+    Returns the files of the test module and the local modules it imports,
+    recursively, relative to the root directory
+    """
+    seen = set() if seen is None else seen
+    path = _python_module_file(test)
+    if path is None or path in seen:
+        return seen
+    seen.add(path)
+    for match in _IMPORT_RE.finditer((ROOT_DIR / path).read_text()):
+        _test_python_files(match.group(1) or match.group(2), seen)
+    return seen
+
+def test_cpu_modules(test, graph):
+    """Returns the cpu modules a test module exercises"""
+    modules = set()
+    name = test[:-len('_cocotb')]
+    if name in graph.module_files:
+        modules.add(name)
+    text = (TESTS_DIR / f'{test}.py').read_text()
+    module_names = sorted(graph.module_files, key=len, reverse=True)
+    for reference in _DUT_REFERENCE_RE.findall(text):
+        # Longest module name that prefixes the signal name, e.g.
+        # regfilewriter_ready is regfilewriter, not regfile
+        for module in module_names:
+            if reference == module or reference.startswith(module + '_'):
+                modules.add(module)
+                break
+    return modules
+
+def test_dependencies(test, graph):
+    """Returns all files a test module depends on, relative to the root directory"""
+    files = set(COMMON_FILES)
+    for python_file in _test_python_files(test):
+        files.add(python_file)
+        files.update(PYTHON_DATA_FILES.get(python_file, ()))
+    files.update(TEST_DATA_FILES.get(test, ()))
+    for module in test_cpu_modules(test, graph):
+        files.update(graph.module_inputs(module))
+    return files
+
+def select_tests(changed, graph=None):
+    """Returns the test modules affected by the changed files"""
+    graph = graph or SourceGraph.from_sources()
+    changed = {Path(x) for x in changed}
+    # tests/cpu links to cpu/
+    changed |= {Path(*x.parts[1:]) for x in changed if x.parts[:2] == ('tests', 'cpu')}
+    return [x for x in test_modules() if changed & test_dependencies(x, graph)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'files', nargs='*', type=Path,
+        help='Changed files relative to the repository (default: changes from git)')
+    parser.add_argument(
+        '--base', help='Git revision to compare against (default: HEAD, i.e. uncommitted changes)')
+    parser.add_argument(
+        '--verbose', '-v', action='store_true',
+        help='Print the cpu modules of each test module')
+    args = parser.parse_args()
+
+    changed = args.files or changed_files(args.base)
+    graph = SourceGraph.from_sources()
+    if args.verbose:
+        for test in test_modules():
+            print(f'{test}: {", ".join(sorted(test_cpu_modules(test, graph)))}')
+    print(','.join(select_tests(changed, graph)))
+
+if __name__ == '__main__':
+    main()
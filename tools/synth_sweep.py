@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Synthesizes the design with several sets of synth_ice40 flags in parallel
+
+For each set of flags, the cell counts from yosys stat and the Fmax from
+icetime (after place & route with a fixed seed) are collected into a
+comparison table in Markdown and JSON.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import sys
+
+from _tools_common import (
+    DEFAULT_DEVICE, DEFAULT_PACKAGE, DEFAULT_PCF, ROOT_DIR, parse_yosys_stat,
+    run_icetime, run_nextpnr, run_yosys, summarize_cells, synth_sources
+)
+
+DEFAULT_WORK_DIR = ROOT_DIR / 'build' / 'synth_sweep'
+
+# Flags compared in NOTES, plus the current default
+DEFAULT_FLAG_SETS = (
+    '',
+    '-abc2 -relut',
+    '-retime -relut -abc2',
+    '-abc9',
+    '-abc9 -relut',
+)
+
+# Table columns: (heading, result key)
+COLUMNS = (
+    ('SB_LUT4', 'lut'),
+    ('SB_DFF*', 'ff'),
+    ('SB_CARRY', 'carry'),
+    ('SB_RAM40_4K', 'bram'),
+    ('Cells', 'cells'),
+    ('Fmax (MHz)', 'fmax'),
+)
+
+def _flags_dir_name(flags):
+    return re.sub(r'[^\w]+', '_', flags).strip('_') or 'default'
+
+def run_flags(flags, sources, work_dir, timing, device, package, pcf, chipdb, seed):
+    """Synthesizes with one set of flags; returns its result"""
+    flags_dir = work_dir / _flags_dir_name(flags)
+    flags_dir.mkdir(parents=True, exist_ok=True)
+    json_path = flags_dir / 'hardware.json'
+    stat_path = flags_dir / 'stat.txt'
+    result = {'flags': flags, 'passed': False, 'fmax': None, 'log_dir': flags_dir}
+    if not run_yosys(sources, json_path, stat_path, flags_dir / 'yosys.log', flags=flags):
+        return result
+    result.update(summarize_cells(parse_yosys_stat(stat_path.read_text())))
+    result['passed'] = True
+    if timing:
+        asc_path = flags_dir / 'hardware.asc'
+        if run_nextpnr(json_path, asc_path, flags_dir / 'nextpnr.log', device=device,
+                       package=package, pcf=pcf, seed=seed):
+            result['fmax'] = run_icetime(
+                asc_path, flags_dir / 'hardware.rpt', flags_dir / 'icetime.log', device=device,
+                package=package, chipdb=chipdb)
+    return result
+
+def format_markdown(results):
+    """Returns the results as a Markdown table"""
+    lines = [
+        '| synth_ice40 flags | ' + ' | '.join(x for x, _ in COLUMNS) + ' |',
+        '|---|' + '---:|' * len(COLUMNS),
+    ]
+    for result in results:
+        flags = f'`{result["flags"]}`' if result['flags'] else '(none)'
+        if not result['passed']:
+            lines.append(f'| {flags} | ' + ' | '.join('FAILED' for _ in COLUMNS) + ' |')
+            continue
+        values = list()
+        for _, key in COLUMNS:
+            value = result.get(key)
+            if value is None:
+                values.append('-')
+            elif isinstance(value, float):
+                values.append(f'{value:.2f}')
+            else:
+                values.append(str(value))
+        lines.append(f'| {flags} | ' + ' | '.join(values) + ' |')
+    return '\n'.join(lines) + '\n'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--flags', action='append', metavar='FLAGS',
+        help='One set of synth_ice40 flags, given as --flags="-abc9 -relut"; repeat for each '
+        'set (default: the flags in NOTES)')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=os.cpu_count(),
+        help='Number of flag sets to run in parallel (default: number of CPUs)')
+    parser.add_argument(
+        '--no-timing', dest='timing', action='store_false',
+        help='Skip place & route and icetime')
+    parser.add_argument(
+        '--seed', type=int, default=1,
+        help='nextpnr seed, the same for every flag set (default: %(default)s)')
+    parser.add_argument(
+        '--device', default=DEFAULT_DEVICE, help='FPGA type and size (default: %(default)s)')
+    parser.add_argument(
+        '--package', default=DEFAULT_PACKAGE, help='FPGA package (default: %(default)s)')
+    parser.add_argument(
+        '--pcf', type=Path, default=DEFAULT_PCF, help='Pin constraints (default: %(default)s)')
+    parser.add_argument('--chipdb', type=Path, help='icetime chip database (default: from $ICEBOX)')
+    parser.add_argument(
+        '--work-dir', type=Path, default=DEFAULT_WORK_DIR,
+        help='Directory for the results of each flag set (default: %(default)s)')
+    parser.add_argument('--markdown', type=Path, help='Write the table as Markdown to this path')
+    parser.add_argument('--json', type=Path, help='Write the results as JSON to this path')
+    args = parser.parse_args()
+    if args.flags is None:
+        args.flags = list(DEFAULT_FLAG_SETS)
+
+    sources = synth_sources()
+    work_dir = args.work_dir.resolve()
+    print(f'Synthesizing with {len(args.flags)} flag sets...')
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(
+            lambda x: run_flags(
+                x, sources, work_dir, args.timing, args.device, args.package,
+                args.pcf.resolve(), args.chipdb, args.seed),
+            args.flags))
+
+    table = format_markdown(results)
+    print(table, end='')
+    if args.markdown:
+        args.markdown.write_text(table)
+    if args.json:
+        args.json.write_text(json.dumps(
+            [{k: v for k, v in x.items() if k != 'log_dir'} for x in results], indent=4) + '\n')
+    failed = [x for x in results if not x['passed']]
+    for result in failed:
+        print(f'ERROR: Synthesis with "{result["flags"]}" failed. See {result["log_dir"]}')
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
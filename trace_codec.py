@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compresses capture files by encoding each frame against the previous one
+
+Consecutive frames are mostly the same, so each byte is stored as its change
+from the previous frame: the XOR for most bytes, and the change of the
+increment for the bytes of counters (the cycle counter, the PC and the next
+PC), which are then zero while the program runs straight. Each frame stores a
+bitmask of its changed bytes and only those bytes. Frames are grouped into
+blocks that start from a keyframe and are compressed with zlib, so readers
+can seek to a block and decode it with vectorized operations.
+
+Encoded captures can be read by everything that uses
+capture_arrays.read_frame_chunks, e.g. pipeline_stats.py.
+"""
+
+import argparse
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+from cpu_output import DEBUG_FIELDS, FRAME_BYTES
+
+MAGIC = b'EE469DLT'
+VERSION = 1
+# Magic, version, frame size and frames per block
+HEADER = struct.Struct('<8sHHI')
+# Frames, then the compressed sizes of the masks and the changed bytes
+BLOCK_HEADER = struct.Struct('<III')
+DEFAULT_KEYFRAME_INTERVAL = 1 << 16
+
+def _counter_bytes():
+    """Returns the frame byte indices of the counters"""
+    indices = [0]
+    for name, offset, size, _, _ in DEBUG_FIELDS:
+        if name in ('pc', 'regfile_new_pc'):
+            indices.extend(range(1 + offset, 1 + offset + size))
+    return np.array(indices)
+
+COUNTER_BYTES = _counter_bytes()
+OTHER_BYTES = np.setdiff1d(np.arange(FRAME_BYTES), COUNTER_BYTES)
+
+def _residuals(frames):
+    """Returns the changes of each frame, starting from an all-zero frame (the keyframe)"""
+    previous = np.zeros_like(frames)
+    previous[1:] = frames[:-1]
+    residuals = frames ^ previous
+    # Byte-wise second difference for counters, modulo 256
+    delta = frames[:, COUNTER_BYTES] - previous[:, COUNTER_BYTES]
+    previous_delta = np.zeros_like(delta)
+    previous_delta[1:] = delta[:-1]
+    residuals[:, COUNTER_BYTES] = delta - previous_delta
+    return residuals
+
+def _frames(residuals):
+    """Inverts _residuals"""
+    frames = np.empty_like(residuals)
+    frames[:, OTHER_BYTES] = np.bitwise_xor.accumulate(residuals[:, OTHER_BYTES], axis=0)
+    delta = np.cumsum(residuals[:, COUNTER_BYTES], axis=0, dtype=np.uint8)
+    frames[:, COUNTER_BYTES] = np.cumsum(delta, axis=0, dtype=np.uint8)
+    return frames
+
+def encode_block(frames):
+    """Encodes an array of frames with one frame per row into a block"""
+    residuals = _residuals(frames)
+    changed = residuals != 0
+    masks = zlib.compress(np.packbits(changed, axis=1, bitorder='little').tobytes())
+    values = zlib.compress(residuals[changed].tobytes())
+    return BLOCK_HEADER.pack(len(frames), len(masks), len(values)) + masks + values
+
+def _read_block(encoded_file):
+    """Reads the next block; returns (number of frames, masks, values) or None at the end"""
+    header = encoded_file.read(BLOCK_HEADER.size)
+    if len(header) < BLOCK_HEADER.size:
+        return None
+    num_frames, masks_size, values_size = BLOCK_HEADER.unpack(header)
+    return num_frames, encoded_file.read(masks_size), encoded_file.read(values_size)
+
+def decode_block(num_frames, masks, values):
+    """Decodes a block into an array of frames with one frame per row"""
+    masks = np.frombuffer(zlib.decompress(masks), dtype=np.uint8).reshape(num_frames, -1)
+    changed = np.unpackbits(masks, axis=1, count=FRAME_BYTES, bitorder='little').astype(bool)
+    residuals = np.zeros((num_frames, FRAME_BYTES), dtype=np.uint8)
+    residuals[changed] = np.frombuffer(zlib.decompress(values), dtype=np.uint8)
+    return _frames(residuals)
+
+def is_encoded(capture_file):
+    """
+    Returns whether a capture file is encoded, without moving its position.
+    Streams that cannot seek, e.g. standard input, are peeked at instead, and
+    must be at their start.
+    """
+    if not capture_file.seekable():
+        return capture_file.peek(len(MAGIC))[:len(MAGIC)] == MAGIC
+    position = capture_file.tell()
+    capture_file.seek(0)
+    magic = capture_file.read(len(MAGIC))
+    capture_file.seek(position)
+    return magic == MAGIC
+
+def _read_header(encoded_file):
+    magic, version, frame_bytes, keyframe_interval = HEADER.unpack(
+        encoded_file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or frame_bytes != FRAME_BYTES:
+        raise ValueError(
+            f'Unsupported encoded capture (version {version}, {frame_bytes} byte frames)')
+    return keyframe_interval
+
+def encode_capture(capture_file, encoded_file, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+    """Encodes a capture file; returns the number of frames"""
+    if keyframe_interval < 1:
+        raise ValueError(f'Keyframe interval must be at least 1, not {keyframe_interval}')
+    encoded_file.write(HEADER.pack(MAGIC, VERSION, FRAME_BYTES, keyframe_interval))
+    num_frames = 0
+    while True:
+        block = capture_file.read(FRAME_BYTES * keyframe_interval)
+        block_frames = len(block) // FRAME_BYTES
+        if block_frames:
+            frames = np.frombuffer(block, dtype=np.uint8, count=block_frames * FRAME_BYTES)
+            encoded_file.write(encode_block(frames.reshape(block_frames, FRAME_BYTES)))
+            num_frames += block_frames
+        if len(block) < FRAME_BYTES * keyframe_interval:
+            return num_frames
+
+def read_encoded_chunks(encoded_file):
+    """
+    Yields (index of the first frame, array of frames) for each block. Streams
+    that cannot seek are read from their current position, which must be the
+    start.
+    """
+    if encoded_file.seekable():
+        encoded_file.seek(0)
+    _read_header(encoded_file)
+    first_frame = 0
+    while True:
+        block = _read_block(encoded_file)
+        if block is None:
+            return
+        frames = decode_block(*block)
+        yield first_frame, frames
+        first_frame += len(frames)
+
+def read_frame_range(encoded_file, start, stop):
+    """Returns the frames from index start to stop, decoding only their blocks"""
+    encoded_file.seek(0)
+    keyframe_interval = _read_header(encoded_file)
+    # Every block but the last has keyframe_interval frames, so skip to the first one
+    first_block = start // keyframe_interval
+    for _ in range(first_block):
+        header = encoded_file.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            return np.zeros((0, FRAME_BYTES), dtype=np.uint8)
+        _, masks_size, values_size = BLOCK_HEADER.unpack(header)
+        encoded_file.seek(masks_size + values_size, 1)
+    chunks = list()
+    first_frame = first_block * keyframe_interval
+    while first_frame < stop:
+        block = _read_block(encoded_file)
+        if block is None:
+            break
+        frames = decode_block(*block)
+        chunks.append(frames[max(start - first_frame, 0):stop - first_frame])
+        first_frame += len(frames)
+    return np.concatenate(chunks) if chunks else np.zeros((0, FRAME_BYTES), dtype=np.uint8)
+
+def _parse_interval(arg):
+    """Parses --keyframe-interval, which must be at least one frame"""
+    try:
+        interval = int(arg, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected a number, got: {arg}')
+    if interval < 1:
+        raise argparse.ArgumentTypeError(f'Must be at least 1, got: {arg}')
+    return interval
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    encode_parser = subparsers.add_parser('encode', help='Encode a capture file')
+    encode_parser.add_argument('capture', type=argparse.FileType('rb'), help='Capture file')
+    encode_parser.add_argument(
+        'output', type=argparse.FileType('wb'), help='Encoded capture to write')
+    encode_parser.add_argument(
+        '--keyframe-interval', type=_parse_interval, default=DEFAULT_KEYFRAME_INTERVAL,
+        help='Frames per block, between keyframes (default: %(default)s)')
+    decode_parser = subparsers.add_parser('decode', help='Decode to a plain capture file')
+    decode_parser.add_argument('encoded', type=argparse.FileType('rb'), help='Encoded capture')
+    decode_parser.add_argument(
+        'output', type=argparse.FileType('wb'), help='Capture file to write')
+    args = parser.parse_args()
+
+    if args.command == 'encode':
+        num_frames = encode_capture(args.capture, args.output, args.keyframe_interval)
+        size = args.output.tell()
+        ratio = num_frames * FRAME_BYTES / size if size else 0
+        print(f'Encoded {num_frames} frames into {size} bytes ({ratio:.1f}x smaller)')
+        return
+    try:
+        for _, frames in read_encoded_chunks(args.encoded):
+            args.output.write(frames.tobytes())
+    except (ValueError, zlib.error, struct.error) as exc:
+        print(f'ERROR: {args.encoded.name}: {exc}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Stores decoded captures in columns of NumPy files, and queries them
+
+A store is a directory with one subdirectory per debug field of
+cpu_output.DEBUG_FIELDS (and the cycle counter), each holding one .npy file
+per chunk of frames. Columns are memory-mapped, so queries only read the
+columns they use, and scan them a chunk at a time with vectorized
+comparisons. Frames are identified by their index in the capture.
+
+Examples:
+
+  trace_store.py build tests/native/capture.bin build/trace
+  trace_store.py query build/trace --writes 4
+  trace_store.py query build/trace --pc 0x40 --first
+  trace_store.py query build/trace --cpsr Z --count
+"""
+
+from pathlib import Path
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from capture_arrays import DEFAULT_CHUNK_FRAMES, read_column_chunks
+from cpu_output import CPSR_FLAGS, DEBUG_FIELD_NAMES, REG_COUNT
+
+STORE_COLUMNS = ('cycle',) + DEBUG_FIELD_NAMES
+META_FILE = 'meta.json'
+
+def write_store(capture_file, store_dir, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """Decodes a capture file into a store; returns the number of frames"""
+    store_dir = Path(store_dir)
+    for name in STORE_COLUMNS:
+        (store_dir / name).mkdir(parents=True, exist_ok=True)
+        for old_chunk in (store_dir / name).glob('*.npy'):
+            old_chunk.unlink()
+    num_frames = 0
+    chunks = list()
+    for chunk, columns in enumerate(read_column_chunks(capture_file, chunk_frames)):
+        for name in STORE_COLUMNS:
+            np.save(store_dir / name / f'{chunk:06d}.npy', columns[name])
+        chunks.append(len(columns['frame']))
+        num_frames += len(columns['frame'])
+    meta = {
+        'frames': num_frames,
+        'chunks': chunks,
+        'columns': {x: str(np.load(store_dir / x / '000000.npy', mmap_mode='r').dtype)
+                    for x in STORE_COLUMNS} if chunks else {},
+    }
+    (store_dir / META_FILE).write_text(json.dumps(meta, indent=4) + '\n')
+    return num_frames
+
+class TraceStore:
+    """A store written by write_store, with vectorized queries over its columns"""
+
+    def __init__(self, store_dir):
+        self.store_dir = Path(store_dir)
+        meta_path = self.store_dir / META_FILE
+        if not meta_path.is_file():
+            raise FileNotFoundError(f'Not a trace store: {self.store_dir}')
+        meta = json.loads(meta_path.read_text())
+        self.num_frames = meta['frames']
+        self.chunk_sizes = meta['chunks']
+        self.chunk_starts = np.concatenate(([0], np.cumsum(self.chunk_sizes)))[:-1]
+
+    def __len__(self):
+        return self.num_frames
+
+    def _chunk(self, name, chunk):
+        if name not in STORE_COLUMNS:
+            raise KeyError(f'Unknown column: {name}')
+        return np.load(self.store_dir / name / f'{chunk:06d}.npy', mmap_mode='r')
+
+    def chunks(self, names):
+        """Yields (index of the first frame, dict of memory-mapped columns) per chunk"""
+        for chunk, first_frame in enumerate(self.chunk_starts.tolist()):
+            yield first_frame, {x: self._chunk(x, chunk) for x in names}
+
+    def column(self, name):
+        """Returns a whole column as one array"""
+        if not self.chunk_sizes:
+            return np.zeros(0)
+        return np.concatenate([self._chunk(name, x) for x in range(len(self.chunk_sizes))])
+
+    def rows(self, frames, names=STORE_COLUMNS):
+        """Returns a dict with the values of the given frame indices of each column"""
+        frames = np.asarray(frames, dtype=np.int64)
+        if len(frames) and not (0 <= frames.min() and frames.max() < self.num_frames):
+            raise IndexError(f'Frames not in store of {self.num_frames} frames')
+        if not self.chunk_sizes:
+            # Without chunks, there are no dtypes either
+            return {x: np.zeros(0) for x in names}
+        chunk_of = np.searchsorted(self.chunk_starts, frames, 'right') - 1
+        result = dict()
+        for name in names:
+            values = np.zeros(len(frames), dtype=self._chunk(name, 0).dtype)
+            for chunk in np.unique(chunk_of).tolist():
+                selected = chunk_of == chunk
+                values[selected] = self._chunk(name, chunk)[frames[selected] - self.chunk_starts[chunk]]
+            result[name] = values
+        return result
+
+    def where(self, predicate, names):
+        """
+        Returns the indices of the frames where predicate is true
+
+        predicate is called with a dict of the columns in names for each chunk
+        and returns a boolean array, e.g. lambda x: x['pc'] == 0x40
+        """
+        matches = [
+            first_frame + np.flatnonzero(predicate(columns))
+            for first_frame, columns in self.chunks(names)]
+        return np.concatenate(matches) if matches else np.zeros(0, dtype=np.int64)
+
+    def first(self, predicate, names):
+        """Returns the index of the first frame where predicate is true, or None"""
+        for first_frame, columns in self.chunks(names):
+            match = np.flatnonzero(predicate(columns))
+            if len(match):
+                return first_frame + int(match[0])
+        return None
+
+    def count(self, predicate, names):
+        """Returns the number of frames where predicate is true"""
+        return sum(
+            int(np.count_nonzero(predicate(columns))) for _, columns in self.chunks(names))
+
+def register_written(register):
+    """Predicate of frames where the regfile writes register"""
+    def predicate(columns):
+        return (columns['regfile_write_enable1'] != 0) & (columns['regfile_write_addr1'] == register)
+    predicate.columns = ('regfile_write_enable1', 'regfile_write_addr1')
+    return predicate
+
+def pc_equals(address):
+    """Predicate of frames with the PC at address"""
+    def predicate(columns):
+        return columns['pc'] == address
+    predicate.columns = ('pc',)
+    return predicate
+
+def cpsr_set(flags):
+    """Predicate of frames with all of the CPSR flags (e.g. 'Z' or 'NZ') set"""
+    mask = 0
+    for flag in flags.upper():
+        if flag not in CPSR_FLAGS:
+            raise ValueError(f'Unknown CPSR flag: {flag}')
+        mask |= CPSR_FLAGS[flag]
+    def predicate(columns):
+        return (columns['executor_cpsr'] & mask) == mask
+    predicate.columns = ('executor_cpsr',)
+    return predicate
+
+def all_of(*predicates):
+    """Predicate of frames where all predicates are true"""
+    def predicate(columns):
+        result = np.ones(len(next(iter(columns.values()))), dtype=bool)
+        for other in predicates:
+            result &= other(columns)
+        return result
+    predicate.columns = tuple(sorted({x for y in predicates for x in y.columns}))
+    return predicate
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Write a store from a capture file')
+    build_parser.add_argument('capture', type=argparse.FileType('rb'), help='Capture file')
+    build_parser.add_argument('store', type=Path, help='Store directory to write')
+    build_parser.add_argument(
+        '--chunk-frames', type=int, default=DEFAULT_CHUNK_FRAMES,
+        help='Frames per chunk file (default: %(default)s)')
+    query_parser = subparsers.add_parser(
+        'query', help='Print the indices of the frames matching all conditions')
+    query_parser.add_argument('store', type=Path, help='Store directory')
+    query_parser.add_argument(
+        '--writes', type=int, metavar='REG', help='Frames where register REG is written')
+    query_parser.add_argument(
+        '--pc', type=lambda x: int(x, 0), metavar='ADDR', help='Frames with the PC at ADDR')
+    query_parser.add_argument(
+        '--cpsr', metavar='FLAGS', help='Frames with the CPSR flags set, e.g. Z or NC')
+    output_group = query_parser.add_mutually_exclusive_group()
+    output_group.add_argument('--first', action='store_true', help='Only print the first frame')
+    output_group.add_argument(
+        '--count', action='store_true', help='Only print the number of frames')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        num_frames = write_store(args.capture, args.store, args.chunk_frames)
+        print(f'Wrote {num_frames} frames to {args.store}')
+        return
+
+    predicates = list()
+    if args.writes is not None:
+        if not 0 <= args.writes < REG_COUNT:
+            print(f'ERROR: --writes must be a register from 0 to {REG_COUNT - 1}')
+            sys.exit(1)
+        predicates.append(register_written(args.writes))
+    if args.pc is not None:
+        predicates.append(pc_equals(args.pc))
+    if args.cpsr:
+        try:
+            predicates.append(cpsr_set(args.cpsr))
+        except ValueError as exc:
+            print(f'ERROR: {exc}')
+            sys.exit(1)
+    if not predicates:
+        print('ERROR: Give at least one of --writes, --pc or --cpsr')
+        sys.exit(1)
+    try:
+        store = TraceStore(args.store)
+    except FileNotFoundError as exc:
+        print(f'ERROR: {exc}')
+        sys.exit(1)
+    predicate = all_of(*predicates)
+    if args.count:
+        print(store.count(predicate, predicate.columns))
+    elif args.first:
+        frame = store.first(predicate, predicate.columns)
+        print('none' if frame is None else frame)
+    else:
+        frames = store.where(predicate, predicate.columns)
+        sys.stdout.write(''.join(f'{x}\n' for x in frames.tolist()))
+
+if __name__ == '__main__':
+    main()